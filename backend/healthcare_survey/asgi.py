@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare_survey.settings')
 
 application = get_asgi_application()
+
+if settings.WARMUP_ENABLED:
+    from healthcare_survey.warmup import warm_up
+
+    warm_up()
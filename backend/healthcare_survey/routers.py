@@ -0,0 +1,172 @@
+"""
+Read-replica routing.
+
+With ``DATABASE_REPLICA`` naming a second entry of ``DATABASES``, the read
+queries of selected endpoints go to that replica and everything else stays
+on ``default`` (the primary):
+
+- Views opt in with the ``replica_reads`` decorator (function views) or a
+  ``replica_reads = True`` attribute (class views). Only their GET, HEAD
+  and OPTIONS requests read from the replica: analytics, report, search and
+  list endpoints, whose results can be a few seconds old.
+- Writes always go to the primary, and the first write of a request pins
+  the rest of that request to it. Reads inside a transaction on the primary
+  stay there too.
+- A request that wrote sets the ``primary_pin`` cookie for
+  ``DATABASE_REPLICA_PIN_SECONDS``, so the same client reads its own writes
+  on its next requests while the replica catches up.
+- Token lookups always read from the primary, so a token issued a moment
+  ago authenticates.
+
+Code outside a request (report workers, commands) reads from the primary
+unless it runs inside ``replica_reads()``.
+
+For local testing with two SQLite files, add a ``replica`` entry pointing at
+a second file and refresh it from the primary with
+``python manage.py sync_replica``.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Always read from the primary, whatever the view
+PRIMARY_MODELS = {'authtoken.token', 'sessions.session'}
+
+
+class Routing:
+    """Where the current request or block reads from"""
+    __slots__ = ('replica', 'pinned', 'wrote')
+
+    def __init__(self, replica=False, pinned=False):
+        self.replica = replica
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Set per request by ReplicaRoutingMiddleware and per block by replica_reads().
+# Context variables follow sync_to_async and async tasks, unlike thread locals
+_routing = ContextVar('db_routing', default=None)
+
+
+def replica_alias():
+    alias = settings.DATABASE_REPLICA
+    return alias if alias and alias != DEFAULT_DB_ALIAS and alias in settings.DATABASES else None
+
+
+def reading_replica():
+    """Whether reads in the current context go to the replica"""
+    routing = _routing.get()
+    return bool(
+        routing is not None and routing.replica and not routing.pinned and replica_alias()
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+def pin_to_primary():
+    """Send the rest of the current request's reads to the primary"""
+    routing = _routing.get()
+    if routing is not None:
+        routing.pinned = routing.wrote = True
+
+
+@contextmanager
+def replica_block(enabled=True):
+    token = _routing.set(Routing(replica=enabled))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def replica_reads(view=None):
+    """Mark a view as reading from the replica, or read from it inside a ``with`` block
+
+    ``@replica_reads`` goes above ``@api_view``. ``with replica_reads():``
+    is for code outside a request, such as report workers.
+    """
+    if view is None:
+        return replica_block()
+    view.replica_reads = True
+    return view
+
+
+def is_replica_view(view):
+    view_class = getattr(view, 'view_class', None) or getattr(view, 'cls', None)
+    return getattr(view, 'replica_reads', False) or getattr(view_class, 'replica_reads', False)
+
+
+class ReplicaRouter:
+    """Database router for ``DATABASE_ROUTERS`` (see module docstring)"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in PRIMARY_MODELS and reading_replica():
+            return replica_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary along with the data
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Route the reads of replica views and pin clients that wrote (see module docstring)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_alias():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            return self.pin_client(self.get_response(request), routing)
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            return self.pin_client(await self.get_response(request), routing)
+        finally:
+            _routing.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if routing is not None and request.method in SAFE_METHODS and is_replica_view(view_func):
+            routing.replica = True
+
+    def pin_client(self, response, routing):
+        if routing.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
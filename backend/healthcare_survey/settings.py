@@ -40,6 +40,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'healthcare_survey.routers.ReplicaRoutingMiddleware',
+    # Last, so profiles cover the view rather than the other middleware
+    'surveys.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'healthcare_survey.urls'
@@ -67,9 +70,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections between requests, so a worker's warm connection is reused
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# SQLite production profile (see healthcare_survey.sqlite), applied to each new connection
+SQLITE_PRAGMAS = {
+    'busy_timeout': 20000,  # ms to wait for the write lock before "database is locked"
+    'journal_mode': 'WAL',  # readers and the writer do not block each other
+    'synchronous': 'NORMAL',  # sync at WAL checkpoints; a power cut loses the last commits, never the file
+}
+
+# Read replica (see healthcare_survey.routers). Analytics, report, search and
+# list endpoints read from this DATABASES entry; None reads everything from
+# default. To try it locally with two SQLite files, add
+#     DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+#                             'NAME': BASE_DIR / 'replica.sqlite3', 'TEST': {'MIRROR': 'default'}}
+# set DATABASE_REPLICA = 'replica' and refresh it with `manage.py sync_replica`
+DATABASE_REPLICA = None
+DATABASE_REPLICA_PIN_SECONDS = 5  # a client that wrote reads from the primary for this long
+DATABASE_ROUTERS = ['healthcare_survey.routers.ReplicaRouter']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -125,3 +148,48 @@ CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only allow all origins in development
 
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
+
+# Analytics
+ANALYTICS_MIN_CELL_SIZE = 5  # demographic cells below this many responses are suppressed
+ANALYTICS_SAMPLE_SIZE = 2000  # reservoir size per question for ?mode=approx analytics
+ANALYTICS_SKETCH_SHARDS = 4  # rows per survey the sketch is split over, so submissions do not queue on one lock
+TEXT_ANALYTICS_BACKGROUND_LIMIT = 1000  # backlog counted in the background after a submission; more waits for update_text_analytics
+ASYNC_ANALYTICS_EXECUTOR = 'thread'  # or 'process'; where /api/async/ analytics are computed
+ASYNC_ANALYTICS_WORKERS = 4
+
+# Report jobs (PDF/XLSX, see surveys.reports)
+REPORTS_DIR = BASE_DIR / 'reports'  # rendered artifacts, named by content hash
+REPORTS_EXECUTOR = 'process'  # or 'thread'
+REPORTS_WORKERS = 2
+
+# Live events (server-sent events under /api/async/)
+EVENTS_BACKEND = 'local'  # or 'redis' when several processes serve the API
+EVENTS_REDIS_URL = 'redis://localhost:6379/0'
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_QUEUE_SIZE = 1000  # events buffered per connection before it is told to resync
+EVENTS_STREAM_SECONDS = 600  # streams are closed after this long; EventSource reconnects
+STREAM_TICKET_SECONDS = 30  # lifetime of the ?ticket= that authenticates an EventSource
+
+# Batched requests (/api/batch/, see surveys.batch)
+BATCH_MAX_REQUESTS = 20
+BATCH_WORKERS = 4  # threads running read sub-requests concurrently; 1 runs them in order
+
+# Offline kiosks (see surveys.kiosk)
+KIOSK_SYNC_MAX_SUBMISSIONS = 500  # per /api/surveys/kiosk/sync/ request
+
+# Request profiling (see surveys.profiling)
+PROFILING_ENABLED = True  # admins profile a request with ?profile=1 or an X-Profile: 1 header
+PROFILING_SAMPLE_RATE = 0.0  # fraction of all requests profiled
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 200
+PROFILING_MAX_AGE_DAYS = 7
+PROFILING_SQL_LIMIT = 500  # statements kept per profile; all are counted
+
+# Worker warm-up in wsgi.py/asgi.py (see healthcare_survey.warmup)
+WARMUP_ENABLED = True
+WARMUP_SURVEYS = 100  # active survey definitions loaded into the database cache
+
+# Response submissions (see surveys.submissions)
+SUBMISSION_WRITER_ENABLED = DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3'  # one writer thread per process
+SUBMISSION_BATCH_SIZE = 200  # responses written per transaction at most
+SUBMISSION_WRITE_TIMEOUT = 30  # seconds a request waits for its batch to commit
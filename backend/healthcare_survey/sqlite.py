@@ -0,0 +1,30 @@
+"""
+SQLite production profile.
+
+``configure_connection`` runs on every new SQLite connection (Django's
+``connection_created`` signal) and applies ``SQLITE_PRAGMAS``:
+
+- ``journal_mode = WAL``: readers and the writer no longer block each other,
+  so analytics and exports do not hold up submissions. The mode is stored
+  in the database file; the ``-wal`` and ``-shm`` files next to it belong to
+  the database and must be kept (and backed up) with it.
+- ``synchronous = NORMAL``: with WAL, commits are synced at checkpoints
+  rather than one by one. A power cut can lose the last commits but does not
+  corrupt the database.
+- ``busy_timeout``: milliseconds a connection waits for the write lock
+  before failing with "database is locked".
+
+Other backends ignore the profile. SQLite still allows one writer at a
+time; ``surveys.submissions`` batches submissions so they need few write
+transactions.
+"""
+
+from django.conf import settings
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
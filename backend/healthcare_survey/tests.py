@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from surveys.management.commands._synthetic import create_survey, random_submission
+
+from .routers import PIN_COOKIE, ReplicaRoutingMiddleware, reading_replica, replica_alias, replica_reads
+
+User = get_user_model()
+
+REPLICA = 'replica'
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Requests through the middleware and router, with a replica alias on the test database
+
+    TestCase would wrap every test in a transaction, which keeps all reads on
+    the primary.
+    """
+
+    def setUp(self):
+        # The replica opens the same test database, as if it were fully caught up
+        connections.settings[REPLICA] = {**connections[DEFAULT_DB_ALIAS].settings_dict}
+        self.addCleanup(self.remove_replica)
+        user = User.objects.create(username='author', role='admin')
+        self.token = Token.objects.create(user=user)
+        self.survey = create_survey(user, questions=3)
+        self.questions = list(self.survey.questions.order_by('order'))
+
+    def remove_replica(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def client_for_token(self):
+        # A new client loads the middleware with the overridden DATABASE_REPLICA
+        return Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self, client, url):
+        with CaptureQueriesContext(connections[REPLICA]) as replica, \
+                CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in replica], [query['sql'] for query in primary]
+
+    @override_settings(DATABASE_REPLICA=REPLICA)
+    def test_replica_view_reads_from_replica(self):
+        replica, primary = self.get(self.client_for_token(), f'/api/surveys/{self.survey.id}/analytics/')
+        self.assertTrue(replica)
+        # Tokens are always looked up on the primary
+        self.assertFalse([sql for sql in replica if 'authtoken_token' in sql])
+        self.assertTrue([sql for sql in primary if 'authtoken_token' in sql])
+
+    @override_settings(DATABASE_REPLICA=REPLICA)
+    def test_other_views_read_from_primary(self):
+        replica, primary = self.get(self.client_for_token(), f'/api/surveys/{self.survey.id}/')
+        self.assertEqual(replica, [])
+        self.assertTrue(primary)
+
+    @override_settings(DATABASE_REPLICA=REPLICA)
+    def test_client_that_wrote_is_pinned_to_primary(self):
+        client = self.client_for_token()
+        response = client.post('/api/surveys/responses/', random_submission(self.survey, self.questions),
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DATABASE_REPLICA_PIN_SECONDS)
+        self.assertTrue(cookie['httponly'])
+
+        # The client sends the cookie back, so it reads its own write from the primary
+        replica, primary = self.get(client, f'/api/surveys/{self.survey.id}/analytics/')
+        self.assertEqual(replica, [])
+        self.assertTrue(primary)
+
+    @override_settings(DATABASE_REPLICA=REPLICA)
+    def test_reads_do_not_pin(self):
+        response = self.client_for_token().get(f'/api/surveys/{self.survey.id}/analytics/')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICA=REPLICA)
+    def test_replica_reads_block(self):
+        self.assertFalse(reading_replica())
+        with replica_reads():
+            self.assertTrue(reading_replica())
+            self.survey.questions.create(text='New', type='text', order=4)
+            # Pinned by the write
+            self.assertFalse(reading_replica())
+
+    def test_falls_back_to_primary_without_replica(self):
+        for replica in [None, 'missing', DEFAULT_DB_ALIAS]:
+            with self.subTest(replica=replica), override_settings(DATABASE_REPLICA=replica):
+                self.assertIsNone(replica_alias())
+                with self.assertRaises(MiddlewareNotUsed):
+                    ReplicaRoutingMiddleware(lambda request: HttpResponse())
+                with replica_reads():
+                    self.assertFalse(reading_replica())
+                replica, primary = self.get(self.client_for_token(), f'/api/surveys/{self.survey.id}/analytics/')
+                self.assertEqual(replica, [])
+                self.assertTrue(primary)
@@ -5,6 +5,8 @@ Healthcare Survey System - Main URL Configuration
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
+from surveys.batch import batch
+from surveys.profiling import profile_detail, profile_list
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -13,4 +15,14 @@ urlpatterns = [
     ])),
     path('api/users/', include('users.urls')),
     path('api/surveys/', include('surveys.urls')),
+    # Several /api/users/ and /api/surveys/ requests in one round trip
+    path('api/batch/', batch, name='api-batch'),
+    # Stored request profiles (admins only)
+    path('api/profiles/', profile_list, name='profile-list'),
+    path('api/profiles/<str:profile_id>/', profile_detail, name='profile-detail'),
+    # Async versions of the hot read endpoints; serve with an ASGI server
+    path('api/async/', include([
+        path('users/', include('users.async_urls')),
+        path('surveys/', include('surveys.async_urls')),
+    ])),
 ]
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Worker warm-up, run by wsgi.py and asgi.py as a worker loads the application.
+
+Without it the first requests a worker serves pay for one-off work: compiling
+the URL patterns, importing and building the DRF serializers' fields and
+reading the survey tables from disk. Warm-up does that work before the
+worker takes traffic:
+
+- ``urls``: compiles every URL pattern and imports every view
+- ``serializers``: builds the fields of every API serializer
+- ``surveys``: loads the definitions of up to ``WARMUP_SURVEYS`` active
+  surveys (settings, questions and branching logic, as the kiosk bundle
+  does), so the hot survey and question rows are in the database cache
+
+Heavy optional libraries (pandas, reportlab, openpyxl) are not imported here.
+They load on the first report, comparison or import that needs them.
+
+The connections opened while warming are closed at the end. Whether the
+loading thread goes on to serve requests depends on the server (gthread,
+mod_wsgi and runserver serve on other threads, ASGI runs database code on
+its own threads), and under ``gunicorn --preload`` the application loads
+before the fork, where a kept connection would be shared by every worker.
+Requests open their own connections, which ``CONN_MAX_AGE`` then reuses.
+"""
+
+import importlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework import serializers
+
+SERIALIZER_MODULES = ['users.serializers', 'surveys.serializers']
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    """Compile every URL pattern; returns the view callbacks"""
+    views = []
+    resolvers = [get_resolver()]
+    while resolvers:
+        resolver = resolvers.pop()
+        # Resolving fills the reverse lookup tables and imports included URLconfs
+        resolver.reverse_dict
+        for pattern in resolver.url_patterns:
+            pattern.pattern.regex
+            if isinstance(pattern, URLResolver):
+                resolvers.append(pattern)
+            elif isinstance(pattern, URLPattern):
+                views.append(pattern.callback)
+    return views
+
+
+def build_fields(serializer, depth=0):
+    fields = getattr(serializer, 'child', serializer).fields
+    if depth < 3:
+        for field in fields.values():
+            if isinstance(getattr(field, 'child', field), serializers.BaseSerializer):
+                build_fields(field, depth + 1)
+
+
+def warm_serializers(views):
+    """Build the fields of the API serializers, nested ones included"""
+    classes = {getattr(getattr(view, 'cls', None), 'serializer_class', None) for view in views}
+    for name in SERIALIZER_MODULES:
+        module = importlib.import_module(name)
+        classes.update(
+            value for value in vars(module).values()
+            if isinstance(value, type) and issubclass(value, serializers.BaseSerializer)
+            and value.__module__ == name
+        )
+    for serializer_class in classes - {None}:
+        try:
+            build_fields(serializer_class(context={}))
+        except Exception:
+            # Serializers that need arguments to build warm on first use
+            pass
+
+
+def warm_surveys():
+    from surveys.kiosk import build_bundle, kiosk_surveys
+    from surveys.models import Survey
+
+    active = kiosk_surveys(Survey.objects.all()).order_by('-updated_at')
+    ids = list(active.values_list('id', flat=True)[:settings.WARMUP_SURVEYS])
+    build_bundle(Survey.objects.filter(id__in=ids))
+
+
+def warm_up():
+    """Run the warm-up steps, then close the connections they opened; returns {step: seconds}
+
+    A failing step is reported and skipped: a worker that cannot warm up
+    still serves requests, only more slowly at first.
+    """
+    timings = {}
+    views = []
+    steps = [
+        ('urls', lambda: views.extend(warm_urls())),
+        ('serializers', lambda: warm_serializers(views)),
+        ('surveys', warm_surveys),
+    ]
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Warm-up step %s failed', name)
+        timings[name] = time.perf_counter() - start
+    connections.close_all()
+    return timings
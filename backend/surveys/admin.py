@@ -1,36 +1,79 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import SEARCH_VAR
+from users.fieldsets import related_count
 from .models import Survey, Question, SurveyResponse, QuestionResponse, SurveyInvitation
+from .pagination import ApproximateCountPaginator
+
+class ExactSearchMixin:
+    """Search exact values of indexed columns; id columns only take numeric terms"""
+    def get_search_fields(self, request):
+        if all(term.isdigit() for term in request.GET.get(SEARCH_VAR, '').split()):
+            return self.search_fields
+        return [field for field in self.search_fields if '__id__' not in field]
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and not self.get_search_fields(request):
+            return queryset.none(), False
+        return super().get_search_results(request, queryset, search_term)
 
 @admin.register(Survey)
 class SurveyAdmin(admin.ModelAdmin):
     list_display = ['title', 'category', 'status', 'created_by', 'created_at', 'total_questions', 'total_responses']
     list_filter = ['status', 'category', 'created_at']
+    list_select_related = ['created_by']
     search_fields = ['title', 'description']
     ordering = ['-created_at']
     readonly_fields = ['created_at', 'updated_at']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            question_count=related_count(Question.objects, 'survey'),
+            response_count=related_count(SurveyResponse.objects, 'survey'),
+        )
+
+    @admin.display(description='Total questions', ordering='question_count')
+    def total_questions(self, obj):
+        return obj.question_count
+
+    @admin.display(description='Total responses', ordering='response_count')
+    def total_responses(self, obj):
+        return obj.response_count
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ['survey', 'text', 'type', 'order', 'is_required']
     list_filter = ['type', 'is_required']
+    list_select_related = ['survey']
     search_fields = ['text']
     ordering = ['survey', 'order']
 
 @admin.register(SurveyResponse)
-class SurveyResponseAdmin(admin.ModelAdmin):
+class SurveyResponseAdmin(ExactSearchMixin, admin.ModelAdmin):
     list_display = ['survey', 'respondent', 'is_complete', 'started_at', 'completed_at']
     list_filter = ['is_complete', 'started_at']
-    search_fields = ['survey__title', 'respondent__username']
+    list_select_related = ['survey', 'respondent']
+    # Exact matches on indexed columns; substring search would scan the table
+    search_fields = ['survey__id__exact', 'respondent__username__exact', 'session_id__exact']
+    search_help_text = 'Survey id, respondent username or session id'
     ordering = ['-started_at']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ['survey', 'respondent']
 
 @admin.register(QuestionResponse)
-class QuestionResponseAdmin(admin.ModelAdmin):
+class QuestionResponseAdmin(ExactSearchMixin, admin.ModelAdmin):
     list_display = ['survey_response', 'question', 'get_answer']
     list_filter = ['created_at']
-    search_fields = ['question__text']
+    list_select_related = ['survey_response__survey', 'survey_response__respondent', 'question__survey']
+    search_fields = ['survey_response__id__exact', 'question__id__exact']
+    search_help_text = 'Response id or question id'
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ['survey_response', 'question']
 
 @admin.register(SurveyInvitation)
 class SurveyInvitationAdmin(admin.ModelAdmin):
     list_display = ['survey', 'recipient', 'status', 'sent_at', 'created_at']
     list_filter = ['status', 'sent_at']
-    search_fields = ['survey__title', 'recipient__username']
\ No newline at end of file
+    list_select_related = ['survey', 'recipient']
+    search_fields = ['survey__title', 'recipient__username']
@@ -0,0 +1,166 @@
+"""
+Survey analytics payloads.
+
+``exact_analytics`` computes the payload of ``GET /api/surveys/{id}/analytics/``
+from the stored answers. Row-layout answers are aggregated in the database;
+packed responses are decoded in chunks. The result can be stored as an
+``AnalyticsSnapshot`` so it does not have to be recomputed per request, and
+``analytics_for_mode`` picks between exact, approximate and snapshot results.
+"""
+
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Avg, Count
+from django.utils import timezone
+
+from healthcare_survey.routers import replica_block
+
+from .choices import CHOICE_TYPES, choice_distributions
+from .demographics import DEFAULT_GROUPINGS, demographic_breakdowns
+from .durations import PERCENTILES, completed_durations, duration_percentiles
+from .models import AnalyticsSnapshot, Survey
+from .sampling import approximate_analytics
+from .statistics import NUMERIC_TYPES, numeric_statistics
+from .storage import packed_survey_answers, row_answers
+from .timeseries import response_timeseries
+
+ANALYTICS_MODES = ['exact', 'approx', 'snapshot']
+
+
+def exact_analytics(survey, chunk_size=2000):
+    """Analytics for a survey computed from every stored answer"""
+    # Get basic statistics
+    total_responses = survey.responses.count()
+    completed_responses = survey.responses.filter(is_complete=True).count()
+    
+    completion_rate = (completed_responses / total_responses * 100) if total_responses > 0 else 0
+    
+    # Average completion time (minutes) and duration percentiles
+    avg_seconds = completed_durations(survey.responses.all()).aggregate(
+        avg_time=Avg('duration_seconds')
+    )['avg_time'] or 0
+    avg_time = avg_seconds / 60
+    percentiles = duration_percentiles(survey.responses.all()).get(survey.id, {})
+    completion_time_percentiles = {
+        name: round(percentiles[name] / 60, 2) for name in PERCENTILES if name in percentiles
+    }
+    
+    # Responses by date (last 30 days)
+    now = timezone.now()
+    series = response_timeseries(survey.responses.all(), now - timedelta(days=29), now)
+    responses_by_date = [
+        {'date': point['bucket'][:10], 'count': point['started']}
+        for point in series
+    ]
+    
+    # Question analytics. Row-layout answers are aggregated in the database;
+    # answers from packed responses are decoded through the storage accessor.
+    rows = row_answers(survey)
+    packed_answers = {}
+    for answer in packed_survey_answers(survey, chunk_size):
+        packed_answers.setdefault(answer.question_id, []).append(answer)
+    
+    answer_counts = dict(
+        rows.values_list('question_id').annotate(count=Count('id')).order_by()
+    )
+    questions = list(survey.questions.all())
+    distributions = choice_distributions(
+        [question for question in questions if question.type in CHOICE_TYPES],
+        rows, packed_answers
+    )
+    numeric_stats = numeric_statistics(questions, rows, packed_answers)
+    
+    question_analytics = []
+    for question in questions:
+        question_packed = packed_answers.get(question.id, [])
+        question_total = answer_counts.get(question.id, 0) + len(question_packed)
+        
+        analytics_data = {
+            'question_id': question.id,
+            'question_text': question.text,
+            'question_type': question.type,
+            'total_responses': question_total,
+            'response_rate': (question_total / total_responses * 100) if total_responses > 0 else 0
+        }
+        
+        # Add type-specific analytics
+        if question.type in CHOICE_TYPES:
+            # Choice distribution
+            analytics_data['choice_distribution'] = distributions[question.id]
+        
+        elif question.type in NUMERIC_TYPES:
+            stats = numeric_stats[question.id]
+            analytics_data['statistics'] = stats
+            if question.type == 'rating' and stats['count']:
+                analytics_data['average_rating'] = stats['mean']
+                analytics_data['rating_distribution'] = stats['histogram']
+        
+        question_analytics.append(analytics_data)
+    
+    # Demographic breakdown (small cells suppressed)
+    demographic_breakdown = {}
+    if not survey.is_anonymous:
+        demographic_breakdown = {
+            f"by_{block['dimensions'][0]}": {
+                cell[block['dimensions'][0]]: cell['count']
+                for cell in block['cells'] if not cell.get('suppressed')
+            }
+            for block in demographic_breakdowns(survey, DEFAULT_GROUPINGS)
+        }
+    
+    analytics_data = {
+        'mode': 'exact',
+        'total_responses': total_responses,
+        'completed_responses': completed_responses,
+        'average_completion_time': round(avg_time, 2),
+        'completion_time_percentiles': completion_time_percentiles,
+        'completion_rate': round(completion_rate, 2),
+        'responses_by_date': responses_by_date,
+        'question_analytics': question_analytics,
+        'demographic_breakdown': demographic_breakdown
+    }
+    
+    return analytics_data
+
+
+def answer_total(analytics_data):
+    """Number of answers an analytics payload was computed from"""
+    return sum(question['total_responses'] for question in analytics_data['question_analytics'])
+
+
+def store_snapshot(survey, analytics_data, run='', compute_seconds=None):
+    """Save ``analytics_data`` as the survey's current snapshot"""
+    fields = {
+        'data': analytics_data,
+        'answers': answer_total(analytics_data),
+        'run': run,
+        'compute_seconds': compute_seconds,
+    }
+    # Single-statement writes: update_or_create's read-then-write transaction
+    # deadlocks between concurrent SQLite writers
+    if not AnalyticsSnapshot.objects.filter(survey=survey).update(computed_at=timezone.now(), **fields):
+        AnalyticsSnapshot.objects.create(survey=survey, **fields)
+
+
+def analytics_for_mode(survey, mode='exact'):
+    """Analytics payload for ``mode``; approx and snapshot fall back to exact"""
+    if mode == 'approx':
+        # Estimates from the reservoir samples
+        approximate = approximate_analytics(survey)
+        if approximate is not None:
+            return approximate
+    elif mode == 'snapshot':
+        # Last precomputed result
+        snapshot = AnalyticsSnapshot.objects.filter(survey=survey).first()
+        if snapshot is not None:
+            return {**snapshot.data, 'mode': 'snapshot', 'computed_at': snapshot.computed_at.isoformat()}
+    return exact_analytics(survey)
+
+
+def compute_analytics(survey_id, mode='exact', replica=False):
+    """analytics_for_mode by survey id, for thread and process pools; ``replica`` reads from the replica"""
+    # Pool threads outlive requests, so apply CONN_MAX_AGE and drop broken connections here
+    close_old_connections()
+    with replica_block(replica):
+        return analytics_for_mode(Survey.objects.get(id=survey_id), mode)
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class SurveysConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'surveys'
\ No newline at end of file
+    name = 'surveys'
+
+    def ready(self):
+        from healthcare_survey.sqlite import configure_connection
+        # Apply the SQLite production profile to every new connection
+        connection_created.connect(configure_connection, dispatch_uid='sqlite-profile')
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('', async_views.survey_list, name='async-survey-list'),
+    path('<int:pk>/', async_views.survey_detail, name='async-survey-detail'),
+    path('<int:survey_id>/analytics/', async_views.survey_analytics, name='async-survey-analytics'),
+    path('<int:survey_id>/events/', async_views.survey_events, name='async-survey-events'),
+    path('dashboard/stats/', async_views.dashboard_stats, name='async-dashboard-stats'),
+    path('events/', async_views.dashboard_events, name='async-dashboard-events'),
+]
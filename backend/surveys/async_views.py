@@ -0,0 +1,198 @@
+"""
+Async (ASGI) versions of the hot read endpoints.
+
+They are served under ``/api/async/`` with the same payloads as the DRF
+views. Queries go through the async ORM, and analytics run on a separate
+executor (``ASYNC_ANALYTICS_EXECUTOR``). A slow analytics call therefore
+never occupies the thread that serves the ORM for cheap requests.
+
+The ``events/`` endpoints are server-sent-event streams of new responses and
+completions (see ``surveys.events``), so clients can keep live counts
+without re-fetching analytics.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from healthcare_survey.routers import reading_replica, replica_reads
+from users.authentication import async_api_view
+from users.fieldsets import prune_queryset
+from .analytics import ANALYTICS_MODES, compute_analytics
+from .events import (
+    DASHBOARD_CHANNEL, broadcast, dashboard_event, format_event, redact_event, survey_channel, survey_counts
+)
+from .models import Survey
+from .serializers import SurveyListSerializer, SurveySerializer
+from .views import (
+    EMPTY_DASHBOARD_STATS, can_view_analytics, can_view_survey, dashboard_querysets, visible_surveys
+)
+from .workers import worker_pool
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND = {'detail': 'Not found.'}
+PERMISSION_DENIED = {'detail': 'You do not have permission to perform this action.'}
+
+_analytics_executor = None
+
+
+def analytics_executor():
+    """Executor for analytics work, created on first use"""
+    global _analytics_executor
+    if _analytics_executor is None:
+        workers = settings.ASYNC_ANALYTICS_WORKERS
+        if settings.ASYNC_ANALYTICS_EXECUTOR == 'process':
+            _analytics_executor = worker_pool(workers)
+        else:
+            _analytics_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analytics')
+    return _analytics_executor
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+@replica_reads
+@async_api_view(['GET'])
+async def survey_list(request):
+    """List surveys, paginated like the DRF list view"""
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = int(request.GET.get('page', 1))
+        if page < 1:
+            raise ValueError
+    except ValueError:
+        return json_response({'detail': 'Invalid page.'}, status=404)
+
+    queryset = visible_surveys(request.user, request.GET).order_by('-created_at')
+    try:
+        count = await queryset.acount()
+    except Exception:
+        # Same fallback as the DRF list view: an empty page
+        logger.exception('Survey list query failed')
+        queryset, count = Survey.objects.none(), 0
+    if page > 1 and (page - 1) * page_size >= count:
+        return json_response({'detail': 'Invalid page.'}, status=404)
+
+    offset = (page - 1) * page_size
+    serializer = SurveyListSerializer(many=True, context={'request': request})
+    queryset = prune_queryset(queryset, serializer)
+    serializer.instance = [survey async for survey in queryset[offset:offset + page_size]]
+    results = await sync_to_async(lambda: serializer.data)()
+
+    url = request.build_absolute_uri()
+    return json_response({
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if offset + page_size < count else None,
+        'previous': None if page == 1 else (
+            remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1)
+        ),
+        'results': results,
+    })
+
+
+@async_api_view(['GET'])
+async def survey_detail(request, pk):
+    """Retrieve a survey with its questions"""
+    try:
+        serializer = SurveySerializer(context={'request': request})
+        queryset = prune_queryset(Survey.objects.all(), serializer, ['created_by', 'status', 'target_roles'])
+        survey = await queryset.aget(pk=pk)
+    except Survey.DoesNotExist:
+        return json_response(NOT_FOUND, status=404)
+    if not await sync_to_async(can_view_survey)(request.user, survey):
+        return json_response(PERMISSION_DENIED, status=403)
+    serializer.instance = survey
+    return json_response(await sync_to_async(lambda: serializer.data)())
+
+
+@replica_reads
+@async_api_view(['GET'])
+async def dashboard_stats(request):
+    """Get dashboard statistics"""
+    try:
+        stats = {
+            name: await queryset.acount()
+            for name, queryset in dashboard_querysets(request.user).items()
+        }
+    except Exception:
+        # Return empty stats on error instead of crashing
+        stats = EMPTY_DASHBOARD_STATS
+    return json_response(stats)
+
+
+@replica_reads
+@async_api_view(['GET'])
+async def survey_analytics(request, survey_id):
+    """Get analytics for a survey, computed on the analytics executor"""
+    try:
+        survey = await Survey.objects.select_related('created_by').aget(id=survey_id)
+    except Survey.DoesNotExist:
+        return json_response(NOT_FOUND, status=404)
+    if not can_view_analytics(request.user, survey):
+        return json_response({'error': 'Permission denied'}, status=403)
+
+    mode = request.GET.get('mode', 'exact')
+    if mode not in ANALYTICS_MODES:
+        return json_response({'error': f"mode must be one of: {', '.join(ANALYTICS_MODES)}"}, status=400)
+
+    loop = asyncio.get_running_loop()
+    # Executor threads and processes do not inherit the request's routing
+    data = await loop.run_in_executor(
+        analytics_executor(), compute_analytics, survey.id, mode, reading_replica()
+    )
+    return json_response(data)
+
+
+def event_stream(channel, user, transform, snapshot=None):
+    """Server-sent-event response relaying a broadcast channel"""
+    async def stream():
+        heartbeat = settings.EVENTS_HEARTBEAT_SECONDS
+        deadline = time.monotonic() + settings.EVENTS_STREAM_SECONDS
+        # Ask EventSource to reconnect quickly when the stream is closed
+        yield 'retry: 3000\n\n'
+        async with broadcast().subscribe(channel) as subscription:
+            # Subscribed before the snapshot is read, so no event falls in between
+            if snapshot is not None:
+                yield format_event(await sync_to_async(snapshot)())
+            while time.monotonic() < deadline:
+                message = await subscription.get(heartbeat)
+                if message is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                event = transform(message, user)
+                if event is not None:
+                    yield format_event(event)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@async_api_view(['GET'], query_ticket=True)
+async def survey_events(request, survey_id):
+    """Stream a survey's new responses, completions and per-question count deltas"""
+    try:
+        survey = await Survey.objects.select_related('created_by').aget(id=survey_id)
+    except Survey.DoesNotExist:
+        return json_response(NOT_FOUND, status=404)
+    if not can_view_analytics(request.user, survey):
+        return json_response({'error': 'Permission denied'}, status=403)
+    return event_stream(survey_channel(survey.id), request.user, redact_event, lambda: survey_counts(survey))
+
+
+@async_api_view(['GET'], query_ticket=True)
+async def dashboard_events(request):
+    """Stream the new responses and completions that count towards the user's dashboard"""
+    return event_stream(DASHBOARD_CHANNEL, request.user, dashboard_event)
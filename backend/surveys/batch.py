@@ -0,0 +1,193 @@
+"""
+Batched API requests (``POST /api/batch/``).
+
+A batch carries several sub-requests to the ``/api/users/`` and
+``/api/surveys/`` routes::
+
+    {"requests": [
+        {"id": "profile", "method": "GET", "path": "/users/profile/"},
+        {"id": "surveys", "method": "GET", "path": "/surveys/?fields=id,title"},
+        {"method": "POST", "path": "/surveys/responses/", "body": {...}}
+    ]}
+
+Paths are relative to ``/api/`` (a leading ``/api`` is also accepted). The
+batch is authenticated once, and each sub-request is dispatched straight to
+its view with that user, skipping the middleware and token lookup. Results
+come back in request order with their own status, body and timing.
+
+Writes run one at a time in order. Consecutive reads between them run
+concurrently on ``BATCH_WORKERS`` threads, each with its own database
+connection. Reads run in order instead when the batch is inside a
+transaction, because other connections cannot see its uncommitted writes.
+"""
+
+import io
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connection
+from django.urls import Resolver404, resolve
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+BATCH_ROUTES = ('/api/users/', '/api/surveys/')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+METHODS = READ_METHODS + ('POST', 'PUT', 'PATCH', 'DELETE')
+# Request headers sub-requests inherit from the batch
+INHERITED_META = ('REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT', 'HTTP_HOST', 'HTTP_USER_AGENT',
+                  'HTTP_X_FORWARDED_FOR', 'HTTP_ACCEPT_LANGUAGE')
+
+_batch_executor = None
+
+
+def batch_executor():
+    """Thread pool for concurrent read sub-requests, created on first use"""
+    global _batch_executor
+    if _batch_executor is None:
+        _batch_executor = ThreadPoolExecutor(max_workers=settings.BATCH_WORKERS, thread_name_prefix='batch')
+    return _batch_executor
+
+
+class BatchError(ValueError):
+    """A sub-request that cannot be dispatched; reported with its status code"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_sub_request(spec):
+    """(method, path, query string, body bytes) of a sub-request spec"""
+    if not isinstance(spec, dict):
+        raise BatchError('Each request must be an object')
+    method = str(spec.get('method', 'GET')).upper()
+    if method not in METHODS:
+        raise BatchError(f"method must be one of: {', '.join(METHODS)}")
+    url = urlsplit(str(spec.get('path', '')))
+    path = url.path if url.path.startswith('/api/') else '/api/' + url.path.lstrip('/')
+    if not path.startswith(BATCH_ROUTES):
+        raise BatchError('Only /users/ and /surveys/ routes can be batched', status.HTTP_404_NOT_FOUND)
+    body = b'' if spec.get('body') is None else json.dumps(spec['body']).encode()
+    return method, path, url.query, body
+
+
+def sub_request(batch_request, method, path, query, body):
+    """A request for one sub-request, authenticated as the batch's user"""
+    meta = batch_request.META
+    environ = {key: meta[key] for key in INHERITED_META if key in meta}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': batch_request.scheme,
+    })
+    environ.setdefault('SERVER_NAME', 'localhost')
+    environ.setdefault('SERVER_PORT', '80')
+    request = WSGIRequest(environ)
+    # DRF authenticates requests carrying these with the given user and token
+    request._force_auth_user = batch_request.user
+    request._force_auth_token = batch_request.auth
+    return request
+
+
+# Sub-request errors are reported like those of whole requests (console, mail_admins)
+request_logger = logging.getLogger('django.request')
+
+
+def run_sub_request(batch_request, spec):
+    """Dispatch one sub-request to its view: {id, status, body, duration_ms}"""
+    start = time.perf_counter()
+    result = {'id': spec.get('id') if isinstance(spec, dict) else None}
+    request = batch_request._request
+    try:
+        method, path, query, body = parse_sub_request(spec)
+        try:
+            match = resolve(path)
+        except Resolver404:
+            raise BatchError('Not found', status.HTTP_404_NOT_FOUND)
+        request = sub_request(batch_request, method, path, query, body)
+        response = match.func(request, *match.args, **match.kwargs)
+        if getattr(response, 'streaming', False):
+            response.close()
+            raise BatchError('Streaming responses (e.g. downloads) cannot be batched')
+        if hasattr(response, 'render'):
+            response.render()
+        content = response.content.decode(response.charset or 'utf-8')
+        if response.get('Content-Type', '').startswith('application/json') and content:
+            content = json.loads(content)
+        result.update(status=response.status_code, body=content)
+    except BatchError as e:
+        result.update(status=e.status_code, body={'error': str(e)})
+    except Exception:
+        request_logger.exception(
+            'Internal Server Error in batch sub-request: %s', request.path,
+            extra={'status_code': status.HTTP_500_INTERNAL_SERVER_ERROR, 'request': request},
+        )
+        result.update(status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={'error': 'Internal server error'})
+    result['duration_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def run_in_thread(batch_request, spec):
+    # Threads get their own database connection; release it like a request would
+    close_old_connections()
+    try:
+        return run_sub_request(batch_request, spec)
+    finally:
+        close_old_connections()
+
+
+def is_read(spec):
+    return isinstance(spec, dict) and str(spec.get('method', 'GET')).upper() in READ_METHODS
+
+
+def run_batch(batch_request, specs):
+    """Results of the sub-requests in order; runs of reads are dispatched concurrently"""
+    concurrent = settings.BATCH_WORKERS > 1 and not connection.in_atomic_block
+    results, reads = [], []
+
+    def flush():
+        if len(reads) > 1 and concurrent:
+            results.extend(batch_executor().map(lambda spec: run_in_thread(batch_request, spec), reads))
+        else:
+            results.extend(run_sub_request(batch_request, spec) for spec in reads)
+        reads.clear()
+
+    for spec in specs:
+        if is_read(spec):
+            reads.append(spec)
+            continue
+        flush()
+        results.append(run_sub_request(batch_request, spec))
+    flush()
+    return results
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch(request):
+    """Run several API requests in one round trip"""
+    specs = request.data.get('requests') if isinstance(request.data, dict) else None
+    if not isinstance(specs, list) or not specs:
+        return Response({'error': 'requests must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(specs) > settings.BATCH_MAX_REQUESTS:
+        return Response(
+            {'error': f'At most {settings.BATCH_MAX_REQUESTS} requests can be batched'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    start = time.perf_counter()
+    results = run_batch(request, specs)
+    return Response({
+        'responses': results,
+        'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+    })
@@ -0,0 +1,133 @@
+"""
+Choice answer normalization.
+
+Answers to ``radio`` and ``dropdown`` questions are stored as the index of the
+chosen option in ``Question.options`` (``QuestionResponse.choice_index``);
+``checkbox`` answers set one bit per chosen option in ``choice_mask``. The
+original value is kept in ``text_answer``/``json_answer`` for display.
+"""
+
+from django.db.models import Count, F, Q
+
+CHOICE_TYPES = ['radio', 'dropdown', 'checkbox']
+SINGLE_CHOICE_TYPES = ['radio', 'dropdown']
+
+# choice_mask is a signed 64-bit column
+MAX_CHECKBOX_OPTIONS = 63
+
+# Label for answers that do not match any option (legacy data or options edited later)
+UNMATCHED_LABEL = 'Other'
+
+
+def option_values(question):
+    """Return the option labels of a question, accepting plain or {value, label} options"""
+    values = []
+    for option in question.options or []:
+        if isinstance(option, dict):
+            option = option.get('value', option.get('label'))
+        values.append(str(option))
+    return values
+
+
+def raw_choice_value(answer):
+    """Return the submitted value of a choice answer (validated dict or QuestionResponse)"""
+    if isinstance(answer, dict):
+        text, json_value = answer.get('text_answer'), answer.get('json_answer')
+    else:
+        text, json_value = answer.text_answer, answer.json_answer
+    return text if text else json_value
+
+
+def normalize_choice(question, value):
+    """Return (choice_index, choice_mask) for a submitted value
+
+    Raises ValueError when a value is not one of the question's options.
+    """
+    if value is None or value == '' or value == []:
+        return None, None
+
+    options = option_values(question)
+    selected = value if isinstance(value, list) else [value]
+    indexes = []
+    for item in selected:
+        try:
+            indexes.append(options.index(str(item)))
+        except ValueError:
+            raise ValueError(f"'{item}' is not a valid option for this question")
+
+    if question.type in SINGLE_CHOICE_TYPES:
+        if len(indexes) != 1:
+            raise ValueError("Only one option can be selected for this question")
+        return indexes[0], None
+
+    mask = 0
+    for index in indexes:
+        mask |= 1 << index
+    return None, mask
+
+
+def choice_distributions(questions, rows, packed_answers=None):
+    """Return {question_id: {option: count}} for the given choice questions
+
+    ``rows`` is a QuestionResponse queryset covering the questions; it is
+    aggregated with one GROUP BY for single-choice questions and one
+    conditional-count query for checkbox questions. ``packed_answers`` maps
+    question id to decoded answers from packed responses, tallied in Python.
+    """
+    options = {question.id: option_values(question) for question in questions}
+    distributions = {question_id: dict.fromkeys(labels, 0) for question_id, labels in options.items()}
+    by_id = {question.id: question for question in questions}
+
+    single_ids = [q.id for q in questions if q.type in SINGLE_CHOICE_TYPES]
+    if single_ids:
+        grouped = (
+            rows.filter(question_id__in=single_ids)
+            .exclude(choice_index__isnull=True, text_answer='', json_answer__isnull=True)
+            .values('question_id', 'choice_index')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        for item in grouped:
+            _add(distributions, options, item['question_id'], item['choice_index'], item['count'])
+
+    checkbox_questions = [q for q in questions if q.type == 'checkbox']
+    if checkbox_questions:
+        width = min(max(len(options[q.id]) for q in checkbox_questions), MAX_CHECKBOX_OPTIONS)
+        bits = {f'option_{i}': Count('id', filter=Q(**{f'bit_{i}__gt': 0})) for i in range(width)}
+        grouped = (
+            rows.filter(question_id__in=[q.id for q in checkbox_questions], choice_mask__isnull=False)
+            .alias(**{f'bit_{i}': F('choice_mask').bitand(1 << i) for i in range(width)})
+            .values('question_id')
+            .annotate(**bits)
+            .order_by()
+        )
+        for item in grouped:
+            for i in range(width):
+                if item[f'option_{i}']:
+                    _add(distributions, options, item['question_id'], i, item[f'option_{i}'])
+
+    for question_id, answers in (packed_answers or {}).items():
+        if question_id not in by_id:
+            continue
+        question = by_id[question_id]
+        for answer in answers:
+            try:
+                index, mask = normalize_choice(question, raw_choice_value(answer))
+            except ValueError:
+                _add(distributions, options, question_id, None, 1)
+                continue
+            if mask is not None:
+                for i in range(mask.bit_length()):
+                    if mask & (1 << i):
+                        _add(distributions, options, question_id, i, 1)
+            elif index is not None:
+                _add(distributions, options, question_id, index, 1)
+
+    return distributions
+
+
+def _add(distributions, options, question_id, index, count):
+    labels = options[question_id]
+    label = labels[index] if index is not None and index < len(labels) else UNMATCHED_LABEL
+    distribution = distributions[question_id]
+    distribution[label] = distribution.get(label, 0) + count
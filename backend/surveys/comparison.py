@@ -0,0 +1,351 @@
+"""
+Cross-survey comparison.
+
+Questions of several surveys (typically quarterly copies made with
+``duplicate_survey``) are aligned by normalized text and type, or by an
+explicit mapping. Answers of every aligned question across all surveys are
+counted with one ``GROUP BY`` query over ``QuestionResponse`` plus a decode of
+packed responses; distributions, means and the deltas between consecutive
+surveys are then computed with pandas.
+"""
+
+import json
+
+import numpy as np
+from django.db.models import Count, Q
+
+from .choices import MAX_CHECKBOX_OPTIONS, SINGLE_CHOICE_TYPES, normalize_choice, option_values, raw_choice_value
+from .crosstab import CATEGORY_FIELDS, answer_category, category_label
+from .models import Question, QuestionResponse, SurveyResponse
+from .statistics import NUMERIC_TYPES
+from .storage import unpack_answers
+
+# Answer column holding the comparable value of each supported question type
+VALUE_FIELDS = {**CATEGORY_FIELDS, 'checkbox': 'choice_mask'}
+
+MAX_COMPARED_SURVEYS = 20
+
+
+class ComparisonError(ValueError):
+    pass
+
+
+def parse_survey_ids(value):
+    """Parse ``surveys=3,7,12``; the order given is the order of the trend"""
+    try:
+        ids = [int(part) for part in (value or '').split(',') if part.strip()]
+    except ValueError:
+        raise ComparisonError("'surveys' must be a comma-separated list of survey ids")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) < 2:
+        raise ComparisonError("At least two surveys are required")
+    if len(ids) > MAX_COMPARED_SURVEYS:
+        raise ComparisonError(f"At most {MAX_COMPARED_SURVEYS} surveys can be compared")
+    return ids
+
+
+def parse_mapping(value):
+    """Parse ``mapping={"label": [question id, ...]}``"""
+    if not value:
+        return {}
+    try:
+        mapping = json.loads(value)
+    except ValueError:
+        raise ComparisonError("'mapping' must be a JSON object")
+    if not isinstance(mapping, dict) or not all(
+        isinstance(ids, list) and all(isinstance(i, int) for i in ids) for ids in mapping.values()
+    ):
+        raise ComparisonError("'mapping' must map labels to lists of question ids")
+    return mapping
+
+
+def normalize_text(text):
+    return ' '.join(text.split()).casefold()
+
+
+def align_questions(questions, survey_ids, mapping=None):
+    """Return [(key, [Question, ...])] of questions answered in more than one survey
+
+    Explicitly mapped questions keep their label; the rest are matched on
+    normalized text and type. Each group holds at most one question per survey.
+    """
+    by_id = {question.id: question for question in questions}
+    groups = {}
+    mapped = set()
+    for label, question_ids in (mapping or {}).items():
+        group = []
+        for question_id in question_ids:
+            question = by_id.get(question_id)
+            if question is None:
+                raise ComparisonError(f"Question {question_id} does not belong to the compared surveys")
+            if question.type not in VALUE_FIELDS:
+                raise ComparisonError(f"Question {question_id} has type '{question.type}', which cannot be compared")
+            if question_id in mapped:
+                raise ComparisonError(f"Question {question_id} is mapped more than once")
+            group.append(question)
+            mapped.add(question_id)
+        if len({question.survey_id for question in group}) != len(group):
+            raise ComparisonError(f"Mapping '{label}' has more than one question from the same survey")
+        # Radio and dropdown answers are both stored as option indexes
+        if len({'choice' if q.type in SINGLE_CHOICE_TYPES else q.type for q in group}) > 1:
+            raise ComparisonError(f"Mapping '{label}' mixes question types")
+        groups[label] = group
+
+    for question in questions:
+        if question.id in mapped or question.type not in VALUE_FIELDS:
+            continue
+        key = normalize_text(question.text)
+        group = groups.setdefault((key, question.type), [])
+        # A repeated text within one survey keeps only its first occurrence
+        if all(other.survey_id != question.survey_id for other in group):
+            group.append(question)
+
+    order = {survey_id: i for i, survey_id in enumerate(survey_ids)}
+    aligned = []
+    for key, group in groups.items():
+        if len(group) < 2 and isinstance(key, tuple):
+            continue
+        group.sort(key=lambda question: order[question.survey_id])
+        aligned.append((key if isinstance(key, str) else group[0].text, group))
+    return aligned
+
+
+def answer_value(question, answer):
+    """Comparable value of a decoded answer: category, checkbox mask or number"""
+    if question.type == 'checkbox':
+        try:
+            return normalize_choice(question, raw_choice_value(answer))[1]
+        except ValueError:
+            return None
+    return answer_category(question, answer)
+
+
+def answer_counts(questions):
+    """Return a DataFrame of (question_id, value, count) for both storage layouts"""
+    import pandas as pd
+
+    question_ids = [question.id for question in questions]
+    fields = sorted(set(VALUE_FIELDS.values()))
+    grouped = (
+        QuestionResponse.objects.filter(question_id__in=question_ids)
+        .exclude(**{f'{field}__isnull': True for field in fields})
+        .values('question_id', *fields)
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    field_of = {question.id: VALUE_FIELDS[question.type] for question in questions}
+    records = [
+        (item['question_id'], item[field_of[item['question_id']]], item['count'])
+        for item in grouped
+    ]
+
+    by_id = {question.id: question for question in questions}
+    survey_ids = {question.survey_id for question in questions}
+    packed = SurveyResponse.objects.filter(survey_id__in=survey_ids, packed_answers__isnull=False)
+    for item in packed.values_list('packed_answers', flat=True).iterator():
+        for answer in unpack_answers(None, item):
+            question = by_id.get(answer.question_id)
+            if question is not None:
+                records.append((question.id, answer_value(question, answer), 1))
+
+    frame = pd.DataFrame(records, columns=['question_id', 'value', 'count'])
+    return frame.dropna(subset=['value'])
+
+
+def expand_checkbox(frame, checkbox_ids):
+    """Replace checkbox mask rows with one row per selected option index"""
+    import pandas as pd
+
+    is_checkbox = frame['question_id'].isin(checkbox_ids)
+    masks = frame[is_checkbox]
+    if masks.empty:
+        return frame
+    values = masks['value'].astype(np.int64).to_numpy()
+    bits = (values[:, None] >> np.arange(MAX_CHECKBOX_OPTIONS)) & 1
+    rows, options = np.nonzero(bits)
+    expanded = masks.iloc[rows].assign(value=options)
+    return pd.concat([frame[~is_checkbox], expanded], ignore_index=True)
+
+
+def value_label(question, value):
+    if question.type == 'checkbox':
+        options = option_values(question)
+        return options[int(value)] if int(value) < len(options) else category_label(question, None)
+    if question.type in SINGLE_CHOICE_TYPES:
+        value = int(value)
+    elif question.type == 'boolean':
+        value = bool(value)
+    return category_label(question, value)
+
+
+def survey_summaries(surveys, survey_ids):
+    import pandas as pd
+
+    counts = {
+        item['survey_id']: item
+        for item in SurveyResponse.objects.filter(survey_id__in=survey_ids)
+        .values('survey_id')
+        .annotate(total=Count('id'), completed=Count('id', filter=Q(is_complete=True)))
+        .order_by()
+    }
+    frame = pd.DataFrame(
+        [
+            {
+                'survey_id': survey.id,
+                'total': counts.get(survey.id, {}).get('total', 0),
+                'completed': counts.get(survey.id, {}).get('completed', 0),
+            }
+            for survey in surveys
+        ]
+    ).set_index('survey_id').reindex(survey_ids)
+    frame['rate'] = (frame['completed'] / frame['total'].where(frame['total'] > 0) * 100).round(2)
+    frame['rate_delta'] = frame['rate'].diff().round(2)
+
+    by_id = {survey.id: survey for survey in surveys}
+    return [
+        {
+            'survey_id': survey_id,
+            'title': by_id[survey_id].title,
+            'created_at': by_id[survey_id].created_at.isoformat(),
+            'total_responses': int(row.total),
+            'completed_responses': int(row.completed),
+            'completion_rate': _number(row.rate),
+            'completion_rate_delta': _number(row.rate_delta),
+        }
+        for survey_id, row in frame.iterrows()
+    ]
+
+
+def _number(value):
+    import pandas as pd
+
+    return None if pd.isna(value) else round(float(value), 4)
+
+
+def _by_survey(series, survey_ids):
+    return {survey_id: _number(series.get(survey_id)) for survey_id in survey_ids}
+
+
+def compare_surveys(surveys, survey_ids, mapping=None):
+    """Side-by-side distributions and trend deltas for the aligned questions
+
+    ``surveys`` are the Survey instances of ``survey_ids``, whose order is
+    the order of the trend.
+    """
+    import pandas as pd
+
+    questions = list(Question.objects.filter(survey_id__in=survey_ids).order_by('survey_id', 'order', 'id'))
+    aligned = align_questions(questions, survey_ids, mapping)
+
+    question_key = {}
+    question_of = {}
+    for key, group in aligned:
+        for question in group:
+            question_key[question.id] = key
+            question_of[question.id] = question
+
+    frame = answer_counts(list(question_of.values()))
+    frame['key'] = frame['question_id'].map(question_key)
+    frame['survey_id'] = frame['question_id'].map(lambda question_id: question_of[question_id].survey_id)
+
+    # Answers per question before checkbox masks are split into options
+    answered = frame.groupby(['key', 'survey_id'])['count'].sum()
+
+    numeric = frame[frame['question_id'].map(lambda i: question_of[i].type in NUMERIC_TYPES)]
+    numeric = numeric.assign(weighted=numeric['value'].astype(float) * numeric['count'])
+    sums = numeric.groupby(['key', 'survey_id'])[['weighted', 'count']].sum()
+    means = (sums['weighted'] / sums['count']).unstack('survey_id').reindex(columns=survey_ids)
+    mean_deltas = means.diff(axis=1)
+
+    categorical = frame[frame['question_id'].map(lambda i: question_of[i].type != 'number')]
+    categorical = expand_checkbox(
+        categorical, [i for i, question in question_of.items() if question.type == 'checkbox']
+    )
+    labels = {
+        (question_id, value): value_label(question_of[question_id], value)
+        for question_id, value in categorical[['question_id', 'value']].drop_duplicates().itertuples(index=False)
+    }
+    categorical = categorical.assign(label=[
+        labels[pair] for pair in zip(categorical['question_id'], categorical['value'])
+    ])
+    counts = categorical.pivot_table(
+        index=['key', 'label'], columns='survey_id', values='count', aggfunc='sum', fill_value=0
+    ).reindex(columns=survey_ids, fill_value=0)
+    totals = answered.unstack('survey_id').reindex(columns=survey_ids)
+    shares = counts.div(totals.reindex(counts.index.get_level_values('key')).to_numpy()) * 100
+    share_deltas = shares.diff(axis=1).round(2)
+    shares = shares.round(2)
+
+    results = []
+    for key, group in aligned:
+        first = group[0]
+        entry = {
+            'key': key,
+            'text': first.text,
+            'question_type': first.type,
+            'question_ids': {question.survey_id: question.id for question in group},
+            'responses': {
+                survey_id: int(answered.get((key, survey_id), 0)) for survey_id in survey_ids
+            },
+        }
+        if first.type in NUMERIC_TYPES:
+            entry['mean'] = _by_survey(means.loc[key] if key in means.index else pd.Series(dtype=float), survey_ids)
+            entry['mean_delta'] = _by_survey(
+                mean_deltas.loc[key] if key in mean_deltas.index else pd.Series(dtype=float), survey_ids
+            )
+        if first.type != 'number':
+            entry['distribution'] = _distribution(
+                group, key, survey_ids, entry['responses'], counts, shares, share_deltas
+            )
+        results.append(entry)
+
+    matched = set(question_of)
+    return {
+        'surveys': survey_summaries(surveys, survey_ids),
+        'questions': results,
+        'unmatched_questions': [
+            {'survey_id': question.survey_id, 'question_id': question.id, 'text': question.text}
+            for question in questions if question.id not in matched
+        ],
+    }
+
+
+def _label_order(label):
+    try:
+        return (0, float(label), label)
+    except ValueError:
+        return (1, 0, label)
+
+
+def _distribution(group, key, survey_ids, responses, counts, shares, share_deltas):
+    """Rows of label, per-survey counts, shares (%) and share deltas (points)"""
+    import pandas as pd
+
+    if key in counts.index.get_level_values('key'):
+        present = list(counts.loc[key].index)
+    else:
+        present = []
+    # Option order of the most recent survey first, then labels only seen earlier
+    ordered = []
+    for question in reversed(group):
+        if question.type in SINGLE_CHOICE_TYPES or question.type == 'checkbox':
+            ordered.extend(label for label in option_values(question) if label not in ordered)
+    ordered.extend(sorted((label for label in present if label not in ordered), key=_label_order))
+
+    rows = []
+    for label in ordered:
+        if label in present:
+            row_counts, row_shares, row_deltas = (
+                counts.loc[(key, label)], shares.loc[(key, label)], share_deltas.loc[(key, label)]
+            )
+        else:
+            # Option never chosen: 0% wherever the question was answered
+            row_counts = row_deltas = pd.Series(dtype=float)
+            row_shares = pd.Series({survey_id: 0.0 for survey_id in survey_ids if responses[survey_id]})
+        rows.append({
+            'label': label,
+            'counts': {survey_id: int(row_counts.get(survey_id, 0)) for survey_id in survey_ids},
+            'shares': _by_survey(row_shares, survey_ids),
+            'share_delta': _by_survey(row_deltas, survey_ids),
+        })
+    return rows
@@ -0,0 +1,171 @@
+"""
+Crosstab (contingency table) analytics.
+
+A question's answers are cross-tabulated against a second question or a
+respondent dimension. Row-layout answers are counted with one self-join
+``GROUP BY`` on ``QuestionResponse`` (served by the ``survey_response,
+question`` unique index); packed responses are tallied in Python.
+"""
+
+import numpy as np
+from django.db.models import Count, F
+
+from .choices import SINGLE_CHOICE_TYPES, normalize_choice, option_values, raw_choice_value
+from .demographics import AGE_BANDS, DIMENSIONS, dimension_expression
+from .models import SurveyResponse
+from .statistics import contingency_statistics
+from .storage import row_answers, unpack_answers
+
+# Answer column holding the category of each supported question type
+CATEGORY_FIELDS = {
+    'radio': 'choice_index',
+    'dropdown': 'choice_index',
+    'rating': 'number_answer',
+    'number': 'number_answer',
+    'boolean': 'boolean_answer',
+}
+
+UNKNOWN_LABEL = 'Unknown'
+
+
+class CrosstabError(ValueError):
+    pass
+
+
+def resolve_axis(survey, spec, allow_dimension=True):
+    """Turn a query parameter into a Question of the survey or a dimension name"""
+    if not spec:
+        raise CrosstabError("Both 'row' and 'column' are required")
+    if str(spec).isdigit():
+        question = survey.questions.filter(id=int(spec)).first()
+        if question is None:
+            raise CrosstabError(f"Question {spec} does not belong to this survey")
+        if question.type not in CATEGORY_FIELDS:
+            raise CrosstabError(
+                f"Question {spec} has type '{question.type}'; crosstabs support "
+                f"{', '.join(CATEGORY_FIELDS)} questions"
+            )
+        return question
+    if not allow_dimension:
+        raise CrosstabError("'row' must be a question id")
+    if spec not in DIMENSIONS:
+        raise CrosstabError(f"Unknown dimension '{spec}'. Choose from: {', '.join(DIMENSIONS)}")
+    if survey.is_anonymous:
+        raise CrosstabError("Respondent dimensions are not available for anonymous surveys")
+    return spec
+
+
+def answer_category(question, answer):
+    """Return the category value of a (possibly unsaved) answer, or None"""
+    if question.type in SINGLE_CHOICE_TYPES:
+        if answer.choice_index is not None:
+            return answer.choice_index
+        try:
+            return normalize_choice(question, raw_choice_value(answer))[0]
+        except ValueError:
+            return None
+    return getattr(answer, CATEGORY_FIELDS[question.type])
+
+
+def category_label(axis, value):
+    if value is None or value == '':
+        return UNKNOWN_LABEL
+    if isinstance(axis, str):
+        return str(value)
+    if axis.type in SINGLE_CHOICE_TYPES:
+        options = option_values(axis)
+        return options[value] if value < len(options) else UNKNOWN_LABEL
+    if axis.type == 'boolean':
+        return 'Yes' if value else 'No'
+    return f'{value:g}'
+
+
+def category_order(axis, values):
+    """Sort raw category values the way they should be displayed"""
+    known = [value for value in values if value is not None and value != '']
+    if axis == 'age_band':
+        order = [label for label, _, _ in AGE_BANDS]
+        known.sort(key=lambda value: order.index(value) if value in order else len(order))
+    else:
+        known.sort()
+    if len(known) < len(values):
+        known.append(None)
+    return known
+
+
+def axis_description(axis):
+    if isinstance(axis, str):
+        return {'type': 'dimension', 'name': axis}
+    return {'type': 'question', 'id': axis.id, 'text': axis.text, 'question_type': axis.type}
+
+
+def crosstab_counts(survey, row_question, column):
+    """Return a list of (row value, column value, count) for both storage layouts"""
+    row_field = CATEGORY_FIELDS[row_question.type]
+    answers = row_answers(survey).filter(question=row_question).exclude(**{f'{row_field}__isnull': True})
+
+    if isinstance(column, str):
+        column_value = dimension_expression(column, prefix='survey_response__respondent__')
+    else:
+        answers = answers.filter(survey_response__answers__question=column)
+        column_value = F(f'survey_response__answers__{CATEGORY_FIELDS[column.type]}')
+
+    counts = [
+        (item['row'], item['column'], item['count'])
+        for item in answers.values(row=F(row_field), column=column_value)
+        .annotate(count=Count('id')).order_by()
+    ]
+
+    # Packed responses: decode the two answers of each response
+    packed = SurveyResponse.objects.filter(survey=survey, packed_answers__isnull=False)
+    if isinstance(column, str):
+        packed = packed.annotate(dimension=dimension_expression(column))
+    tally = {}
+    for item in packed.values('id', 'packed_answers', *(['dimension'] if isinstance(column, str) else [])).iterator():
+        answers_by_question = {
+            answer.question_id: answer
+            for answer in unpack_answers(None, item['packed_answers'])
+        }
+        row_answer = answers_by_question.get(row_question.id)
+        row_value = answer_category(row_question, row_answer) if row_answer else None
+        if row_value is None:
+            continue
+        if isinstance(column, str):
+            column_value = item['dimension']
+        else:
+            column_answer = answers_by_question.get(column.id)
+            column_value = answer_category(column, column_answer) if column_answer else None
+            if column_value is None:
+                continue
+        tally[(row_value, column_value)] = tally.get((row_value, column_value), 0) + 1
+    counts.extend((row, column_value, count) for (row, column_value), count in tally.items())
+    return counts
+
+
+def crosstab(survey, row_question, column):
+    """Contingency table, margins and independence statistics"""
+    counts = crosstab_counts(survey, row_question, column)
+
+    row_values = category_order(row_question, list({row for row, _, _ in counts}))
+    column_values = category_order(column, list({col for _, col, _ in counts}))
+    row_index = {value: i for i, value in enumerate(row_values)}
+    column_index = {value: i for i, value in enumerate(column_values)}
+    unknown_row, unknown_column = row_index.get(None), column_index.get(None)
+
+    table = np.zeros((len(row_values), len(column_values)), dtype=np.int64)
+    if counts:
+        rows = np.array([row_index.get(row, unknown_row) for row, _, _ in counts], dtype=np.int64)
+        columns = np.array([column_index.get(col, unknown_column) for _, col, _ in counts], dtype=np.int64)
+        np.add.at(table, (rows, columns), np.array([count for _, _, count in counts], dtype=np.int64))
+
+    return {
+        'row': axis_description(row_question),
+        'column': axis_description(column),
+        'row_labels': [category_label(row_question, value) for value in row_values],
+        'column_labels': [category_label(column, value) for value in column_values],
+        'table': table.tolist(),
+        'row_totals': table.sum(axis=1).tolist(),
+        'column_totals': table.sum(axis=0).tolist(),
+        'total': int(table.sum()),
+        'statistics': contingency_statistics(table),
+    }
@@ -0,0 +1,150 @@
+"""
+Respondent dimensions and the demographic breakdown engine.
+
+Each dimension is an expression over the respondent (``users.User``) reached
+through a lookup prefix, so the same definitions work from SurveyResponse
+(``respondent__``) and QuestionResponse (``survey_response__respondent__``).
+
+``demographic_breakdowns`` computes any number of single or crossed
+dimensions in one ``UNION ALL`` query and suppresses cells smaller than
+``settings.ANALYTICS_MIN_CELL_SIZE`` (k-anonymity), so results can be
+cached and shared.
+"""
+
+from django.conf import settings
+from django.db.models import Case, CharField, Count, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+# (label, minimum age, maximum age)
+AGE_BANDS = [
+    ('under 18', 0, 17),
+    ('18-29', 18, 29),
+    ('30-44', 30, 44),
+    ('45-64', 45, 64),
+    ('65+', 65, None),
+]
+
+DIMENSIONS = ['role', 'department', 'specialization', 'age_band']
+
+DEFAULT_GROUPINGS = [('role',), ('department',)]
+
+UNKNOWN_LABEL = 'Unknown'
+
+
+def years_ago(today, years):
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:  # 29 February
+        return today.replace(year=today.year - years, day=28)
+
+
+def age_band_expression(prefix='respondent__', today=None):
+    """Case expression mapping date_of_birth to an AGE_BANDS label"""
+    today = today or timezone.localdate()
+    field = f'{prefix}date_of_birth'
+    whens = []
+    for label, low, high in AGE_BANDS:
+        # Born on or before the day they turned ``low``, and after they would be ``high + 1``
+        condition = Q(**{f'{field}__lte': years_ago(today, low)})
+        if high is not None:
+            condition &= Q(**{f'{field}__gt': years_ago(today, high + 1)})
+        whens.append(When(condition, then=Value(label)))
+    return Case(*whens, default=Value(None), output_field=CharField())
+
+
+def dimension_expression(name, prefix='respondent__', today=None):
+    """Return the expression for a respondent dimension"""
+    if name == 'age_band':
+        return age_band_expression(prefix, today)
+    if name not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{name}'. Choose from: {', '.join(DIMENSIONS)}")
+    return F(f'{prefix}{name}')
+
+
+def parse_groupings(value):
+    """Parse ``role,age_band,role+department`` into [('role',), ('age_band',), ('role', 'department')]"""
+    if not value:
+        return list(DEFAULT_GROUPINGS)
+    groupings = []
+    for item in value.split(','):
+        grouping = tuple(name.strip() for name in item.split('+') if name.strip())
+        for name in grouping:
+            if name not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{name}'. Choose from: {', '.join(DIMENSIONS)}")
+        if len(set(grouping)) != len(grouping):
+            raise ValueError(f"Dimension repeated in '{item}'")
+        if grouping and grouping not in groupings:
+            groupings.append(grouping)
+    if not groupings:
+        raise ValueError("No dimensions given")
+    return groupings
+
+
+def min_cell_size(requested=None):
+    """Cell size threshold; callers may raise it but not go below the configured minimum"""
+    minimum = getattr(settings, 'ANALYTICS_MIN_CELL_SIZE', 5)
+    return max(minimum, requested or 0)
+
+
+def suppress(cells, k):
+    """Blank out cells with fewer than ``k`` responses
+
+    When exactly one cell of a grouping is suppressed, the next smallest cell is
+    suppressed too, so the hidden value cannot be recovered from the total.
+    """
+    small = [cell for cell in cells if 0 < cell['count'] < k]
+    if len(small) == 1:
+        others = sorted((cell for cell in cells if cell['count'] >= k), key=lambda cell: cell['count'])
+        small.extend(others[:1])
+    for cell in small:
+        cell['count'] = None
+        cell['suppressed'] = True
+    return len(small)
+
+
+def demographic_breakdowns(survey, groupings=None, k=None, today=None):
+    """Return one block of (suppressed) cell counts per grouping
+
+    Anonymous surveys are never joined to their respondents and return no
+    blocks.
+    """
+    groupings = groupings or list(DEFAULT_GROUPINGS)
+    if survey.is_anonymous:
+        return []
+
+    k = min_cell_size(k)
+    width = max(len(grouping) for grouping in groupings)
+    empty = Value(None, output_field=CharField())
+    responses = survey.responses.all()
+
+    queries = []
+    for index, grouping in enumerate(groupings):
+        dimensions = {
+            f'dim_{i}': dimension_expression(grouping[i], today=today) if i < len(grouping) else empty
+            for i in range(width)
+        }
+        queries.append(
+            responses.annotate(grouping=Value(index, output_field=IntegerField()), **dimensions)
+            .values('grouping', *dimensions)
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+    union = queries[0].union(*queries[1:], all=True) if len(queries) > 1 else queries[0]
+
+    cells = {index: [] for index in range(len(groupings))}
+    for row in union:
+        grouping = groupings[row['grouping']]
+        cell = {name: row[f'dim_{i}'] or UNKNOWN_LABEL for i, name in enumerate(grouping)}
+        cell['count'] = row['count']
+        cells[row['grouping']].append(cell)
+
+    blocks = []
+    for index, grouping in enumerate(groupings):
+        block_cells = sorted(cells[index], key=lambda cell: [str(cell[name]) for name in grouping])
+        suppressed = suppress(block_cells, k)
+        blocks.append({
+            'dimensions': list(grouping),
+            'cells': block_cells,
+            'suppressed_cells': suppressed,
+        })
+    return blocks
@@ -0,0 +1,80 @@
+"""
+Completion duration percentiles.
+
+Percentiles use the nearest-rank method and are computed in the database:
+completed responses are ranked by ``duration_seconds`` with window functions
+and only the rows at the requested ranks are returned.
+"""
+
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Value, When, Window
+)
+from django.db.models.functions import Coalesce, RowNumber
+
+from .models import Question
+
+# In permille, so ranks can be computed with integer arithmetic
+PERCENTILES = {'p50': 500, 'p90': 900, 'p99': 990}
+
+# (label, lowest question count, highest question count)
+QUESTION_COUNT_BANDS = [
+    ('1-10', 1, 10),
+    ('11-25', 11, 25),
+    ('26-50', 26, 50),
+    ('51+', 51, None),
+]
+
+
+def nearest_rank(total, permille):
+    return (total * permille + 999) // 1000
+
+
+def completed_durations(responses):
+    return responses.filter(is_complete=True, duration_seconds__isnull=False)
+
+
+def duration_percentiles(responses, partition='survey_id'):
+    """Return {partition value: {'count': n, 'p50': s, 'p90': s, 'p99': s}}
+
+    ``partition`` is a field or annotation name on ``responses``; all groups
+    are computed in one query.
+    """
+    ranked = completed_durations(responses).annotate(
+        rank=Window(RowNumber(), partition_by=[F(partition)], order_by=F('duration_seconds').asc()),
+        total=Window(Count('id'), partition_by=[F(partition)]),
+    )
+    wanted = Q()
+    for permille in PERCENTILES.values():
+        wanted |= Q(rank=ExpressionWrapper(
+            (F('total') * permille + 999) / 1000, output_field=IntegerField()
+        ))
+
+    results = {}
+    for row in ranked.filter(wanted).values(partition, 'rank', 'total', 'duration_seconds').order_by():
+        group = results.setdefault(row[partition], {'count': row['total']})
+        for name, permille in PERCENTILES.items():
+            if row['rank'] == nearest_rank(row['total'], permille):
+                group[name] = row['duration_seconds']
+    return results
+
+
+def question_count_band():
+    """Annotation mapping each response to its survey's question-count band"""
+    question_count = Coalesce(Subquery(
+        Question.objects.filter(survey=OuterRef('survey_id'))
+        .values('survey_id').annotate(count=Count('id')).values('count')
+    ), 0)
+    whens = []
+    for label, low, high in QUESTION_COUNT_BANDS:
+        condition = Q(question_count__gte=low)
+        if high is not None:
+            condition &= Q(question_count__lte=high)
+        whens.append(When(condition, then=Value(label)))
+    return question_count, Case(*whens, default=Value('0'))
+
+
+def band_percentiles(responses):
+    """Return duration percentiles grouped by question-count band"""
+    question_count, band = question_count_band()
+    annotated = responses.annotate(question_count=question_count).annotate(band=band)
+    return duration_percentiles(annotated, partition='band')
@@ -0,0 +1,247 @@
+"""
+Live survey events for the server-sent-events endpoints.
+
+The submission path publishes one event per new response (and per later
+completion) once its transaction commits. Events go to the survey's channel
+and to the ``surveys`` channel behind the dashboard stream. ``EVENTS_BACKEND``
+picks the broadcast:
+
+* ``local``: an in-process broadcast. Only clients connected to the same
+  process see the events, so it suits a single ASGI worker.
+* ``redis``: Redis pub/sub (``EVENTS_REDIS_URL``), for several workers or
+  separate WSGI and ASGI processes.
+"""
+
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import AnalyticsSketch, SurveyResponse
+from .storage import pack_answer, row_answers
+
+DASHBOARD_CHANNEL = 'surveys'
+
+# Sent instead of the queued events when a slow client falls too far behind
+RESYNC = {'event': 'resync'}
+
+
+def survey_channel(survey_id):
+    return f'survey:{survey_id}'
+
+
+class LocalSubscription:
+    def __init__(self, broadcast, channel):
+        self.broadcast = broadcast
+        self.channel = channel
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.broadcast.add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broadcast.discard(self)
+
+    def deliver(self, message):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout):
+        """Next message, or None after ``timeout`` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroadcast:
+    """In-process broadcast; publish() may be called from any thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def add(self, subscription):
+        with self.lock:
+            self.subscriptions.setdefault(subscription.channel, set()).add(subscription)
+
+    def discard(self, subscription):
+        with self.lock:
+            self.subscriptions.get(subscription.channel, set()).discard(subscription)
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The subscriber's event loop has closed
+                self.discard(subscription)
+
+    def subscribe(self, channel):
+        return LocalSubscription(self, channel)
+
+
+class RedisSubscription:
+    def __init__(self, url, channel):
+        self.url = url
+        self.channel = channel
+
+    async def __aenter__(self):
+        import redis.asyncio as aioredis
+
+        self.client = aioredis.from_url(self.url)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.pubsub.unsubscribe(self.channel)
+        await self.pubsub.close()
+        await self.client.close()
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+
+class RedisBroadcast:
+    """Redis pub/sub broadcast shared by every worker"""
+
+    def __init__(self, url):
+        import redis
+
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.client.publish(channel, json.dumps(message))
+
+    def subscribe(self, channel):
+        return RedisSubscription(self.url, channel)
+
+
+_broadcast = None
+
+
+def broadcast():
+    global _broadcast
+    if _broadcast is None:
+        if settings.EVENTS_BACKEND == 'redis':
+            _broadcast = RedisBroadcast(settings.EVENTS_REDIS_URL)
+        else:
+            _broadcast = LocalBroadcast()
+    return _broadcast
+
+
+def publish_event(event):
+    """Publish a survey event to its survey channel and the dashboard channel"""
+    def send():
+        backend = broadcast()
+        backend.publish(survey_channel(event['survey_id']), event)
+        backend.publish(DASHBOARD_CHANNEL, event)
+
+    # Listeners must never see a response that was rolled back
+    transaction.on_commit(send)
+
+
+def response_event(survey_response, event, question_deltas=None):
+    return {
+        'event': event,
+        'survey_id': survey_response.survey_id,
+        'owner_id': survey_response.survey.created_by_id,
+        'respondent_id': survey_response.respondent_id,
+        'response_id': survey_response.id,
+        'is_complete': survey_response.is_complete,
+        'question_deltas': question_deltas or {},
+        'at': timezone.now().isoformat(),
+    }
+
+
+def publish_submission(survey_response, answers):
+    """Publish a new response with the per-question answer count deltas"""
+    deltas = {}
+    for answer in answers:
+        if pack_answer(answer) is not None:
+            question_id = str(answer['question'].id)
+            deltas[question_id] = deltas.get(question_id, 0) + 1
+    publish_event(response_event(survey_response, 'response', deltas))
+
+
+def publish_completion(survey_response):
+    """Publish a response that was completed after it was submitted"""
+    publish_event(response_event(survey_response, 'completion'))
+
+
+def survey_counts(survey):
+    """Initial ``snapshot`` event the per-question deltas of a survey stream apply to
+
+    Events for responses up to ``last_response_id`` are already counted.
+    """
+    with transaction.atomic():
+        responses = SurveyResponse.objects.filter(survey=survey)
+        totals = responses.aggregate(
+            responses=Count('id'), completed=Count('id', filter=Q(is_complete=True)), last=Max('id')
+        )
+        shards = list(AnalyticsSketch.objects.filter(survey=survey).values_list('answered', flat=True))
+        if shards:
+            # The sketch is updated in the submission transaction, so it
+            # matches the response totals without scanning any answers
+            answered = {}
+            for shard in shards:
+                for key, count in shard.items():
+                    answered[key] = answered.get(key, 0) + count
+        else:
+            answered = {
+                str(question_id): count for question_id, count in
+                row_answers(survey).values_list('question_id').annotate(count=Count('id')).order_by()
+            }
+            packed = responses.filter(packed_answers__isnull=False).values_list('packed_answers', flat=True)
+            for answers in packed.iterator():
+                for key in answers:
+                    answered[key] = answered.get(key, 0) + 1
+    return {
+        'event': 'snapshot',
+        'survey_id': survey.id,
+        'total_responses': totals['responses'],
+        'completed_responses': totals['completed'],
+        'question_counts': answered,
+        'last_response_id': totals['last'] or 0,
+        'at': timezone.now().isoformat(),
+    }
+
+
+def redact_event(event, user):
+    """The event with the respondent only named to admins, plus whether it is the user's own"""
+    if 'respondent_id' not in event:
+        return event
+    event = dict(event, mine=event['respondent_id'] == user.id)
+    if user.role != 'admin':
+        del event['respondent_id']
+    return event
+
+
+def dashboard_event(event, user):
+    """The event as shown on a user's dashboard, or None if it does not count there"""
+    if 'survey_id' in event and user.role != 'admin' and event['respondent_id'] != user.id and not (
+        user.role in ['healthcare_provider', 'researcher'] and event['owner_id'] == user.id
+    ):
+        return None
+    return redact_event(event, user)
+
+
+def format_event(message):
+    """Encode a message as a server-sent event"""
+    return f"event: {message['event']}\ndata: {json.dumps(message, default=str)}\n\n"
@@ -0,0 +1,155 @@
+"""
+Per-question drop-off funnel.
+
+For every response, the last answered question (by ``Question.order``) is
+found with a window function. The same query also returns the answers to
+questions that control ``show_if_question`` branches, so questions that a
+response legitimately skipped are not counted as reached. Counting is then
+done with NumPy arrays holding one entry per response.
+"""
+
+import numpy as np
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import SurveyResponse
+from .storage import pack_answer, row_answers, unpack_answers
+
+
+def normalize_value(value):
+    """Comparable form of an answer value or a show_if_answer value"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().lower()
+
+
+def answer_values(answer):
+    """Normalized values of an answer; checkbox answers give one value per option"""
+    entry = pack_answer(answer)
+    if not entry:
+        return []
+    value = entry[1]
+    return [normalize_value(v) for v in value] if isinstance(value, list) else [normalize_value(value)]
+
+
+def last_answers(survey, questions, controlling_ids):
+    """Return ({response id: (order, question id)}, [(response id, controlling answer)])
+
+    The first dict covers incomplete responses with at least one answer.
+    Row-layout responses are read with one windowed query; packed responses
+    are decoded.
+    """
+    ranked = row_answers(survey).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('survey_response_id')],
+            order_by=[F('question__order').desc(), F('question_id').desc()],
+        ),
+        order=F('question__order'),
+    ).filter(
+        Q(position=1, survey_response__is_complete=False) | Q(question_id__in=controlling_ids)
+    )
+
+    last = {}
+    controlling = []
+    for answer in ranked.defer('created_at'):
+        if answer.position == 1:
+            last[answer.survey_response_id] = (answer.order, answer.question_id)
+        if answer.question_id in controlling_ids:
+            controlling.append((answer.survey_response_id, answer))
+
+    packed = SurveyResponse.objects.filter(survey=survey, packed_answers__isnull=False)
+    incomplete = set(packed.filter(is_complete=False).values_list('id', flat=True))
+    orders = {question.id: question.order for question in questions}
+    for survey_response in packed.only('id', 'started_at', 'packed_answers').iterator():
+        answers = [
+            answer for answer in unpack_answers(survey_response, survey_response.packed_answers)
+            if answer.question_id in orders
+        ]
+        if answers and survey_response.id in incomplete:
+            last[survey_response.id] = max((orders[a.question_id], a.question_id) for a in answers)
+        controlling.extend(
+            (survey_response.id, answer) for answer in answers if answer.question_id in controlling_ids
+        )
+
+    return last, controlling
+
+
+def survey_funnel(survey):
+    """Reach, answers and abandonment for every question of a survey"""
+    questions = list(survey.questions.all())
+    controlling_ids = {q.show_if_question_id for q in questions if q.show_if_question_id}
+    last, controlling = last_answers(survey, questions, controlling_ids)
+
+    responses = list(survey.responses.values_list('id', 'is_complete').order_by('id'))
+    position = {response_id: i for i, (response_id, _) in enumerate(responses)}
+    complete = np.array([is_complete for _, is_complete in responses], dtype=bool)
+
+    # Order of the last answered question; complete responses reached every
+    # question and -inf marks responses without any answer
+    reached_order = np.full(len(responses), -np.inf)
+    last_question = np.zeros(len(responses), dtype=np.int64)
+    for response_id, (order, question_id) in last.items():
+        if response_id in position:
+            reached_order[position[response_id]] = order
+            last_question[position[response_id]] = question_id
+    reached_order[complete] = np.inf
+
+    abandoned_ids, abandoned_counts = np.unique(
+        last_question[~complete & ~np.isneginf(reached_order)], return_counts=True
+    )
+    abandoned = dict(zip(abandoned_ids.tolist(), abandoned_counts.tolist()))
+
+    # {controlling question: {normalized value: bool array over responses}}
+    matches = {}
+    for response_id, answer in controlling:
+        if response_id not in position:
+            continue
+        by_value = matches.setdefault(answer.question_id, {})
+        for value in answer_values(answer):
+            by_value.setdefault(value, np.zeros(len(responses), dtype=bool))[position[response_id]] = True
+
+    answered = dict(
+        row_answers(survey).values_list('question_id').annotate(count=Count('id')).order_by()
+    )
+    for packed in survey.responses.filter(packed_answers__isnull=False).values_list('packed_answers', flat=True):
+        for key in packed:
+            answered[int(key)] = answered.get(int(key), 0) + 1
+
+    funnel = []
+    for question in questions:
+        reached = reached_order >= question.order
+        eligible = reached
+        if question.show_if_question_id:
+            # Only responses whose branch showed the question count towards its reach
+            expected = question.show_if_answer
+            expected = expected if isinstance(expected, list) else [expected]
+            visible = np.zeros(len(responses), dtype=bool)
+            for value in expected:
+                hit = matches.get(question.show_if_question_id, {}).get(normalize_value(value))
+                if hit is not None:
+                    visible |= hit
+            eligible = reached & visible
+
+        reached_count = int(eligible.sum())
+        abandoned_count = abandoned.get(question.id, 0)
+        funnel.append({
+            'question_id': question.id,
+            'question_text': question.text,
+            'order': question.order,
+            'conditional': bool(question.show_if_question_id),
+            'reached': reached_count,
+            'skipped_by_branching': int(reached.sum()) - reached_count,
+            'answered': answered.get(question.id, 0),
+            'abandoned': abandoned_count,
+            'abandonment_rate': round(abandoned_count / reached_count * 100, 2) if reached_count else 0,
+        })
+
+    return {
+        'total_responses': len(responses),
+        'completed_responses': int(complete.sum()),
+        'abandoned_without_answers': int(np.count_nonzero(~complete & np.isneginf(reached_order))),
+        'questions': funnel,
+    }
@@ -0,0 +1,176 @@
+"""
+Offline kiosks: survey bundles and batched submission sync.
+
+A kiosk downloads a bundle of the active surveys it may show: survey
+settings, questions in display order and the conditional-logic graph. The
+bundle's ``version`` is a hash of its content and is sent as the ETag, so a
+kiosk revalidating an unchanged bundle gets a 304 instead of the payload.
+
+Submissions queued while offline are uploaded in batches. Each carries a
+client-generated ``client_id``, stored unique on the response, so re-sending
+a batch after a lost reply creates nothing twice. A batch is written in one
+transaction with bulk inserts. Invalid submissions are reported and skipped.
+"""
+
+import hashlib
+import json
+
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .funnel import normalize_value
+from .models import Question, SurveyResponse
+from .serializers import KioskSubmissionSerializer
+from .storage import is_packed, pack_answers
+from .submissions import save_submissions
+
+SURVEY_FIELDS = ['id', 'title', 'description', 'category', 'is_anonymous', 'allow_multiple_responses',
+                 'start_date', 'end_date', 'estimated_duration', 'updated_at']
+QUESTION_FIELDS = ['id', 'text', 'type', 'order', 'is_required', 'options', 'min_value', 'max_value',
+                   'placeholder', 'help_text']
+
+
+def kiosk_surveys(visible):
+    """The active, currently open surveys among ``visible`` (a Survey queryset)"""
+    now = timezone.now()
+    return visible.filter(status='active').filter(
+        Q(start_date__isnull=True) | Q(start_date__lte=now),
+        Q(end_date__isnull=True) | Q(end_date__gte=now),
+    )
+
+
+def logic_graph(questions):
+    """Conditional display rules of a survey's questions
+
+    ``conditions`` maps a question to the question and answers that show it
+    (any of the normalized values, as ``surveys.funnel`` compares them).
+    ``dependents`` maps a question to the questions its answer shows, so a
+    kiosk knows what to re-evaluate after each answer.
+    """
+    conditions, dependents = {}, {}
+    for question in questions:
+        if not question.show_if_question_id:
+            continue
+        expected = question.show_if_answer
+        expected = expected if isinstance(expected, list) else [expected]
+        conditions[str(question.id)] = {
+            'question': question.show_if_question_id,
+            'any_of': [normalize_value(value) for value in expected],
+        }
+        dependents.setdefault(str(question.show_if_question_id), []).append(question.id)
+    return {'conditions': conditions, 'dependents': dependents}
+
+
+def compact(row):
+    """Drop empty values; a kiosk treats missing keys as their defaults"""
+    return {key: value for key, value in row.items() if value not in (None, '', [], {})}
+
+
+def build_bundle(surveys):
+    """({surveys: [...]}, version) for a Survey queryset; two queries"""
+    surveys = list(surveys.order_by('id').values(*SURVEY_FIELDS))
+    questions = {}
+    for question in Question.objects.filter(survey_id__in=[s['id'] for s in surveys]).order_by('order', 'id').only(
+        *QUESTION_FIELDS, 'survey_id', 'show_if_question_id', 'show_if_answer'
+    ):
+        questions.setdefault(question.survey_id, []).append(question)
+
+    bundle = []
+    for survey in surveys:
+        survey_questions = questions.get(survey['id'], [])
+        bundle.append({
+            **compact(survey),
+            'questions': [compact({field: getattr(q, field) for field in QUESTION_FIELDS}) for q in survey_questions],
+            'logic': logic_graph(survey_questions),
+        })
+    content = {'surveys': bundle}
+    encoded = json.dumps(content, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+    return content, hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+def sync_submissions(submissions, visible, request_meta):
+    """Validate and store queued kiosk submissions; [{client_id, status, ...}] in order
+
+    ``status`` is ``created`` (with the new ``response_id``), ``duplicate``
+    (with the ``response_id`` stored earlier) or ``invalid`` (with ``errors``).
+    """
+    try:
+        return store_submissions(submissions, visible, request_meta)
+    except IntegrityError:
+        # A concurrent sync stored some of the same client ids first; they
+        # are committed now, so a second pass reports them as duplicates
+        return store_submissions(submissions, visible, request_meta)
+
+
+def store_submissions(submissions, visible, request_meta):
+    survey_ids = set()
+    for item in submissions:
+        try:
+            survey_ids.add(int(item['survey']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    surveys = {survey.id: survey for survey in kiosk_surveys(visible).filter(id__in=survey_ids)}
+    context = {
+        'surveys': surveys,
+        'questions': {question.id: question for question in Question.objects.filter(survey__in=list(surveys))},
+    }
+    client_ids = [item.get('client_id') for item in submissions if isinstance(item, dict)]
+    stored = dict(
+        SurveyResponse.objects.filter(client_id__in=[i for i in client_ids if isinstance(i, str)])
+        .values_list('client_id', 'id')
+    )
+
+    results, pending, seen = [], [], set()
+    now = timezone.now()
+    for item in submissions:
+        serializer = KioskSubmissionSerializer(data=item, context=context)
+        if not serializer.is_valid():
+            results.append({
+                'client_id': item.get('client_id') if isinstance(item, dict) else None,
+                'status': 'invalid',
+                'errors': serializer.errors,
+            })
+            continue
+        data = serializer.validated_data
+        client_id = data['client_id']
+        if client_id in stored or client_id in seen:
+            results.append({'client_id': client_id, 'status': 'duplicate', 'response_id': stored.get(client_id)})
+            continue
+        seen.add(client_id)
+        result = {'client_id': client_id, 'status': 'created'}
+        results.append(result)
+        pending.append((result, data, new_response(data, request_meta, now)))
+
+    # Written in one transaction, with other requests' submissions (see surveys.submissions)
+    responses = save_submissions([(response, data['answers']) for _, data, response in pending])
+    for (result, _, _), response in zip(pending, responses):
+        result['response_id'] = response.id
+    # Duplicates within the batch point at the response created for the first copy
+    created = {result['client_id']: result['response_id'] for result, _, _ in pending}
+    for result in results:
+        if result['status'] == 'duplicate' and result['response_id'] is None:
+            result['response_id'] = created.get(result['client_id'])
+    return results
+
+
+def new_response(data, request_meta, now):
+    """Unsaved SurveyResponse for a validated kiosk submission"""
+    survey = data['survey']
+    started_at = min(data.get('started_at') or now, now)
+    completed_at = None
+    if data['is_complete']:
+        completed_at = min(max(data.get('completed_at') or now, started_at), now)
+    return SurveyResponse(
+        survey=survey,
+        client_id=data['client_id'],
+        # Each kiosk submission is a different (anonymous) respondent
+        session_id=data['client_id'],
+        started_at=started_at,
+        completed_at=completed_at,
+        is_complete=data['is_complete'],
+        ip_address=request_meta.get('REMOTE_ADDR'),
+        user_agent=request_meta.get('HTTP_USER_AGENT', ''),
+        packed_answers=pack_answers(data['answers']) if is_packed(survey) else None,
+    )
@@ -0,0 +1,110 @@
+"""Synthetic survey data shared by the benchmark commands."""
+
+import random
+import uuid
+from datetime import date
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from surveys.choices import CHOICE_TYPES, normalize_choice, raw_choice_value
+from surveys.models import Survey, Question, SurveyResponse, QuestionResponse
+
+User = get_user_model()
+
+QUESTION_MIX = ['rating', 'radio', 'checkbox', 'text', 'number', 'boolean', 'date', 'dropdown']
+OPTIONS = ['Never', 'Rarely', 'Sometimes', 'Often', 'Always']
+
+
+def benchmark_user(role='admin'):
+    user, _ = User.objects.get_or_create(
+        username=f'benchmark-{role}',
+        defaults={'role': role, 'email': f'benchmark-{role}@example.com'},
+    )
+    return user
+
+
+def create_survey(user, questions=20, **fields):
+    survey = Survey.objects.create(
+        title=fields.pop('title', f'Benchmark survey {uuid.uuid4().hex[:8]}'),
+        description='Synthetic survey used for benchmarking',
+        created_by=user,
+        status='active',
+        target_roles=['patient'],
+        **fields,
+    )
+    Question.objects.bulk_create([
+        Question(
+            survey=survey,
+            text=f'Question {i + 1}',
+            type=QUESTION_MIX[i % len(QUESTION_MIX)],
+            order=i + 1,
+            options=OPTIONS if QUESTION_MIX[i % len(QUESTION_MIX)] in ['radio', 'checkbox', 'dropdown'] else [],
+            min_value=1 if QUESTION_MIX[i % len(QUESTION_MIX)] == 'rating' else None,
+            max_value=5 if QUESTION_MIX[i % len(QUESTION_MIX)] == 'rating' else None,
+        )
+        for i in range(questions)
+    ])
+    return survey
+
+
+def random_answer(question, rng=random):
+    """Return submission data for one answer, as the API would receive it"""
+    if question.type == 'rating':
+        return {'question': question.id, 'number_answer': rng.randint(1, 5)}
+    if question.type == 'number':
+        return {'question': question.id, 'number_answer': round(rng.gauss(50, 15), 1)}
+    if question.type in ['radio', 'dropdown']:
+        return {'question': question.id, 'text_answer': rng.choice(OPTIONS)}
+    if question.type == 'checkbox':
+        return {'question': question.id, 'json_answer': rng.sample(OPTIONS, rng.randint(1, 3))}
+    if question.type == 'boolean':
+        return {'question': question.id, 'boolean_answer': rng.random() < 0.5}
+    if question.type == 'date':
+        return {'question': question.id, 'date_answer': f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'}
+    return {'question': question.id, 'text_answer': rng.choice(['Fine', 'Some pain at night', 'Better than last week'])}
+
+
+def random_submission(survey, questions, rng=random, complete=True):
+    return {
+        'survey': survey.id,
+        'session_id': uuid.uuid4().hex,
+        'is_complete': complete,
+        'answers': [random_answer(question, rng) for question in questions],
+    }
+
+
+def fake_request(user):
+    """Minimal request object accepted by the response serializers"""
+    return SimpleNamespace(user=user, META={'REMOTE_ADDR': '127.0.0.1', 'HTTP_USER_AGENT': 'benchmark'})
+
+
+def bulk_responses(survey, questions, count, rng=random, batch_size=2000):
+    """Insert ``count`` completed row-layout responses directly, bypassing the API"""
+    now = timezone.now()
+    question_by_id = {question.id: question for question in questions}
+    for first in range(0, count, batch_size):
+        responses = SurveyResponse.objects.bulk_create([
+            SurveyResponse(
+                survey=survey,
+                session_id=uuid.uuid4().hex,
+                is_complete=True,
+                completed_at=now,
+                duration_seconds=rng.uniform(60, 1800),
+            )
+            for _ in range(min(batch_size, count - first))
+        ])
+        answers = []
+        for survey_response in responses:
+            for question in questions:
+                answer = random_answer(question, rng)
+                question_id = answer.pop('question')
+                if question.type in CHOICE_TYPES:
+                    answer['choice_index'], answer['choice_mask'] = normalize_choice(
+                        question_by_id[question_id], raw_choice_value(answer)
+                    )
+                if 'date_answer' in answer:
+                    answer['date_answer'] = date.fromisoformat(answer['date_answer'])
+                answers.append(QuestionResponse(survey_response=survey_response, question_id=question_id, **answer))
+        QuestionResponse.objects.bulk_create(answers, batch_size=batch_size)
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from surveys.models import Question, QuestionResponse
+from surveys.choices import CHOICE_TYPES, normalize_choice, raw_choice_value
+
+
+class Command(BaseCommand):
+    help = 'Populate choice_index/choice_mask for existing radio, dropdown and checkbox answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey', type=int, help='Only backfill answers to this survey')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--recompute', action='store_true',
+                            help='Recompute every answer, e.g. after question options were edited')
+
+    def handle(self, *args, **options):
+        questions = Question.objects.filter(type__in=CHOICE_TYPES)
+        if options['survey']:
+            questions = questions.filter(survey_id=options['survey'])
+
+        updated = unmatched = 0
+        for question in questions.iterator():
+            answers = QuestionResponse.objects.filter(question=question).order_by('id')
+            if not options['recompute']:
+                answers = answers.filter(choice_index__isnull=True, choice_mask__isnull=True)
+
+            last_id = 0
+            while True:
+                batch = list(
+                    answers.filter(id__gt=last_id)
+                    .only('id', 'text_answer', 'json_answer', 'choice_index', 'choice_mask')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                for answer in batch:
+                    try:
+                        answer.choice_index, answer.choice_mask = normalize_choice(
+                            question, raw_choice_value(answer)
+                        )
+                    except ValueError:
+                        # Leave legacy values that match no option unindexed
+                        answer.choice_index = answer.choice_mask = None
+                        unmatched += 1
+                with transaction.atomic():
+                    QuestionResponse.objects.bulk_update(batch, ['choice_index', 'choice_mask'])
+                updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {updated} answers ({unmatched} did not match any option)"
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from surveys.models import SurveyResponse
+
+
+class Command(BaseCommand):
+    help = 'Populate duration_seconds for completed responses recorded before it was stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        pending = SurveyResponse.objects.filter(
+            completed_at__isnull=False, duration_seconds__isnull=True
+        ).only('id', 'started_at', 'completed_at', 'duration_seconds').order_by('id')
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for survey_response in batch:
+                survey_response.duration_seconds = survey_response.compute_duration()
+            with transaction.atomic():
+                SurveyResponse.objects.bulk_update(batch, ['duration_seconds'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled durations for {updated} responses"))
@@ -0,0 +1,73 @@
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from surveys.pagination import ApproximateCountPaginator
+from ._synthetic import benchmark_user, bulk_responses, create_survey
+
+CHANGELISTS = [
+    ('survey', ''),
+    ('question', ''),
+    ('surveyresponse', ''),
+    ('surveyresponse', 'q=benchmark-admin'),
+    ('questionresponse', ''),
+    ('questionresponse', 'q=1'),
+    ('questionresponse', 'q=pain'),
+    ('surveyinvitation', ''),
+]
+
+
+class Command(BaseCommand):
+    help = 'Count the queries behind each admin changelist; fails if they grow with the data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--surveys', type=int, default=5, help='Surveys added between the two measurements')
+        parser.add_argument('--responses', type=int, default=200, help='Responses per added survey')
+
+    def handle(self, *args, **options):
+        # Everything is rolled back, so the check can run against a real database
+        with transaction.atomic():
+            user = benchmark_user()
+            user.is_staff = user.is_superuser = True
+            user.save(update_fields=['is_staff', 'is_superuser'])
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+
+            # Estimate counts as if the tables had millions of rows
+            with mock.patch.object(ApproximateCountPaginator, 'exact_count_limit', 0):
+                self.add_surveys(user, 1, 10)
+                small = self.measure_all(client, 'small')
+                self.add_surveys(user, options['surveys'], options['responses'])
+                large = self.measure_all(client, 'large')
+            transaction.set_rollback(True)
+
+        grown = [name for name in small if large[name] != small[name]]
+        if grown:
+            raise CommandError(f"Changelist queries depend on the data size: {', '.join(grown)}")
+        self.stdout.write(self.style.SUCCESS('Admin changelist queries are constant'))
+
+    def add_surveys(self, user, count, responses):
+        for _ in range(count):
+            survey = create_survey(user, questions=8)
+            bulk_responses(survey, list(survey.questions.all()), responses)
+
+    def measure_all(self, client, label):
+        queries = {}
+        for model, params in CHANGELISTS:
+            name = f"{model}?{params}" if params else model
+            url = f'/admin/surveys/{model}/' + (f'?{params}' if params else '')
+            # The query log is capped; creating the data may have filled it
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            self.stdout.write(f"{label:>5} {name:<40} {len(captured):>3} queries, {elapsed * 1000:.1f} ms")
+            queries[name] = len(captured)
+        return queries
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from surveys.models import Survey, SurveyResponse, QuestionResponse
+from surveys.serializers import SurveyResponseCreateSerializer
+from surveys.storage import response_answers
+from ._synthetic import benchmark_user, create_survey, random_submission, fake_request
+
+
+def table_bytes(table):
+    """On-disk size of a table, where the backend can report it"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+        else:
+            return None
+        return cursor.fetchone()[0] or 0
+
+
+class Command(BaseCommand):
+    help = 'Compare storage size and submission throughput of row and packed answer storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=80)
+        parser.add_argument('--responses', type=int, default=200)
+
+    def handle(self, *args, **options):
+        # Everything is rolled back, so the benchmark can run against a real database
+        with transaction.atomic():
+            user = benchmark_user()
+            for layout in ['rows', 'packed']:
+                self.run_layout(user, layout, options['questions'], options['responses'])
+            transaction.set_rollback(True)
+
+    def run_layout(self, user, layout, question_count, response_count):
+        survey = create_survey(user, questions=question_count, answer_storage=layout)
+        questions = list(survey.questions.all())
+        request = fake_request(user)
+        submissions = [random_submission(survey, questions) for _ in range(response_count)]
+
+        tables = [SurveyResponse._meta.db_table, QuestionResponse._meta.db_table]
+        before = {table: table_bytes(table) for table in tables}
+
+        start = time.perf_counter()
+        for data in submissions:
+            serializer = SurveyResponseCreateSerializer(data=data, context={'request': request})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        elapsed = time.perf_counter() - start
+
+        read_start = time.perf_counter()
+        for survey_response in SurveyResponse.objects.filter(survey=survey).prefetch_related('answers'):
+            response_answers(survey_response)
+        read_elapsed = time.perf_counter() - read_start
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{layout} layout'))
+        self.stdout.write(f'  submissions/sec: {response_count / elapsed:.1f}')
+        self.stdout.write(f'  answer rows: {QuestionResponse.objects.filter(survey_response__survey=survey).count()}')
+        self.stdout.write(f'  read all responses: {read_elapsed * 1000:.1f} ms')
+        for table in tables:
+            after = table_bytes(table)
+            if after is not None:
+                self.stdout.write(f'  {table} growth: {(after - before[table]) / 1024:.1f} KiB')
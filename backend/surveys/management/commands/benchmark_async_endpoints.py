@@ -0,0 +1,141 @@
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from surveys.models import Survey
+from ._synthetic import benchmark_user, bulk_responses, create_survey
+
+# Cheap endpoints measured while analytics run, relative to the API root
+CHEAP_PATHS = ['users/profile/', 'surveys/dashboard/stats/', 'surveys/{survey}/', 'surveys/']
+
+ROOTS = {'sync (DRF)': '/api/', 'async': '/api/async/'}
+
+
+class ASGIClient:
+    """Calls the project's ASGI application directly, as an ASGI server would"""
+
+    def __init__(self, key):
+        self.application = get_asgi_application()
+        self.headers = [(b'host', b'localhost'), (b'authorization', f'Token {key}'.encode())]
+
+    async def get(self, path):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': b'', 'root_path': '', 'headers': self.headers,
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        status = None
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await self.application(scope, receive, send)
+        return status
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Measure cheap-endpoint latency through the ASGI handler while analytics requests run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey', type=int, help='Use an existing survey instead of a synthetic one')
+        parser.add_argument('--questions', type=int, default=40)
+        parser.add_argument('--responses', type=int, default=3000)
+        parser.add_argument('--requests', type=int, default=200, help='Cheap requests per phase')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent cheap-request clients')
+        parser.add_argument('--analytics', type=int, default=2, help='Concurrent analytics clients')
+        parser.add_argument('--executor', choices=['thread', 'process'],
+                            help='Override ASYNC_ANALYTICS_EXECUTOR for the async endpoints')
+
+    def handle(self, *args, **options):
+        user = benchmark_user('admin')
+        token, _ = Token.objects.get_or_create(user=user)
+        created = options['survey'] is None
+        if created:
+            # Committed rather than rolled back: analytics run on other threads and connections
+            self.stdout.write(f"Creating {options['responses']} responses x {options['questions']} questions...")
+            survey = create_survey(user, questions=options['questions'])
+            bulk_responses(survey, list(survey.questions.all()), options['responses'], random.Random(0))
+        else:
+            survey = Survey.objects.get(id=options['survey'])
+
+        executor = {'ASYNC_ANALYTICS_EXECUTOR': options['executor']} if options['executor'] else {}
+        try:
+            with override_settings(**executor):
+                asyncio.run(self.run_benchmark(survey, token.key, options))
+        finally:
+            if created:
+                survey.delete()
+
+    async def run_benchmark(self, survey, key, options):
+        client = ASGIClient(key)
+        if (os.cpu_count() or 1) < 2:
+            self.stdout.write(self.style.WARNING(
+                'Only one CPU: analytics work competes with cheap requests for it whichever executor runs it'
+            ))
+        self.stdout.write(
+            f"{'endpoints':<12} {'phase':<16} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'analytics done':>15}"
+        )
+        for name, root in ROOTS.items():
+            paths = [root + path.format(survey=survey.id) for path in CHEAP_PATHS]
+            analytics_path = f'{root}surveys/{survey.id}/analytics/'
+            # Warm up imports, connections and the analytics executor
+            for path in paths + [analytics_path]:
+                status = await client.get(path)
+                assert status == 200, (path, status)
+
+            idle, _ = await self.phase(client, paths, None, options)
+            loaded, completed = await self.phase(client, paths, analytics_path, options)
+            for phase, latencies, done in [('idle', idle, ''), ('during analytics', loaded, completed)]:
+                self.stdout.write(
+                    f"{name:<12} {phase:<16} {statistics.median(latencies):8.1f} "
+                    f"{percentile(latencies, 0.95):8.1f} {max(latencies):8.1f} {done:>15}"
+                )
+
+    async def phase(self, client, paths, analytics_path, options):
+        """Run the cheap requests, optionally with analytics clients looping in the background"""
+        stop = asyncio.Event()
+        completed = 0
+
+        async def analytics_client():
+            nonlocal completed
+            while not stop.is_set():
+                await client.get(analytics_path)
+                completed += 1
+
+        background = []
+        if analytics_path:
+            background = [asyncio.create_task(analytics_client()) for _ in range(options['analytics'])]
+            # Let the analytics requests get going first
+            await asyncio.sleep(0.05)
+
+        latencies = []
+        pending = iter(range(options['requests']))
+
+        async def cheap_client():
+            for i in pending:
+                start = time.perf_counter()
+                await client.get(paths[i % len(paths)])
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(cheap_client() for _ in range(options['concurrency'])))
+        stop.set()
+        await asyncio.gather(*background)
+        return latencies, completed
@@ -0,0 +1,91 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from surveys.serializers import SurveyResponseCreateSerializer
+from ._synthetic import benchmark_user, create_survey, fake_request, random_submission
+
+# What the dashboard loads
+DASHBOARD = [
+    {'id': 'profile', 'path': '/users/profile/'},
+    {'id': 'stats', 'path': '/surveys/dashboard/stats/'},
+    {'id': 'surveys', 'path': '/surveys/?fields=id,title,status,total_responses'},
+    {'id': 'recent', 'path': '/surveys/responses/?fields=id,survey_title,started_at,is_complete'},
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare loading the dashboard with separate requests and with one /api/batch/ request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--surveys', type=int, default=10)
+        parser.add_argument('--responses', type=int, default=20, help='Responses per survey')
+        parser.add_argument('--repeat', type=int, default=30, help='Loads per measurement (median is reported)')
+        parser.add_argument('--rtt-ms', type=float, default=80.0,
+                            help='Network round trip added per request in the page load estimate')
+
+    def handle(self, *args, **options):
+        user = benchmark_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        # Concurrent sub-requests use their own connections, which cannot see
+        # uncommitted data, so the data is committed and deleted afterwards
+        surveys = []
+        try:
+            request = fake_request(user)
+            for _ in range(options['surveys']):
+                survey = create_survey(user, questions=10)
+                surveys.append(survey)
+                questions = list(survey.questions.all())
+                for _ in range(options['responses']):
+                    serializer = SurveyResponseCreateSerializer(
+                        data=random_submission(survey, questions), context={'request': request}
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+
+            client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+            rtt = options['rtt_ms']
+            separate = self.measure(options['repeat'], lambda: [
+                self.get(client, '/api' + spec['path']) for spec in DASHBOARD
+            ])
+            self.report('Separate requests', separate, len(DASHBOARD), rtt)
+            for workers in [1, 4]:
+                with override_settings(BATCH_WORKERS=workers):
+                    batched = self.measure(options['repeat'], lambda: self.batch(client))
+                self.report(f'Batch, {workers} worker{"s" if workers > 1 else ""}', batched, 1, rtt)
+        finally:
+            for survey in surveys:
+                survey.delete()
+
+        self.stdout.write(self.style.SUCCESS('Batch benchmark finished'))
+
+    def get(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}: {response.content[:200]}')
+
+    def batch(self, client):
+        response = client.post('/api/batch/', {'requests': DASHBOARD}, content_type='application/json')
+        if response.status_code != 200:
+            raise CommandError(f'Batch returned {response.status_code}: {response.content[:200]}')
+        failed = [r['id'] for r in response.json()['responses'] if r['status'] != 200]
+        if failed:
+            raise CommandError(f"Sub-requests failed: {', '.join(failed)}")
+
+    def measure(self, repeat, load):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            load()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings) * 1000
+
+    def report(self, label, server_ms, round_trips, rtt):
+        self.stdout.write(
+            f"{label:<20} server {server_ms:6.1f} ms, {round_trips} round trip{'s' if round_trips > 1 else ''}, "
+            f"page load at {rtt:.0f} ms RTT: {server_ms + round_trips * rtt:6.1f} ms"
+        )
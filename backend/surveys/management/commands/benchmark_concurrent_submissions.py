@@ -0,0 +1,121 @@
+import logging
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from surveys.submissions import submission_writer
+from ._synthetic import benchmark_user, create_survey, random_submission
+
+# Journal mode, per-connection pragmas and whether the submission writer is on
+CONFIGURATIONS = [
+    ('rollback journal, direct writes', 'DELETE', {}, False),
+    ('WAL profile, direct writes', None, None, False),
+    ('WAL profile, single writer', None, None, True),
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Submit responses from many threads at once and count "database is locked" errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submitters', type=int, default=200, help='Threads submitting at the same time')
+        parser.add_argument('--submissions', type=int, default=5, help='Submissions per thread')
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--layout', choices=['rows', 'packed'], default='rows')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('This benchmark is for the SQLite backend')
+        user = benchmark_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        # Submitters use their own connections and cannot see uncommitted
+        # data, so the data is committed and deleted afterwards
+        survey = create_survey(user, questions=options['questions'], answer_storage=options['layout'])
+        # Failed requests are counted below rather than logged one by one
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            questions = list(survey.questions.order_by('order'))
+            for label, journal_mode, pragmas, writer in CONFIGURATIONS:
+                profile = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+                with override_settings(SQLITE_PRAGMAS=profile, SUBMISSION_WRITER_ENABLED=writer):
+                    # Journal modes only change while no other connection is open
+                    connections.close_all()
+                    if journal_mode:
+                        with connection.cursor() as cursor:
+                            cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+                    else:
+                        connection.ensure_connection()
+                    failed = self.run_submitters(label, token, survey, questions, options)
+                    connections.close_all()
+        finally:
+            request_logger.setLevel(level)
+            connections.close_all()
+            survey.delete()
+
+        # The last configuration is the production profile
+        if failed:
+            raise CommandError(f'{failed} submissions failed with the SQLite production profile')
+        self.stdout.write(self.style.SUCCESS('Concurrent submission benchmark finished'))
+
+    def run_submitters(self, label, token, survey, questions, options):
+        submitters, per_thread = options['submitters'], options['submissions']
+        barrier = threading.Barrier(submitters + 1)
+        timings, lock_errors, other_errors = [], [], []
+
+        def submit():
+            client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+            payloads = [random_submission(survey, questions) for _ in range(per_thread)]
+            try:
+                barrier.wait()
+                for payload in payloads:
+                    start = time.perf_counter()
+                    try:
+                        response = client.post('/api/surveys/responses/', payload, content_type='application/json')
+                    except OperationalError as e:
+                        (lock_errors if 'locked' in str(e) else other_errors).append(str(e))
+                        continue
+                    timings.append(time.perf_counter() - start)
+                    if response.status_code != 201:
+                        other_errors.append(f'{response.status_code}: {response.content[:200]}')
+            finally:
+                connections.close_all()
+
+        writer = submission_writer() if settings.SUBMISSION_WRITER_ENABLED else None
+        batches, written = (writer.batches, writer.written) if writer else (0, 0)
+        threads = [threading.Thread(target=submit) for _ in range(submitters)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        total = submitters * per_thread
+        stored = len(timings) - len(other_errors)
+        self.stdout.write(
+            f"{label:<32} {submitters} submitters x {per_thread}: {stored}/{total} stored in {elapsed:5.1f}s "
+            f"({stored / elapsed:5.1f}/s), {len(lock_errors)} lock errors, {len(other_errors)} other errors, "
+            f"latency median {statistics.median(timings) * 1000 if timings else 0:6.0f} ms, "
+            f"p95 {percentile(timings, 0.95) * 1000 if timings else 0:6.0f} ms"
+        )
+        if writer is not None and writer.batches > batches:
+            batches, written = writer.batches - batches, writer.written - written
+            self.stdout.write(f"  {batches} write transactions, {written / batches:.1f} submissions each on average")
+        for error in (lock_errors + other_errors)[:3]:
+            self.stdout.write(self.style.WARNING(f"  {error}"))
+        return len(lock_errors) + len(other_errors)
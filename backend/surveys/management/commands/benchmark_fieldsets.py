@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from surveys.serializers import SurveyResponseCreateSerializer
+from ._synthetic import User, benchmark_user, create_survey, fake_request, random_submission
+
+# (screen, url, fields the frontend screen reads)
+SCREENS = [
+    ('Survey management', '/api/surveys/',
+     'id,title,description,category,status,created_by.id,created_by.username,created_at,'
+     'estimated_duration,total_questions,total_responses'),
+    ('Survey dropdowns', '/api/surveys/', 'id,title'),
+    ('Patient responses', '/api/surveys/responses/',
+     'id,survey,survey_title,respondent.id,respondent.username,respondent.full_name,'
+     'started_at,completed_at,is_complete,completion_time'),
+    ('User management', '/api/users/',
+     'id,username,email,first_name,last_name,role,phone,department,specialization,is_active,created_at'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size, queries and latency of the main screens with and without ?fields='
+
+    def add_arguments(self, parser):
+        parser.add_argument('--surveys', type=int, default=20)
+        parser.add_argument('--questions', type=int, default=30)
+        parser.add_argument('--responses', type=int, default=5, help='Responses per survey')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per measurement (median is reported)')
+
+    def handle(self, *args, **options):
+        # Everything is rolled back, so the benchmark can run against a real database
+        with transaction.atomic():
+            user = benchmark_user()
+            request = fake_request(user)
+            User.objects.bulk_create([
+                User(username=f'benchmark-user-{i}', email=f'user{i}@example.com', role='patient')
+                for i in range(options['users'])
+            ])
+            for _ in range(options['surveys']):
+                survey = create_survey(user, questions=options['questions'])
+                questions = list(survey.questions.all())
+                for _ in range(options['responses']):
+                    serializer = SurveyResponseCreateSerializer(
+                        data=random_submission(survey, questions), context={'request': request}
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+
+            client = APIClient(HTTP_HOST='localhost')
+            client.force_authenticate(user)
+            for screen, url, fields in SCREENS:
+                full = self.measure(client, url, {}, options['repeat'])
+                sparse = self.measure(client, url, {'fields': fields}, options['repeat'])
+                self.stdout.write(
+                    f"{screen:<18} full: {full['bytes'] / 1024:7.1f} KiB {full['queries']:>3} queries "
+                    f"{full['ms']:6.1f} ms | fields: {sparse['bytes'] / 1024:7.1f} KiB "
+                    f"{sparse['queries']:>3} queries {sparse['ms']:6.1f} ms"
+                )
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Field selection benchmark finished'))
+
+    def measure(self, client, url, params, repeat):
+        timings = []
+        for _ in range(repeat):
+            # The query log is capped; creating the data may have filled it
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url, params)
+                timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}: {response.content[:200]}')
+        return {'bytes': len(response.content), 'queries': len(captured), 'ms': statistics.median(timings) * 1000}
@@ -0,0 +1,111 @@
+import csv
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from surveys.importer import import_responses
+from surveys.models import QuestionResponse, SurveyResponse
+from ._synthetic import benchmark_user, create_survey, random_answer
+
+FIRST_START = datetime(2015, 1, 1, 9, 0)
+
+
+def cell(answer):
+    """The answer as a legacy export would write it"""
+    if 'json_answer' in answer:
+        return ';'.join(answer['json_answer'])
+    if 'boolean_answer' in answer:
+        return 'yes' if answer['boolean_answer'] else 'no'
+    value = next(value for field, value in answer.items() if field != 'question')
+    return str(value)
+
+
+class Command(BaseCommand):
+    help = 'Import a generated CSV (and a small XLSX) of historical responses, interrupting and resuming it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=200_000, help='Answers in the generated CSV')
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Everything is rolled back, so the benchmark can run against a real database
+        with transaction.atomic(), tempfile.TemporaryDirectory() as directory:
+            user = benchmark_user()
+            for layout in ['rows', 'packed']:
+                survey = create_survey(user, questions=options['questions'], answer_storage=layout)
+                questions = list(survey.questions.all())
+                rows = options['answers'] // len(questions)
+                path = os.path.join(directory, f'{layout}.csv')
+                self.write_csv(path, questions, rows, rng)
+
+                # Stop after about half the rows, as an interrupted import would, then resume
+                start = time.perf_counter()
+                import_responses(survey, path, chunk_size=options['chunk_size'], max_rows=rows // 2)
+                state = import_responses(survey, path, chunk_size=options['chunk_size'])
+                elapsed = time.perf_counter() - start
+                self.check_import(survey, state, rows, len(questions), layout)
+                self.stdout.write(
+                    f"CSV ({layout}): {state.answers:,} answers in {rows:,} responses in {elapsed:.1f}s "
+                    f"({state.answers / elapsed:,.0f} answers/s), resumed once, "
+                    f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB"
+                )
+
+            survey = create_survey(user, questions=options['questions'])
+            questions = list(survey.questions.all())
+            path = os.path.join(directory, 'responses.xlsx')
+            self.write_xlsx(path, questions, 1000, rng)
+            start = time.perf_counter()
+            state = import_responses(survey, path, chunk_size=options['chunk_size'])
+            elapsed = time.perf_counter() - start
+            self.check_import(survey, state, 1000, len(questions), 'rows')
+            self.stdout.write(f"XLSX: {state.answers:,} answers in {elapsed:.1f}s")
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Import benchmark finished'))
+
+    def generated_rows(self, questions, rows, rng):
+        for i in range(rows):
+            started_at = FIRST_START + timedelta(minutes=37 * i)
+            answers = [random_answer(question, rng) for question in questions]
+            yield [started_at, started_at + timedelta(minutes=12), f'form-{i}'] + answers
+
+    def write_csv(self, path, questions, rows, rng):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['started_at', 'completed_at', 'session_id'] + [f'q{q.id}' for q in questions])
+            for row in self.generated_rows(questions, rows, rng):
+                writer.writerow([value.isoformat() for value in row[:2]] + [row[2]] + [cell(a) for a in row[3:]])
+
+    def write_xlsx(self, path, questions, rows, rng):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        # Columns named by question text, as a hand-made spreadsheet would be
+        sheet.append(['Started at', 'Completed at', 'Session id'] + [q.text for q in questions])
+        for row in self.generated_rows(questions, rows, rng):
+            sheet.append(row[:3] + [cell(a) for a in row[3:]])
+        workbook.save(path)
+
+    def check_import(self, survey, state, rows, question_count, layout):
+        responses = SurveyResponse.objects.filter(survey=survey)
+        if state.finished_at is None or state.skipped or responses.count() != rows:
+            raise CommandError(f'Imported {responses.count()} of {rows} rows ({state.skipped} skipped): {state.errors[:3]}')
+        first = responses.order_by('started_at').first()
+        # Naive file timestamps are read in TIME_ZONE
+        if timezone.localtime(first.started_at).replace(tzinfo=None) != FIRST_START or first.duration_seconds != 720:
+            raise CommandError('Original timestamps were not kept')
+        if len(first.get_answers()) != question_count:
+            raise CommandError('Imported answers are missing')
+        if layout == 'rows' and QuestionResponse.objects.filter(survey_response__survey=survey).count() != state.answers:
+            raise CommandError('Imported answer rows are missing')
@@ -0,0 +1,103 @@
+import gzip
+import json
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from surveys.models import QuestionResponse, SurveyResponse
+from surveys.storage import response_answers
+from ._synthetic import benchmark_user, create_survey, random_submission
+
+
+class Command(BaseCommand):
+    help = 'Measure the offline kiosk bundle and the batched sync of queued submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--surveys', type=int, default=5)
+        parser.add_argument('--questions', type=int, default=30)
+        parser.add_argument('--submissions', type=int, default=300, help='Queued submissions per layout')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Everything is rolled back, so the benchmark can run against a real database
+        with transaction.atomic():
+            user = benchmark_user()
+            client = APIClient(HTTP_HOST='localhost')
+            client.force_authenticate(user)
+            surveys = {
+                layout: create_survey(user, questions=options['questions'], answer_storage=layout)
+                for layout in ['rows', 'packed']
+            }
+            for _ in range(options['surveys'] - len(surveys)):
+                create_survey(user, questions=options['questions'])
+
+            self.bundle(client)
+            for layout, survey in surveys.items():
+                self.sync(client, layout, survey, options['submissions'], rng)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Kiosk sync benchmark finished'))
+
+    def bundle(self, client):
+        response = client.get('/api/surveys/kiosk/bundle/', HTTP_ACCEPT_ENCODING='gzip')
+        if response.status_code != 200:
+            raise CommandError(f'Bundle returned {response.status_code}: {response.content[:200]}')
+        compressed = response.content
+        raw = gzip.decompress(compressed) if response.get('Content-Encoding') == 'gzip' else compressed
+        revalidated = client.get('/api/surveys/kiosk/bundle/', HTTP_IF_NONE_MATCH=response['ETag'])
+        if revalidated.status_code != 304:
+            raise CommandError(f'Revalidating an unchanged bundle returned {revalidated.status_code}')
+        surveys = len(json.loads(raw)['surveys'])
+        self.stdout.write(
+            f"Bundle: {surveys} surveys, {len(raw) / 1024:.1f} KiB, "
+            f"{len(compressed) / 1024:.1f} KiB gzipped; unchanged bundle revalidated with a 304 "
+            f"({len(revalidated.content)} bytes)"
+        )
+
+    def sync(self, client, layout, survey, count, rng):
+        questions = list(survey.questions.all())
+        now = timezone.now()
+        submissions = []
+        for i in range(count):
+            submission = random_submission(survey, questions, rng)
+            del submission['session_id']
+            submission['client_id'] = uuid.uuid4().hex
+            submission['started_at'] = (now - timedelta(hours=count - i, minutes=10)).isoformat()
+            submission['completed_at'] = (now - timedelta(hours=count - i)).isoformat()
+            submissions.append(submission)
+
+        # The query log is capped; creating the data may have filled it
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.post('/api/surveys/kiosk/sync/', {'submissions': submissions}, format='json')
+            elapsed = (time.perf_counter() - start) * 1000
+        # Read before the next request resets the query log
+        queries = len(captured)
+        if response.status_code != 200 or response.data['created'] != count:
+            raise CommandError(f'Sync returned {response.status_code}: {str(response.data)[:300]}')
+
+        stored = SurveyResponse.objects.filter(client_id__in=[s['client_id'] for s in submissions])
+        first = stored.order_by('started_at').first()
+        if stored.count() != count or first.started_at.isoformat() != submissions[0]['started_at']:
+            raise CommandError('Synced responses do not match the submissions')
+        if len(response_answers(first)) != len(questions):
+            raise CommandError('Synced answers are missing')
+        if layout == 'rows' and QuestionResponse.objects.filter(survey_response__in=stored).count() != count * len(questions):
+            raise CommandError('Synced answer rows are missing')
+
+        resent = client.post('/api/surveys/kiosk/sync/', {'submissions': submissions}, format='json')
+        if resent.data['duplicate'] != count or stored.count() != count:
+            raise CommandError('Re-sending a synced batch created responses again')
+        self.stdout.write(
+            f"Sync ({layout}): {count} submissions x {len(questions)} answers in {elapsed:.0f} ms, "
+            f"{queries} queries; re-sent batch reported {resent.data['duplicate']} duplicates"
+        )
@@ -0,0 +1,77 @@
+import statistics
+import tempfile
+import time
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from surveys.profiling import profile_requested, profiles_dir
+from ._synthetic import benchmark_user, create_survey
+
+MIDDLEWARE = 'surveys.profiling.ProfilingMiddleware'
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency cost of the profiling middleware when requests are not profiled, and when they are'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=300, help='Requests per measurement (median is reported)')
+        parser.add_argument('--url', default='/api/users/profile/', help='Endpoint to request')
+
+    def handle(self, *args, **options):
+        # Everything is rolled back, so the benchmark can run against a real database
+        with transaction.atomic(), tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILING_DIR=directory):
+            user = benchmark_user()
+            create_survey(user, questions=10)
+            token, _ = Token.objects.get_or_create(user=user)
+            url, repeat = options['url'], options['repeat']
+
+            without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+            with override_settings(MIDDLEWARE=without):
+                baseline = self.measure(token, url, repeat)
+            with override_settings(MIDDLEWARE=without + [MIDDLEWARE]):
+                idle = self.measure(token, url, repeat)
+                with override_settings(PROFILING_SAMPLE_RATE=0.01):
+                    sampling = self.measure(token, url, repeat)
+                profiled = self.measure(token, url + '?profile=1', min(repeat, 50))
+
+            # End-to-end timings vary more than the middleware costs; time its check directly
+            request = RequestFactory().get(url, {'page': 2})
+            calls = 100_000
+            check = timeit.timeit(lambda: profile_requested(request), number=calls) / calls * 1e6
+            with override_settings(PROFILING_SAMPLE_RATE=0.01):
+                sampled_check = timeit.timeit(lambda: profile_requested(request), number=calls) / calls * 1e6
+
+            stored = len(list(profiles_dir().glob('*.json')))
+            if not stored:
+                raise CommandError('No profile was stored')
+            self.stdout.write(f"{url}, median of {repeat} requests:")
+            self.stdout.write(f"  without the middleware    {baseline:7.3f} ms")
+            self.stdout.write(f"  not profiled              {idle:7.3f} ms ({idle - baseline:+.3f} ms)")
+            self.stdout.write(f"  1% sampling               {sampling:7.3f} ms ({sampling - baseline:+.3f} ms)")
+            self.stdout.write(f"  profiled (?profile=1)     {profiled:7.3f} ms ({profiled - baseline:+.3f} ms)")
+            self.stdout.write(
+                f"  check per unprofiled request: {check:.2f} us, {sampled_check:.2f} us with sampling"
+            )
+            self.stdout.write(f"  {stored} profiles stored")
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Profiling benchmark finished'))
+
+    def measure(self, token, url, repeat):
+        # A new client loads the current MIDDLEWARE setting
+        client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}: {response.content[:200]}')
+        return statistics.median(timings) * 1000
@@ -0,0 +1,176 @@
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+
+from healthcare_survey.routers import PIN_COOKIE, replica_alias
+from .sync_replica import sync_replica
+from ._synthetic import benchmark_user, bulk_responses, create_survey, random_submission
+
+# Alias of the replica added when DATABASE_REPLICA is not set
+BENCHMARK_ALIAS = 'benchmark_replica'
+
+# Runs in another process, like a report worker: renders XLSX exports of the
+# survey's exact analytics, from the primary or the replica, until time is up
+EXPORT_SCRIPT = r'''
+import json, os, sys, time
+from pathlib import Path
+import django
+django.setup()
+# Low CPU priority, so on machines with few cores the submissions are held
+# up by database locks rather than by sharing a core with the export
+os.nice(19)
+from django.conf import settings
+from django.db import connections
+
+alias, path, survey_id, on_replica, seconds, directory = sys.argv[1:7]
+if path:
+    connections.settings[alias] = {**connections.settings['default'], 'NAME': path}
+settings.DATABASE_REPLICA = alias
+
+from healthcare_survey.routers import replica_block
+from surveys.analytics import exact_analytics
+from surveys.models import Survey
+from surveys.reports import RENDERERS
+
+survey = Survey.objects.get(id=int(survey_id))
+exports, timings = 0, []
+print('ready', flush=True)
+deadline = time.perf_counter() + float(seconds)
+while time.perf_counter() < deadline:
+    start = time.perf_counter()
+    with replica_block(on_replica == '1'):
+        RENDERERS['xlsx'](survey, exact_analytics(survey), Path(directory) / 'export.xlsx')
+    timings.append(time.perf_counter() - start)
+    exports += 1
+print(json.dumps({'exports': exports, 'seconds': timings}), flush=True)
+'''
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Measure submission latency while a large export runs against the primary or the read replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--responses', type=int, default=20000, help='Responses in the exported survey')
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--seconds', type=float, default=10, help='Length of each measurement')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('The benchmark copies the primary into the replica, so both must be SQLite')
+        directory = tempfile.TemporaryDirectory()
+        alias, replica_path = replica_alias(), ''
+        if alias is None:
+            # Two SQLite files: the primary and a copy in a temporary directory
+            alias, replica_path = BENCHMARK_ALIAS, os.path.join(directory.name, 'replica.sqlite3')
+            connections.settings[alias] = {**connections.settings[DEFAULT_DB_ALIAS], 'NAME': replica_path}
+
+        user = benchmark_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        # The export runs in another process and cannot see uncommitted data,
+        # so the data is committed and deleted afterwards
+        survey = create_survey(user, questions=options['questions'])
+        try:
+            questions = list(survey.questions.order_by('order'))
+            self.stdout.write(f"Creating {options['responses']} responses...")
+            bulk_responses(survey, questions, options['responses'], random.Random(0))
+            self.stdout.write(f"Copied the primary to the replica in {sync_replica(alias):.2f}s")
+
+            with override_settings(DATABASE_REPLICA=alias):
+                self.check_routing(alias, token, survey, questions)
+                for label, export in [('no export', None), ('export on primary', False),
+                                      ('export on replica', True)]:
+                    self.measure(label, export, alias, replica_path, token, survey, questions,
+                                 options['seconds'], directory.name)
+        finally:
+            survey.delete()
+            connections[alias].close()
+            directory.cleanup()
+
+        self.stdout.write(self.style.SUCCESS('Replica benchmark finished'))
+
+    def client(self, token):
+        # A new client loads the middleware with the overridden DATABASE_REPLICA
+        return Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}', raise_request_exception=False)
+
+    def check_routing(self, alias, token, survey, questions):
+        """Analytics read from the replica until the client submits, then from the primary"""
+        client = self.client(token)
+        url = f'/api/surveys/{survey.id}/analytics/'
+        reads = []
+        for step in ['before', 'after']:
+            if step == 'after':
+                response = client.post('/api/surveys/responses/', random_submission(survey, questions),
+                                       content_type='application/json')
+                if response.status_code != 201 or PIN_COOKIE not in response.cookies:
+                    raise CommandError(f'Submission was not pinned to the primary: {response.status_code}')
+            with CaptureQueriesContext(connections[alias]) as replica, \
+                    CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+                if client.get(url).status_code != 200:
+                    raise CommandError(f'{url} failed')
+            reads.append((len(replica), len(primary)))
+        (before_replica, before_primary), (after_replica, after_primary) = reads
+        if not before_replica or after_replica:
+            raise CommandError(f'Analytics were not routed as expected: {reads}')
+        self.stdout.write(
+            f"Routing: analytics ran {before_replica} queries on the replica ({before_primary} on the primary "
+            f"for the token); after a submission the client is pinned and ran {after_primary} on the primary"
+        )
+
+    def measure(self, label, export, alias, replica_path, token, survey, questions, seconds, directory):
+        process = None
+        if export is not None:
+            env = {
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'healthcare_survey.settings'),
+                'PYTHONPATH': os.pathsep.join(path for path in sys.path if path),
+            }
+            process = subprocess.Popen(
+                [sys.executable, '-c', EXPORT_SCRIPT, alias, replica_path, str(survey.id),
+                 '1' if export else '0', str(seconds), directory],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            )
+            if process.stdout.readline().strip() != 'ready':
+                raise CommandError(f'Export process failed: {process.stderr.read()[-1000:]}')
+
+        client = self.client(token)
+        rng = random.Random(1)
+        timings, errors = [], 0
+        deadline = time.perf_counter() + seconds
+        # The export keeps running until the same deadline
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = client.post('/api/surveys/responses/', random_submission(survey, questions, rng),
+                                   content_type='application/json')
+            timings.append(time.perf_counter() - start)
+            errors += response.status_code != 201
+
+        exports = ''
+        if process is not None:
+            output, stderr = process.communicate()
+            if process.returncode != 0:
+                raise CommandError(f'Export process failed: {stderr[-1000:]}')
+            result = json.loads(output.strip().splitlines()[-1])
+            exports = (f", {result['exports']} exports "
+                       f"(median {statistics.median(result['seconds']):.2f}s)" if result['exports'] else ', no export')
+        self.stdout.write(
+            f"{label:<18} {len(timings):5d} submissions: median {statistics.median(timings) * 1000:6.1f} ms, "
+            f"p95 {percentile(timings, 0.95) * 1000:7.1f} ms, max {max(timings) * 1000:7.1f} ms, "
+            f"{errors} failed{exports}"
+        )
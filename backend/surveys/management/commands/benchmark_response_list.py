@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from surveys.serializers import SurveyResponseCreateSerializer
+from ._synthetic import benchmark_user, create_survey, fake_request, random_submission
+
+# Extra queries ?include=answers may add: answers and questions
+ANSWER_QUERIES = 2
+
+
+class Command(BaseCommand):
+    help = 'Count the queries behind a page of the response list; fails if they grow with the data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=80)
+        parser.add_argument('--responses', type=int, default=25, help='Responses per survey (a page is 20)')
+
+    def handle(self, *args, **options):
+        # Everything is rolled back, so the check can run against a real database
+        with transaction.atomic():
+            user = benchmark_user()
+            client = APIClient(HTTP_HOST='localhost')
+            client.force_authenticate(user)
+
+            queries = {}
+            for layout in ['rows', 'packed']:
+                for question_count in sorted({1, options['questions']}):
+                    survey = self.create_responses(user, layout, question_count, options['responses'])
+                    for include in ['', 'answers']:
+                        queries[layout, question_count, include] = self.measure(
+                            client, survey, layout, question_count, include
+                        )
+            transaction.set_rollback(True)
+
+        summary = {count for (_, _, include), count in queries.items() if not include}
+        with_answers = {count for (_, _, include), count in queries.items() if include}
+        if len(summary) > 1 or len(with_answers) > 1:
+            raise CommandError('Response list queries depend on the survey size or layout')
+        if with_answers.pop() - summary.pop() > ANSWER_QUERIES:
+            raise CommandError(f'?include=answers costs more than {ANSWER_QUERIES} extra queries')
+        self.stdout.write(self.style.SUCCESS('Response list queries are constant'))
+
+    def create_responses(self, user, layout, question_count, response_count):
+        survey = create_survey(user, questions=question_count, answer_storage=layout)
+        questions = list(survey.questions.all())
+        request = fake_request(user)
+        for _ in range(response_count):
+            serializer = SurveyResponseCreateSerializer(
+                data=random_submission(survey, questions), context={'request': request}
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return survey
+
+    def measure(self, client, survey, layout, question_count, include):
+        params = {'include': include} if include else {}
+        # The query log is capped; creating the responses may have filled it
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(f'/api/surveys/{survey.id}/responses/', params)
+            elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise CommandError(f'Response list returned {response.status_code}: {response.content[:200]}')
+        self.stdout.write(
+            f"{layout:>6} layout, {question_count:>3} questions, {include or 'summary':>7}: "
+            f"{len(response.data['results'])} responses, {len(captured)} queries, "
+            f"{elapsed * 1000:.1f} ms, {len(response.content) / 1024:.1f} KiB"
+        )
+        return len(captured)
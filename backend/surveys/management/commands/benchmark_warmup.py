@@ -0,0 +1,133 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from ._synthetic import benchmark_user, create_survey
+
+# Runs in a fresh interpreter: loads the application the way a new worker
+# does, then times its first request to each endpoint and the steady state
+WORKER_SCRIPT = r'''
+import asyncio, json, statistics, sys, time
+from io import BytesIO
+
+server, warm, token, paths, repeat = sys.argv[1], sys.argv[2] == '1', sys.argv[3], sys.argv[4].split(','), int(sys.argv[5])
+start = time.perf_counter()
+from django.conf import settings
+settings.WARMUP_ENABLED = warm
+if server == 'wsgi':
+    from healthcare_survey.wsgi import application
+else:
+    from healthcare_survey.asgi import application
+boot = time.perf_counter() - start
+heavy = [name for name in ('pandas', 'reportlab', 'openpyxl') if name in sys.modules]
+
+def wsgi_get(path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'HTTP_AUTHORIZATION': f'Token {token}', 'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    status = []
+    body = b''.join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+    return int(status[0].split()[0])
+
+async def asgi_get(path):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 1000), 'server': ('localhost', 80),
+    }
+    sent = []
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+    async def send(message):
+        sent.append(message)
+    await application(scope, receive, send)
+    return sent[0]['status']
+
+def get(path):
+    return wsgi_get(path) if server == 'wsgi' else asyncio.run(asgi_get(path))
+
+def timed(path):
+    start = time.perf_counter()
+    status = get(path)
+    if status != 200:
+        raise SystemExit(f'{path} returned {status}')
+    return (time.perf_counter() - start) * 1000
+
+first = [timed(path) for path in paths]
+steady = [statistics.median(timed(path) for _ in range(repeat)) for path in paths]
+print(json.dumps({'boot': boot * 1000, 'first': first, 'steady': steady, 'heavy': heavy}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure worker boot time and first-request latency with and without warm-up'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh workers per configuration (median is reported)')
+        parser.add_argument('--surveys', type=int, default=20, help='Active surveys to create')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per endpoint for the steady state')
+
+    def handle(self, *args, **options):
+        user = benchmark_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        # Workers run in other processes and cannot see uncommitted data, so
+        # the data is committed and deleted afterwards
+        surveys = []
+        try:
+            for _ in range(options['surveys']):
+                surveys.append(create_survey(user, questions=20))
+            survey = surveys[0]
+            paths = [
+                '/api/users/profile/',
+                '/api/surveys/',
+                f'/api/surveys/{survey.id}/',
+                f'/api/surveys/{survey.id}/questions/',
+                '/api/surveys/dashboard/stats/',
+            ]
+            for server in ['wsgi', 'asgi']:
+                for warm in [False, True]:
+                    runs = [self.run_worker(server, warm, token.key, paths, options['repeat'])
+                            for _ in range(options['runs'])]
+                    self.report(server, warm, paths, runs)
+        finally:
+            for survey in surveys:
+                survey.delete()
+
+        self.stdout.write(self.style.SUCCESS('Warm-up benchmark finished'))
+
+    def run_worker(self, server, warm, token, paths, repeat):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'healthcare_survey.settings'),
+            'PYTHONPATH': os.pathsep.join(path for path in sys.path if path),
+        }
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER_SCRIPT, server, '1' if warm else '0', token, ','.join(paths), str(repeat)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Worker failed: {result.stderr[-1000:]}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def report(self, server, warm, paths, runs):
+        boot = statistics.median(run['boot'] for run in runs)
+        first = [statistics.median(run['first'][i] for run in runs) for i in range(len(paths))]
+        steady = [statistics.median(run['steady'][i] for run in runs) for i in range(len(paths))]
+        heavy = sorted({name for run in runs for name in run['heavy']})
+        self.stdout.write(
+            f"{server.upper()} {'with' if warm else 'without'} warm-up: boot {boot:6.0f} ms, "
+            f"first requests {sum(first):6.1f} ms (steady state {sum(steady):5.1f} ms), "
+            f"heavy libraries at boot: {', '.join(heavy) or 'none'}"
+        )
+        for path, first_ms, steady_ms in zip(paths, first, steady):
+            self.stdout.write(f"  {path:<32} first {first_ms:6.1f} ms, then {steady_ms:5.1f} ms")
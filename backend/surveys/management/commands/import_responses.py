@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from surveys.importer import ResponseImportError, import_responses, map_columns, open_table
+from surveys.models import Survey
+
+
+class Command(BaseCommand):
+    help = 'Import historical responses from a CSV or XLSX file; rerun to resume an interrupted import'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_id', type=int)
+        parser.add_argument('path', help='CSV or XLSX file with one response per row')
+        parser.add_argument('--map', dest='mapping',
+                            help='JSON file of {column: question id, response field or null}')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows written per transaction')
+        parser.add_argument('--max-rows', type=int, help='Stop after this many rows; rerun to continue')
+
+    def handle(self, *args, **options):
+        try:
+            survey = Survey.objects.get(id=options['survey_id'])
+        except Survey.DoesNotExist:
+            raise CommandError(f"Survey {options['survey_id']} does not exist")
+        mapping = None
+        if options['mapping']:
+            with open(options['mapping']) as f:
+                mapping = json.load(f)
+
+        try:
+            with open_table(options['path'], options['chunk_size']) as (header, _):
+                columns, unmapped = map_columns(header, list(survey.questions.all()), mapping)
+            questions = sum(not isinstance(target, str) for _, _, target in columns)
+            self.stdout.write(f"{questions} question columns, {len(columns) - questions} response columns")
+            if unmapped:
+                self.stdout.write(self.style.WARNING(f"Ignoring unmatched columns: {', '.join(unmapped)}"))
+
+            start = time.perf_counter()
+            progress = lambda state: self.stdout.write(
+                f"{state.rows} rows, {state.answers} answers ({time.perf_counter() - start:.1f}s)"
+            )
+            state = import_responses(
+                survey, options['path'], mapping, options['chunk_size'], options['max_rows'], progress
+            )
+        except (OSError, ResponseImportError) as e:
+            raise CommandError(str(e))
+
+        for error in state.errors:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']} skipped: {error['error']}"))
+        if state.skipped > len(state.errors):
+            self.stdout.write(self.style.WARNING(f"... {state.skipped - len(state.errors)} more rows skipped"))
+        summary = (
+            f"{state.source}: {state.responses} responses with {state.answers} answers imported, "
+            f"{state.skipped} rows skipped"
+        )
+        if state.finished_at is None:
+            self.stdout.write(f"{summary}; stopped after {state.rows} rows, rerun to continue")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary}; import complete"))
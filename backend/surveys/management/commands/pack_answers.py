@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from surveys.models import Survey, SurveyResponse, QuestionResponse
+from surveys.storage import pack_answers, unpack_answers
+
+
+class Command(BaseCommand):
+    help = 'Convert existing survey answers between row and packed storage in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_ids', nargs='*', type=int,
+                            help='Surveys to convert (default: all surveys already set to packed)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Responses converted per transaction')
+        parser.add_argument('--unpack', action='store_true',
+                            help='Convert packed responses back to one row per answer')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        unpack = options['unpack']
+
+        if options['survey_ids']:
+            surveys = Survey.objects.filter(id__in=options['survey_ids'])
+            missing = set(options['survey_ids']) - set(surveys.values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown survey ids: {sorted(missing)}")
+        else:
+            surveys = Survey.objects.filter(answer_storage='rows' if unpack else 'packed')
+
+        for survey in surveys:
+            # Switch the layout first so new submissions stop adding to the backlog
+            layout = 'rows' if unpack else 'packed'
+            if survey.answer_storage != layout:
+                Survey.objects.filter(id=survey.id).update(answer_storage=layout)
+
+            converter = self.unpack_batch if unpack else self.pack_batch
+            converted = 0
+            last_id = 0
+            while True:
+                with transaction.atomic():
+                    batch = list(
+                        SurveyResponse.objects.select_for_update()
+                        .filter(survey=survey, id__gt=last_id, packed_answers__isnull=not unpack)
+                        .order_by('id')[:batch_size]
+                    )
+                    if not batch:
+                        break
+                    converter(batch)
+                converted += len(batch)
+                last_id = batch[-1].id
+                self.stdout.write(f"Survey {survey.id}: {converted} responses converted")
+
+            self.stdout.write(self.style.SUCCESS(
+                f"Survey {survey.id} ({survey.title}) now uses {layout} storage"
+            ))
+
+    def pack_batch(self, batch):
+        answers = {}
+        rows = QuestionResponse.objects.filter(survey_response__in=batch)
+        for answer in rows:
+            answers.setdefault(answer.survey_response_id, []).append(answer)
+
+        for survey_response in batch:
+            survey_response.packed_answers = pack_answers(answers.get(survey_response.id, []))
+        SurveyResponse.objects.bulk_update(batch, ['packed_answers'])
+        rows.delete()
+
+    def unpack_batch(self, batch):
+        rows = []
+        for survey_response in batch:
+            rows.extend(unpack_answers(survey_response, survey_response.packed_answers))
+            survey_response.packed_answers = None
+        QuestionResponse.objects.bulk_create(rows)
+        SurveyResponse.objects.bulk_update(batch, ['packed_answers'])
@@ -0,0 +1,112 @@
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from surveys.analytics import answer_total, exact_analytics, store_snapshot
+from surveys.models import Survey
+from surveys.workers import init_worker
+
+
+def run_shard(survey_ids, run, chunk_size):
+    """Compute and store snapshots for one shard of surveys; return its timing"""
+    start = time.perf_counter()
+    surveys = Survey.objects.in_bulk(survey_ids)
+    result = {'pid': os.getpid(), 'surveys': 0, 'answers': 0, 'errors': []}
+    for survey_id in survey_ids:
+        survey = surveys.get(survey_id)
+        if survey is None:
+            continue
+        survey_start = time.perf_counter()
+        try:
+            analytics_data = exact_analytics(survey, chunk_size)
+        except Exception as e:
+            result['errors'].append((survey_id, str(e)))
+            continue
+        store_snapshot(survey, analytics_data, run, time.perf_counter() - survey_start)
+        result['surveys'] += 1
+        result['answers'] += answer_total(analytics_data)
+    result['seconds'] = time.perf_counter() - start
+    connections.close_all()
+    return result
+
+
+def make_shards(weights, count):
+    """Split {survey id: weight} into ``count`` shards of similar total weight"""
+    shards = [(0, i, []) for i in range(count)]
+    for survey_id, weight in sorted(weights.items(), key=lambda item: -item[1]):
+        load, index, members = heapq.heappop(shards)
+        members.append(survey_id)
+        heapq.heappush(shards, (load + weight, index, members))
+    return [members for _, _, members in sorted(shards, key=lambda shard: shard[1]) if members]
+
+
+class Command(BaseCommand):
+    help = 'Recompute analytics snapshots for many surveys in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_ids', nargs='*', type=int, help='Surveys to recompute (default: all)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Responses read per query when decoding packed answers')
+        parser.add_argument('--run', help='Run label; reuse the label of an interrupted run to resume it')
+
+    def handle(self, *args, **options):
+        run = options['run'] or timezone.now().strftime('%Y%m%dT%H%M%S')
+        surveys = Survey.objects.all()
+        if options['survey_ids']:
+            surveys = surveys.filter(id__in=options['survey_ids'])
+        total = surveys.count()
+        # Surveys already written by this run are skipped when resuming
+        pending = surveys.exclude(analytics_snapshot__run=run)
+        weights = dict(
+            pending.annotate(response_count=Count('responses')).values_list('id', 'response_count')
+        )
+        if not weights:
+            self.stdout.write(self.style.SUCCESS(f"Run {run}: all {total} surveys are up to date"))
+            return
+        workers = min(options['workers'], len(weights))
+        shards = make_shards(weights, workers)
+        self.stdout.write(
+            f"Run {run}: {len(weights)} of {total} surveys pending, {len(shards)} workers "
+            f"(resume with --run {run})"
+        )
+
+        start = time.perf_counter()
+        results = []
+        if workers <= 1:
+            results = [run_shard(shard, run, options['chunk_size']) for shard in shards]
+        else:
+            # Each worker opens its own connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                futures = [executor.submit(run_shard, shard, run, options['chunk_size']) for shard in shards]
+                try:
+                    for future in as_completed(futures):
+                        results.append(future.result())
+                except KeyboardInterrupt:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.stderr.write(f"Interrupted; resume with --run {run}")
+                    raise
+        elapsed = time.perf_counter() - start
+
+        for result in sorted(results, key=lambda result: result['pid']):
+            rate = result['answers'] / result['seconds'] if result['seconds'] else 0
+            self.stdout.write(
+                f"  worker {result['pid']}: {result['surveys']} surveys, {result['answers']} answers "
+                f"in {result['seconds']:.2f}s ({rate:,.0f} answers/s)"
+            )
+            for survey_id, error in result['errors']:
+                self.stderr.write(f"  survey {survey_id} failed: {error}")
+
+        answers = sum(result['answers'] for result in results)
+        computed = sum(result['surveys'] for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed {computed} snapshots from {answers} answers in {elapsed:.2f}s "
+            f"({answers / elapsed if elapsed else 0:,.0f} answers/s)"
+        ))
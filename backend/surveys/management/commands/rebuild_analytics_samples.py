@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from surveys.models import Survey
+from surveys.sampling import rebuild_sketch
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the reservoir samples and sketches behind ?mode=approx analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_ids', nargs='*', type=int, help='Surveys to rebuild (default: all)')
+        parser.add_argument('--missing', action='store_true', help='Only surveys without samples yet')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.order_by('id')
+        if options['survey_ids']:
+            surveys = surveys.filter(id__in=options['survey_ids'])
+        if options['missing']:
+            surveys = surveys.filter(analytics_sketches__isnull=True)
+
+        for survey in surveys:
+            start = time.perf_counter()
+            sketch = rebuild_sketch(survey, options['chunk_size'])
+            self.stdout.write(
+                f"Survey {survey.id}: {sketch.responses} responses, "
+                f"{sum(sketch.answered.values())} answers in {time.perf_counter() - start:.1f}s"
+            )
+        self.stdout.write(self.style.SUCCESS('Analytics samples rebuilt'))
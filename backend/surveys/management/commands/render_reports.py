@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from surveys.models import ReportJob
+from surveys.reports import JOB_TIMEOUT, render_report_job
+
+
+class Command(BaseCommand):
+    help = 'Render pending report jobs (e.g. those lost by a restarted server) and prune old artifacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-days', type=int,
+                            help='Delete report files not downloaded or rendered for this many days')
+
+    def handle(self, *args, **options):
+        # Jobs stuck in "running" lost their worker
+        lost = ReportJob.objects.filter(status='running', created_at__lt=timezone.now() - JOB_TIMEOUT)
+        requeued = lost.update(status='pending')
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} lost jobs")
+
+        for job_id in ReportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True):
+            start = time.perf_counter()
+            render_report_job(job_id)
+            job = ReportJob.objects.get(id=job_id)
+            self.stdout.write(f"Job {job_id} ({job.format}, survey {job.survey_id}): {job.status} "
+                              f"in {time.perf_counter() - start:.2f}s {job.error}".rstrip())
+
+        if options['prune_days'] is not None:
+            cutoff = time.time() - timedelta(days=options['prune_days']).total_seconds()
+            removed = 0
+            for path in Path(settings.REPORTS_DIR).glob('*.*'):
+                if path.stat().st_atime < cutoff and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            self.stdout.write(f"Removed {removed} report files")
+
+        self.stdout.write(self.style.SUCCESS('Report jobs processed'))
@@ -0,0 +1,46 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from healthcare_survey.routers import replica_alias
+
+
+def sync_replica(alias):
+    """Copy the primary SQLite database into the replica's file; returns seconds taken"""
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise CommandError('sync_replica copies SQLite files; other databases replicate themselves')
+    start = time.perf_counter()
+    source.ensure_connection()
+    # The backup API copies a consistent state while other processes keep
+    # writing, and replica readers wait on the file lock rather than seeing
+    # a partial copy
+    destination = sqlite3.connect(target.settings_dict['NAME'], timeout=30)
+    try:
+        source.connection.backup(destination)
+    finally:
+        destination.close()
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to the DATABASE_REPLICA file, for local replica testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep copying every this many seconds, to simulate replication lag')
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError('Set DATABASE_REPLICA to an entry of DATABASES first')
+        while True:
+            seconds = sync_replica(alias)
+            self.stdout.write(f"Copied {settings.DATABASES[DEFAULT_DB_ALIAS]['NAME']} to "
+                              f"{settings.DATABASES[alias]['NAME']} in {seconds:.2f}s")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,52 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from surveys.models import Survey
+from surveys.text_analytics import TEXT_TYPES, reset_text_analytics, update_text_analytics
+
+
+class Command(BaseCommand):
+    help = 'Count terms and bigrams of new free-text answers (tokenized on a process pool)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_ids', nargs='*', type=int, help='Surveys to update (default: all with text questions)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Responses tokenized per task')
+        parser.add_argument('--rebuild', action='store_true', help='Recount every answer instead of only new ones')
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.filter(questions__type__in=TEXT_TYPES).distinct().order_by('id')
+        if options['survey_ids']:
+            surveys = surveys.filter(id__in=options['survey_ids'])
+        workers = options['workers']
+
+        executor = None
+        if workers > 1:
+            # Workers only tokenize; they never touch the database
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            total, start = 0, time.perf_counter()
+            for survey in surveys:
+                if options['rebuild']:
+                    reset_text_analytics(survey)
+                survey_start = time.perf_counter()
+                processed = update_text_analytics(survey, executor, workers, options['chunk_size'])
+                elapsed = time.perf_counter() - survey_start
+                total += processed
+                self.stdout.write(
+                    f"Survey {survey.id}: {processed} responses in {elapsed:.2f}s "
+                    f"({processed / elapsed if elapsed else 0:,.0f} responses/s)"
+                )
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Counted text answers of {total} responses in {elapsed:.2f}s with {workers} workers"
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='survey',
+            name='answer_storage',
+            field=models.CharField(choices=[('rows', 'One row per answer'), ('packed', 'Packed per response')], default='rows', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='surveyresponse',
+            name='packed_answers',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
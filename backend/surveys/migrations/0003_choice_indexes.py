@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0002_answer_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionresponse',
+            name='choice_index',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questionresponse',
+            name='choice_mask',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='questionresponse',
+            index=models.Index(fields=['question', 'choice_index'], name='surveys_que_questio_1b838f_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0003_choice_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveyresponse',
+            name='duration_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='surveyresponse',
+            index=models.Index(fields=['survey', 'duration_seconds'], name='surveys_sur_survey__5cd1ac_idx'),
+        ),
+    ]
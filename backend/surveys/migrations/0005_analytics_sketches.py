@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0004_duration_seconds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('values', models.JSONField(default=list)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sample', to='surveys.question')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AnalyticsSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('responses', models.BigIntegerField(default=0)),
+                ('completed', models.BigIntegerField(default=0)),
+                ('answered', models.JSONField(default=dict)),
+                ('respondents', models.BinaryField(default=bytes)),
+                ('durations', models.JSONField(default=list)),
+                ('durations_seen', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_sketch', to='surveys.survey')),
+            ],
+        ),
+    ]
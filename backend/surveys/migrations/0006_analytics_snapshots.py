@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0005_analytics_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField()),
+                ('answers', models.BigIntegerField(default=0)),
+                ('run', models.CharField(blank=True, db_index=True, max_length=50)),
+                ('compute_seconds', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_snapshot', to='surveys.survey')),
+            ],
+        ),
+    ]
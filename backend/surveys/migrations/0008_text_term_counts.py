@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0007_report_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextAnalyticsState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_response_id', models.BigIntegerField(default=0)),
+                ('answers', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='text_analytics_state', to='surveys.survey')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TextTermCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('answers', 'All answers'), ('term', 'Term'), ('bigram', 'Bigram')], max_length=10)),
+                ('term', models.CharField(blank=True, max_length=100)),
+                ('week', models.DateField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('examples', models.JSONField(default=list)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_counts', to='surveys.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'kind', 'count'], name='surveys_tex_questio_a715b9_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='texttermcount',
+            constraint=models.UniqueConstraint(fields=('question', 'kind', 'term', 'week'), name='unique_term_week'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0008_text_term_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='surveyresponse',
+            index=models.Index(fields=['started_at'], name='surveys_sur_started_813292_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyresponse',
+            index=models.Index(fields=['session_id'], name='surveys_sur_session_2705e5_idx'),
+        ),
+    ]
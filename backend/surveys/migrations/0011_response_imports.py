@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0010_kiosk_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('checksum', models.CharField(max_length=64)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('responses', models.BigIntegerField(default=0)),
+                ('answers', models.BigIntegerField(default=0)),
+                ('skipped', models.BigIntegerField(default=0)),
+                ('errors', models.JSONField(default=list)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='imports', to='surveys.survey')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='responseimport',
+            constraint=models.UniqueConstraint(fields=('survey', 'checksum'), name='unique_survey_import'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0011_response_imports'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyticssketch',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionsample',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='analyticssketch',
+            name='survey',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_sketches', to='surveys.survey'),
+        ),
+        migrations.AlterField(
+            model_name='questionsample',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='samples', to='surveys.question'),
+        ),
+        migrations.AddConstraint(
+            model_name='analyticssketch',
+            constraint=models.UniqueConstraint(fields=('survey', 'shard'), name='unique_sketch_shard'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionsample',
+            constraint=models.UniqueConstraint(fields=('question', 'shard'), name='unique_sample_shard'),
+        ),
+    ]
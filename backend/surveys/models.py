@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 import json
 
@@ -22,6 +23,11 @@ class Survey(models.Model):
         ('research', 'Research'),
     ]
     
+    ANSWER_STORAGE_CHOICES = [
+        ('rows', 'One row per answer'),
+        ('packed', 'Packed per response'),
+    ]
+    
     title = models.CharField(max_length=200)
     description = models.TextField()
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='general')
@@ -41,15 +47,23 @@ class Survey(models.Model):
     target_roles = models.JSONField(default=list, blank=True)  # ['patient', 'healthcare_provider']
     target_departments = models.JSONField(default=list, blank=True)
     
+    # Storage layout for new submissions (see surveys.storage)
+    answer_storage = models.CharField(max_length=10, choices=ANSWER_STORAGE_CHOICES, default='rows')
+    
     def __str__(self):
         return self.title
     
+    # Querysets may annotate the totals (question_count/response_count) to save a COUNT per survey
     @property
     def total_questions(self):
+        if hasattr(self, 'question_count'):
+            return self.question_count
         return self.questions.count()
     
     @property
     def total_responses(self):
+        if hasattr(self, 'response_count'):
+            return self.response_count
         return self.responses.count()
     
     class Meta:
@@ -99,28 +113,68 @@ class SurveyResponse(models.Model):
     survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='responses')
     respondent = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     session_id = models.CharField(max_length=100, null=True, blank=True)  # For anonymous responses
+    client_id = models.CharField(max_length=64, null=True, blank=True, unique=True)  # set by offline kiosks
     
-    started_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, so offline submissions keep their time
+    started_at = models.DateTimeField(default=timezone.now, editable=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     is_complete = models.BooleanField(default=False)
+    duration_seconds = models.FloatField(null=True, blank=True)  # set from completed_at on save
     
     # Metadata
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
     
+    # Answers keyed by question id when the survey uses packed storage
+    packed_answers = models.JSONField(null=True, blank=True)
+    
     def __str__(self):
         respondent_name = self.respondent.username if self.respondent else "Anonymous"
         return f"{self.survey.title} - {respondent_name}"
     
     @property
     def completion_time(self):
+        if self.duration_seconds is not None:
+            return self.duration_seconds / 60  # in minutes
         if self.completed_at and self.started_at:
             return (self.completed_at - self.started_at).total_seconds() / 60  # in minutes
         return None
     
+    def compute_duration(self):
+        if self.completed_at and self.started_at:
+            return max((self.completed_at - self.started_at).total_seconds(), 0)
+        return None
+    
+    def save(self, *args, **kwargs):
+        # Keep the stored duration in step with completed_at
+        self.duration_seconds = self.compute_duration()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'completed_at' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'duration_seconds'}
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def prepare_for_bulk(cls, responses):
+        """Fill in what save() would before the responses go to bulk_create"""
+        responses = list(responses)
+        for response in responses:
+            response.duration_seconds = response.compute_duration()
+        return responses
+    
+    def get_answers(self, questions=None):
+        """Return this response's answers regardless of storage layout"""
+        from .storage import response_answers
+        return response_answers(self, questions)
+    
     class Meta:
         unique_together = ['survey', 'respondent', 'session_id']
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['survey', 'duration_seconds']),
+            # Admin changelist ordering and search
+            models.Index(fields=['started_at']),
+            models.Index(fields=['session_id']),
+        ]
 
 class QuestionResponse(models.Model):
     survey_response = models.ForeignKey(SurveyResponse, on_delete=models.CASCADE, related_name='answers')
@@ -133,7 +187,11 @@ class QuestionResponse(models.Model):
     boolean_answer = models.BooleanField(null=True, blank=True)
     json_answer = models.JSONField(null=True, blank=True)  # For multiple choice, rating
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Normalized choice answers (see surveys.choices)
+    choice_index = models.PositiveSmallIntegerField(null=True, blank=True)  # radio, dropdown
+    choice_mask = models.BigIntegerField(null=True, blank=True)  # checkbox, one bit per option
+    
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     def __str__(self):
         return f"{self.question.text[:30]} - {self.get_answer()}"
@@ -154,6 +212,9 @@ class QuestionResponse(models.Model):
     
     class Meta:
         unique_together = ['survey_response', 'question']
+        indexes = [
+            models.Index(fields=['question', 'choice_index']),
+        ]
 
 class SurveyInvitation(models.Model):
     STATUS_CHOICES = [
@@ -185,4 +246,148 @@ class SurveyInvitation(models.Model):
     
     class Meta:
         unique_together = ['survey', 'recipient']
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class AnalyticsSketch(models.Model):
+    """One shard of a survey's running counters and sketches for approximate analytics (see surveys.sampling)"""
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='analytics_sketches')
+    shard = models.PositiveSmallIntegerField(default=0)
+    
+    responses = models.BigIntegerField(default=0)
+    completed = models.BigIntegerField(default=0)
+    answered = models.JSONField(default=dict)  # answers seen, keyed by question id
+    
+    respondents = models.BinaryField(default=bytes)  # HyperLogLog registers
+    durations = models.JSONField(default=list)  # reservoir of completion durations (seconds)
+    durations_seen = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Analytics sketch {self.shard} - {self.survey.title}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['survey', 'shard'], name='unique_sketch_shard'),
+        ]
+
+class QuestionSample(models.Model):
+    """Reservoir sample of a question's answer values, per sketch shard (see surveys.sampling)"""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='samples')
+    shard = models.PositiveSmallIntegerField(default=0)
+    values = models.JSONField(default=list)
+    
+    def __str__(self):
+        return f"Sample {self.shard} - {self.question.text[:30]}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'shard'], name='unique_sample_shard'),
+        ]
+
+class AnalyticsSnapshot(models.Model):
+    """Stored result of exact survey analytics (see manage.py precompute_analytics)"""
+    survey = models.OneToOneField(Survey, on_delete=models.CASCADE, related_name='analytics_snapshot')
+    data = models.JSONField()
+    answers = models.BigIntegerField(default=0)  # answers the snapshot was computed from
+    
+    run = models.CharField(max_length=50, blank=True, db_index=True)  # precompute run that wrote it
+    compute_seconds = models.FloatField(null=True, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Analytics snapshot - {self.survey.title}"
+
+class ReportJob(models.Model):
+    """Background rendering of a PDF or XLSX survey report (see surveys.reports)"""
+    FORMAT_CHOICES = [
+        ('pdf', 'PDF'),
+        ('xlsx', 'Excel'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='report_jobs')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Hash of the survey revision and response version; names the artifact file
+    content_hash = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField(null=True, blank=True)  # artifact size in bytes
+    render_seconds = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.get_format_display()} report - {self.survey.title} ({self.status})"
+
+class TextAnalyticsState(models.Model):
+    """How far a survey's text term tables are up to date (see surveys.text_analytics)"""
+    survey = models.OneToOneField(Survey, on_delete=models.CASCADE, related_name='text_analytics_state')
+    last_response_id = models.BigIntegerField(default=0)  # responses up to this id are counted
+    answers = models.BigIntegerField(default=0)  # text answers counted
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Text analytics - {self.survey.title}"
+
+class TextTermCount(models.Model):
+    """Number of a text question's answers in one week that mention a term or bigram"""
+    KIND_CHOICES = [
+        ('answers', 'All answers'),  # term is empty; counts every text answer
+        ('term', 'Term'),
+        ('bigram', 'Bigram'),  # counted over all time, under week 0001-01-01
+    ]
+    
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='term_counts')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    term = models.CharField(max_length=100, blank=True)
+    week = models.DateField()  # Monday of the week the responses were started
+    count = models.BigIntegerField(default=0)
+    examples = models.JSONField(default=list)  # ids of a few responses from the batch that first saw the term
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'kind', 'term', 'week'], name='unique_term_week'),
+        ]
+        indexes = [
+            # Top bigrams without aggregating
+            models.Index(fields=['question', 'kind', 'count']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term or self.kind} ({self.week}): {self.count}"
+
+class ResponseImport(models.Model):
+    """Progress of importing a file of historical responses (see surveys.importer)"""
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='imports')
+    source = models.CharField(max_length=255)  # file name
+    checksum = models.CharField(max_length=64)  # sha256 of the file; identifies it when resuming
+    
+    rows = models.BigIntegerField(default=0)  # data rows processed, in file order
+    responses = models.BigIntegerField(default=0)
+    answers = models.BigIntegerField(default=0)
+    skipped = models.BigIntegerField(default=0)  # rows rejected by validation
+    errors = models.JSONField(default=list)  # first rejected rows: [{row, error}]
+    
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['survey', 'checksum'], name='unique_survey_import'),
+        ]
+    
+    def __str__(self):
+        return f"Import {self.source} - {self.survey.title} ({self.rows} rows)"
@@ -0,0 +1,51 @@
+"""
+Pagination for very large tables.
+
+``COUNT(*)`` over millions of rows is what makes admin changelists time out,
+so ``ApproximateCountPaginator`` estimates the size of unfiltered querysets
+from what the database already knows about the table instead.
+"""
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def table_row_estimate(model, using='default'):
+    """Approximate number of rows in a model's table, or None if unknown
+
+    PostgreSQL reports the planner's row estimate, kept current by
+    autovacuum. SQLite has no maintained estimate, so the largest primary key
+    stands in for it (read from the primary key index).
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            # -1 means the table was never analyzed
+            return int(row[0]) if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            pk = connection.ops.quote_name(model._meta.pk.column)
+            cursor.execute(f'SELECT MAX({pk}) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator that estimates the count of large unfiltered querysets
+
+    Filtered querysets (searches, list filters) and tables smaller than
+    ``exact_count_limit`` are still counted exactly.
+    """
+    exact_count_limit = 100_000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = table_row_estimate(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > self.exact_count_limit:
+                return estimate
+        return super().count
@@ -0,0 +1,341 @@
+"""
+On-demand request profiling.
+
+``ProfilingMiddleware`` profiles a request when an admin asks for it with
+``?profile=1`` or an ``X-Profile: 1`` header, and a random
+``PROFILING_SAMPLE_RATE`` fraction of all requests. A profile is a cProfile
+dump of the request plus a trace of its SQL statements (without their
+parameters, which may hold patient data), stored under
+``PROFILING_DIR`` as ``<id>.prof`` (open it with pstats or snakeviz) and
+``<id>.json``. Only the newest ``PROFILING_MAX_FILES`` profiles, none older
+than ``PROFILING_MAX_AGE_DAYS``, are kept. Stored paths keep the query
+parameter names but hide their values, except for ``PUBLIC_QUERY_PARAMS``.
+
+Admins list the slowest stored requests at ``/api/profiles/`` and read one
+at ``/api/profiles/<id>/``.
+
+Requests that are not profiled cost one query-string check and, with
+sampling on, one random number. One request per process is profiled at a
+time; others run normally meanwhile. Async views are profiled on the event
+loop thread, so their database time is in the SQL trace rather than the
+cProfile dump. The profiler sees every coroutine the loop runs, so an async
+request is only profiled when no other request is in flight; requests that
+start while it runs are counted in the profile's ``concurrent_requests``,
+and their work is mixed into its dump.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse
+from django.utils import timezone
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$')
+# Query parameters stored with their values; others may hold search terms,
+# tickets or patient details, so only their names are kept
+PUBLIC_QUERY_PARAMS = {PROFILE_PARAM, 'mode', 'format', 'fields', 'limit', 'page', 'page_size', 'ordering'}
+REDACTED = 'redacted'
+# Functions listed in a profile's detail, by cumulative time
+TOP_FUNCTIONS = 40
+
+# Only one profiler runs per process, so concurrent profiles cannot mix
+_profiling = threading.Lock()
+
+
+def profile_requested(request):
+    """'requested', 'sampled' or None; requested profiles still need an admin"""
+    query = request.META.get('QUERY_STRING', '')
+    if (f'{PROFILE_PARAM}=' in query and request.GET.get(PROFILE_PARAM) in ('1', 'true')) or \
+            request.META.get(PROFILE_HEADER) in ('1', 'true'):
+        return 'requested'
+    rate = settings.PROFILING_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return 'sampled'
+    return None
+
+
+def is_admin(request):
+    """Whether the request authenticates as an admin, with the API's authentication classes"""
+    api_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = api_request.user
+    except APIException:
+        return False
+    return getattr(user, 'role', None) == 'admin'
+
+
+class QueryTrace:
+    """Database execute wrapper recording the statements of a request"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.statements = []
+        self.count = 0
+        self.seconds = 0.0
+        self._installed = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.statements) < self.limit:
+                self.statements.append({
+                    'sql': sql,
+                    'ms': round(elapsed * 1000, 3),
+                    'many': many,
+                    'database': context['connection'].alias,
+                })
+
+    def install(self):
+        # Connections are per thread; this covers the calling thread's
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+            self._installed.append(connection)
+
+    def uninstall(self):
+        for connection in self._installed:
+            connection.execute_wrappers.remove(self)
+        self._installed = []
+
+
+def profile_path(request):
+    """The request's path with the values of non-public query parameters hidden"""
+    query = request.META.get('QUERY_STRING', '')
+    if not query:
+        return request.path
+    params = [
+        (name, value if name in PUBLIC_QUERY_PARAMS else REDACTED)
+        for name, value in parse_qsl(query, keep_blank_values=True)
+    ]
+    return f'{request.path}?{urlencode(params)}'
+
+
+def profiles_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def store_profile(request, response, trigger, profiler, trace, seconds, cpu_seconds, concurrent_requests=0):
+    """Write a profile's dump and summary, then apply the retention limits"""
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    now = timezone.now()
+    profile_id = f"{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(directory / f'{profile_id}.prof')
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    summary = {
+        'id': profile_id,
+        'created_at': now.isoformat(),
+        'method': request.method,
+        'path': profile_path(request),
+        'view': match.view_name if match else None,
+        'status': response.status_code,
+        'duration_ms': round(seconds * 1000, 2),
+        'cpu_ms': round(cpu_seconds * 1000, 2),
+        'queries': trace.count,
+        'sql_ms': round(trace.seconds * 1000, 2),
+        'user': user.username if getattr(user, 'is_authenticated', False) else None,
+        'trigger': trigger,
+        'concurrent_requests': concurrent_requests,
+        'sql': trace.statements,
+    }
+    # Written last, so a listed profile always has its dump
+    with open(directory / f'{profile_id}.json', 'w') as f:
+        json.dump(summary, f)
+    prune_profiles()
+    return profile_id
+
+
+def prune_profiles():
+    """Delete profiles beyond PROFILING_MAX_FILES or older than PROFILING_MAX_AGE_DAYS"""
+    directory = profiles_dir()
+    oldest = time.time() - settings.PROFILING_MAX_AGE_DAYS * 86400
+    # Ids start with their timestamp, so names sort by age
+    summaries = sorted(directory.glob('*.json'), reverse=True)
+    for index, path in enumerate(summaries):
+        try:
+            if index >= settings.PROFILING_MAX_FILES or path.stat().st_mtime < oldest:
+                path.unlink(missing_ok=True)
+                path.with_suffix('.prof').unlink(missing_ok=True)
+        except OSError:
+            # Another process pruned it first
+            pass
+
+
+def run_profiled(trigger, request, call):
+    """Profile ``call()`` for a request and store the result when it succeeds"""
+    trace = QueryTrace(settings.PROFILING_SQL_LIMIT)
+    profiler = cProfile.Profile()
+    trace.install()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    profiler.enable()
+    try:
+        response = call()
+    finally:
+        profiler.disable()
+        trace.uninstall()
+    seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - cpu_start
+    store_profile(request, response, trigger, profiler, trace, seconds, cpu_seconds)
+    return response
+
+
+class ProfilingMiddleware:
+    """Profile admin-requested and sampled requests (see module docstring)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Async requests of this process; only touched on the event loop thread
+        self.in_flight = 0
+        self.started = 0
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        trigger = profile_requested(request)
+        if trigger == 'requested' and not is_admin(request):
+            trigger = None
+        if trigger is None or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return run_profiled(trigger, request, lambda: self.get_response(request))
+        finally:
+            _profiling.release()
+
+    async def __acall__(self, request):
+        self.in_flight += 1
+        self.started += 1
+        try:
+            return await self.profile_async(request)
+        finally:
+            self.in_flight -= 1
+
+    async def profile_async(self, request):
+        trigger = profile_requested(request)
+        if trigger == 'requested' and not await sync_to_async(is_admin)(request):
+            trigger = None
+        # Another request on the loop would be mixed into the profile
+        if trigger is None or self.in_flight > 1 or not _profiling.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            started = self.started
+            trace = QueryTrace(settings.PROFILING_SQL_LIMIT)
+            profiler = cProfile.Profile()
+            # Queries of async views run on the request's sync thread
+            await sync_to_async(trace.install)()
+            start, cpu_start = time.perf_counter(), time.process_time()
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+                await sync_to_async(trace.uninstall)()
+            seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - cpu_start
+            await sync_to_async(store_profile)(
+                request, response, trigger, profiler, trace, seconds, cpu_seconds, self.started - started
+            )
+            return response
+        finally:
+            _profiling.release()
+
+
+def load_summary(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def function_name(filename, line, name):
+    # Paths relative to the project or site-packages; built-ins have none
+    for root in (f'{settings.BASE_DIR}{os.sep}', f'site-packages{os.sep}'):
+        if root in filename:
+            filename = filename.split(root, 1)[1]
+            break
+    return f'{filename}:{line}({name})'
+
+
+def top_functions(path, limit=TOP_FUNCTIONS):
+    """The functions of a cProfile dump with the most cumulative time"""
+    stats = pstats.Stats(str(path)).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            'function': function_name(filename, line, name),
+            'calls': calls,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, own, cumulative, _) in rows
+    ]
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def profile_list(request):
+    """The slowest stored request profiles"""
+    if request.user.role != 'admin':
+        return Response({'error': 'Only administrators can view profiles'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), settings.PROFILING_MAX_FILES)
+    except ValueError:
+        return Response({'error': "'limit' must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+    path_filter = request.query_params.get('path', '')
+
+    summaries = []
+    for path in profiles_dir().glob('*.json'):
+        summary = load_summary(path)
+        if summary is not None and path_filter in summary['path']:
+            summary.pop('sql', None)
+            summaries.append(summary)
+    summaries.sort(key=lambda summary: summary['duration_ms'], reverse=True)
+    return Response({'count': len(summaries), 'results': summaries[:limit]})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def profile_detail(request, profile_id):
+    """One stored profile: its SQL trace and top functions, or the raw dump with ?download=1"""
+    if request.user.role != 'admin':
+        return Response({'error': 'Only administrators can view profiles'}, status=status.HTTP_403_FORBIDDEN)
+    summary = load_summary(profiles_dir() / f'{profile_id}.json') if PROFILE_ID.match(profile_id) else None
+    dump = profiles_dir() / f'{profile_id}.prof'
+    if summary is None or not dump.exists():
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.query_params.get('download') in ('1', 'true'):
+        return FileResponse(open(dump, 'rb'), as_attachment=True, filename=dump.name,
+                            content_type='application/octet-stream')
+    return Response({**summary, 'functions': top_functions(dump)})
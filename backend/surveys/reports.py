@@ -0,0 +1,340 @@
+"""
+PDF and XLSX survey reports rendered in the background.
+
+``request_report`` records a ``ReportJob`` and hands it to a worker pool
+(``REPORTS_EXECUTOR``, ``REPORTS_WORKERS``) once the request commits.
+Workers build the report from the survey's analytics payload, read from the
+replica when there is one (see ``healthcare_survey.routers``). They reuse
+the stored ``AnalyticsSnapshot`` while it is current and otherwise compute
+exact analytics and store them as the new snapshot.
+
+Artifacts are written to ``REPORTS_DIR`` and named after a hash of the
+survey revision (survey and question definitions) and the response version
+(response count, newest response and completion). A request whose hash
+already has an artifact is served from disk without rendering.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from healthcare_survey.routers import replica_reads
+
+from .analytics import exact_analytics, store_snapshot
+from .models import AnalyticsSnapshot, ReportJob
+from .workers import worker_pool
+
+# Bump when the report layout changes so earlier artifacts are not reused
+REPORT_VERSION = 1
+
+REPORT_FORMATS = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Pending/running jobs older than this are presumed lost (e.g. a restarted worker)
+JOB_TIMEOUT = timedelta(minutes=30)
+
+_report_executor = None
+
+
+def report_executor():
+    """Worker pool for report rendering, created on first use"""
+    global _report_executor
+    if _report_executor is None:
+        workers = settings.REPORTS_WORKERS
+        if settings.REPORTS_EXECUTOR == 'process':
+            _report_executor = worker_pool(workers)
+        else:
+            _report_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reports')
+    return _report_executor
+
+
+def survey_revision(survey):
+    """Everything about a survey's definition that shows up in its report"""
+    questions = survey.questions.order_by('order', 'id').values_list(
+        'id', 'order', 'text', 'type', 'options', 'min_value', 'max_value'
+    )
+    return [survey.title, survey.description, survey.is_anonymous, survey.updated_at, list(questions)]
+
+
+def response_version(survey):
+    """Changes whenever a response is added, removed or completed"""
+    version = survey.responses.aggregate(
+        count=Count('id'),
+        completed=Count('id', filter=Q(is_complete=True)),
+        last_id=Max('id'),
+        last_completed=Max('completed_at'),
+    )
+    return [version['count'], version['completed'], version['last_id'], version['last_completed']]
+
+
+def content_hash(survey, report_format):
+    key = [REPORT_VERSION, report_format, survey_revision(survey), response_version(survey)]
+    return hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()
+
+
+def artifact_path(digest, report_format):
+    return Path(settings.REPORTS_DIR) / f'{digest}.{report_format}'
+
+
+def report_filename(job):
+    slug = ''.join(c if c.isalnum() else '-' for c in job.survey.title.lower()).strip('-')[:50]
+    return f"{slug or 'survey'}-report-{job.survey_id}.{job.format}"
+
+
+def request_report(survey, user, report_format):
+    """Return (job, created) for a report of the survey's current data
+
+    An existing job for the same content is returned instead of a new one:
+    finished jobs whose artifact is still on disk and jobs still in progress.
+    """
+    digest = content_hash(survey, report_format)
+    existing = ReportJob.objects.filter(
+        survey=survey, format=report_format, content_hash=digest
+    ).exclude(status='failed').first()
+    if existing is not None:
+        if existing.status == 'done' and artifact_path(digest, report_format).exists():
+            return existing, False
+        if existing.status != 'done' and existing.created_at > timezone.now() - JOB_TIMEOUT:
+            return existing, False
+
+    job = ReportJob.objects.create(
+        survey=survey, requested_by=user, format=report_format, content_hash=digest
+    )
+    transaction.on_commit(lambda: report_executor().submit(render_report_job, job.id))
+    return job, True
+
+
+def report_analytics(survey):
+    """The survey's analytics payload, reusing its snapshot while it is current"""
+    snapshot = AnalyticsSnapshot.objects.filter(survey=survey).first()
+    if snapshot is not None:
+        latest = survey.responses.aggregate(
+            count=Count('id'),
+            completed=Count('id', filter=Q(is_complete=True)),
+            started=Max('started_at'),
+            finished=Max('completed_at'),
+        )
+        changed = max(filter(None, [latest['started'], latest['finished'], survey.updated_at]))
+        if (snapshot.computed_at >= changed
+                and snapshot.data.get('total_responses') == latest['count']
+                and snapshot.data.get('completed_responses') == latest['completed']):
+            return snapshot.data
+
+    start = time.perf_counter()
+    analytics_data = exact_analytics(survey)
+    store_snapshot(survey, analytics_data, 'report', time.perf_counter() - start)
+    return analytics_data
+
+
+def report_tables(survey, analytics_data):
+    """{sheet name: DataFrame} of the analytics payload"""
+    import pandas as pd
+
+    summary = pd.DataFrame([
+        ('Survey', survey.title),
+        ('Status', survey.get_status_display()),
+        ('Total responses', analytics_data['total_responses']),
+        ('Completed responses', analytics_data['completed_responses']),
+        ('Completion rate (%)', analytics_data['completion_rate']),
+        ('Average completion time (min)', analytics_data['average_completion_time']),
+        *[
+            (f'Completion time {name} (min)', value)
+            for name, value in analytics_data.get('completion_time_percentiles', {}).items()
+        ],
+        ('Generated', timezone.now().strftime('%Y-%m-%d %H:%M UTC')),
+    ], columns=['Metric', 'Value'])
+
+    questions, choices, numeric = [], [], []
+    for question in analytics_data['question_analytics']:
+        questions.append({
+            'Question': question['question_text'],
+            'Type': question['question_type'],
+            'Answers': question['total_responses'],
+            'Response rate (%)': round(question['response_rate'], 2),
+        })
+        distribution = question.get('choice_distribution') or {}
+        answered = sum(distribution.values())
+        for option, count in distribution.items():
+            choices.append({
+                'Question': question['question_text'],
+                'Option': option,
+                'Count': count,
+                'Share (%)': round(count / answered * 100, 2) if answered else 0,
+            })
+        stats = question.get('statistics')
+        if stats and stats.get('count'):
+            numeric.append({
+                'Question': question['question_text'],
+                'Count': stats['count'],
+                'Mean': stats['mean'],
+                'Median': stats['median'],
+                'Std': stats['std'],
+                'Min': stats['min'],
+                'Max': stats['max'],
+            })
+
+    by_date = pd.DataFrame(analytics_data['responses_by_date'], columns=['date', 'count'])
+    return {
+        'Summary': summary,
+        'Questions': pd.DataFrame(questions, columns=['Question', 'Type', 'Answers', 'Response rate (%)']),
+        'Choices': pd.DataFrame(choices, columns=['Question', 'Option', 'Count', 'Share (%)']),
+        'Numeric': pd.DataFrame(numeric, columns=['Question', 'Count', 'Mean', 'Median', 'Std', 'Min', 'Max']),
+        'Responses by date': by_date.rename(columns={'date': 'Date', 'count': 'Responses'}),
+    }
+
+
+def render_xlsx(survey, analytics_data, path):
+    import pandas as pd
+    from openpyxl.chart import BarChart, Reference
+
+    tables = report_tables(survey, analytics_data)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name, table in tables.items():
+            table.to_excel(writer, sheet_name=name, index=False)
+            sheet = writer.sheets[name]
+            for column in sheet.columns:
+                width = max(len(str(cell.value or '')) for cell in column)
+                sheet.column_dimensions[column[0].column_letter].width = min(width + 2, 60)
+
+        rows = len(tables['Responses by date'])
+        if rows:
+            sheet = writer.sheets['Responses by date']
+            chart = BarChart()
+            chart.title = 'Responses started per day'
+            chart.legend = None
+            chart.add_data(Reference(sheet, min_col=2, min_row=1, max_row=rows + 1), titles_from_data=True)
+            chart.set_categories(Reference(sheet, min_col=1, min_row=2, max_row=rows + 1))
+            chart.width, chart.height = 24, 10
+            sheet.add_chart(chart, 'D2')
+
+
+def bar_chart(labels, values, width=460):
+    """Horizontal reportlab bar chart drawing"""
+    from reportlab.graphics.charts.barcharts import HorizontalBarChart
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
+
+    bar_height = 14
+    height = bar_height * len(labels) + 30
+    drawing = Drawing(width, height)
+    chart = HorizontalBarChart()
+    chart.x, chart.y = 150, 15
+    chart.width, chart.height = width - 170, height - 25
+    # Bars are drawn bottom-up; reverse so the first option is on top
+    chart.data = [list(reversed(values))]
+    chart.categoryAxis.categoryNames = [str(label)[:30] for label in reversed(labels)]
+    chart.categoryAxis.labels.fontSize = 7
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 7
+    chart.bars[0].fillColor = colors.HexColor('#2563eb')
+    drawing.add(chart)
+    return drawing
+
+
+def render_pdf(survey, analytics_data, path):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import KeepTogether, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    from xml.sax.saxutils import escape
+
+    styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
+    ])
+    tables = report_tables(survey, analytics_data)
+
+    story = [Paragraph(escape(survey.title), styles['Title']), Spacer(1, 6)]
+    summary = tables['Summary']
+    story.append(Table([list(summary.columns)] + summary.astype(str).values.tolist(), style=table_style))
+
+    by_date = analytics_data['responses_by_date']
+    if by_date:
+        story.append(Spacer(1, 12))
+        story.append(Paragraph('Responses started per day (last 30 days)', styles['Heading2']))
+        story.append(bar_chart([point['date'][5:] for point in by_date], [point['count'] for point in by_date]))
+
+    story.append(Paragraph('Questions', styles['Heading2']))
+    for question in analytics_data['question_analytics']:
+        block = [
+            Paragraph(escape(question['question_text']), styles['Heading4']),
+            Paragraph(
+                f"{question['question_type']} &middot; {question['total_responses']} answers "
+                f"({question['response_rate']:.1f}% of responses)", styles['Normal']
+            ),
+        ]
+        distribution = question.get('choice_distribution')
+        stats = question.get('statistics') or {}
+        if distribution:
+            block.append(bar_chart(list(distribution), list(distribution.values())))
+        elif stats.get('count'):
+            block.append(Table([
+                ['Mean', 'Median', 'Std', 'Min', 'Max'],
+                [stats['mean'], stats['median'], stats['std'], stats['min'], stats['max']],
+            ], style=table_style, hAlign='LEFT'))
+            if question.get('rating_distribution'):
+                histogram = question['rating_distribution']
+                block.append(bar_chart(list(histogram), list(histogram.values())))
+        block.append(Spacer(1, 8))
+        story.append(KeepTogether(block))
+
+    SimpleDocTemplate(str(path), pagesize=A4, title=survey.title).build(story)
+
+
+RENDERERS = {
+    'pdf': render_pdf,
+    'xlsx': render_xlsx,
+}
+
+
+def render_report(survey, report_format, path):
+    """Render a report to ``path``; readers never see a partly written file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f'{path.name}.{os.getpid()}.part')
+    try:
+        RENDERERS[report_format](survey, report_analytics(survey), partial)
+        os.replace(partial, path)
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+
+def render_report_job(job_id):
+    """Render a pending report job, for thread and process pools"""
+    close_old_connections()
+    # Claim the job so it is rendered once even if submitted twice
+    if not ReportJob.objects.filter(id=job_id, status='pending').update(status='running'):
+        return
+    job = ReportJob.objects.select_related('survey').get(id=job_id)
+    start = time.perf_counter()
+    try:
+        # Name the artifact after the data it is rendered from, which may be
+        # newer than when the job was requested. Both come from the replica
+        # when there is one, so a large report does not hold up submissions
+        with replica_reads():
+            digest = content_hash(job.survey, job.format)
+            path = artifact_path(digest, job.format)
+            if not path.exists():
+                render_report(job.survey, job.format, path)
+    except Exception as e:
+        ReportJob.objects.filter(id=job_id).update(
+            status='failed', error=str(e), finished_at=timezone.now()
+        )
+        return
+    ReportJob.objects.filter(id=job_id).update(
+        status='done', content_hash=digest, size=path.stat().st_size,
+        render_seconds=round(time.perf_counter() - start, 3), finished_at=timezone.now()
+    )
@@ -0,0 +1,411 @@
+"""
+Approximate analytics.
+
+Every survey keeps an ``AnalyticsSketch`` with running response counters, a
+HyperLogLog sketch of distinct respondents and a reservoir of completion
+durations; every comparable question keeps a ``QuestionSample`` reservoir of
+answer values. Both are updated as responses are submitted (reservoir
+sampling, Algorithm R), so ``?mode=approx`` analytics read a few small rows
+instead of scanning every answer.
+
+Sketches and samples are split into ``ANALYTICS_SKETCH_SHARDS`` shards per
+survey. Each write transaction updates one random shard, so submissions to
+the same survey do not all wait on one row lock. Reads merge the shards:
+counters are summed, HyperLogLog registers take the maximum and reservoirs
+contribute values in proportion to how many each shard has seen.
+
+Distributions and means are estimated from the samples with 95% error bounds.
+The number of answers is known exactly, so bounds include the finite
+population correction and drop to zero while a sample still holds every
+answer.
+"""
+
+import hashlib
+import random
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .choices import CHOICE_TYPES, SINGLE_CHOICE_TYPES, option_values
+from .comparison import VALUE_FIELDS, answer_value
+from .durations import PERCENTILES, nearest_rank
+from .models import AnalyticsSketch, QuestionSample, SurveyResponse
+from .statistics import NUMERIC_TYPES, Z_95, describe
+from .storage import pack_answer, survey_answers
+
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+# Relative standard error of the HyperLogLog estimate
+HLL_ERROR = 1.04 / HLL_REGISTERS ** 0.5
+
+_random = random.SystemRandom()
+
+
+def sample_size():
+    return settings.ANALYTICS_SAMPLE_SIZE
+
+
+def random_shard():
+    return _random.randrange(max(settings.ANALYTICS_SKETCH_SHARDS, 1))
+
+
+def reservoir_slot(seen, size):
+    """Slot the ``seen``-th value (1-based) goes to, -1 to append, or None to discard it"""
+    if seen <= size:
+        return -1
+    slot = _random.randrange(seen)
+    return slot if slot < size else None
+
+
+def reservoir_offer(reservoir, seen, value, size):
+    slot = reservoir_slot(seen, size)
+    if slot is None:
+        return
+    if slot < 0:
+        reservoir.append(value)
+    else:
+        reservoir[slot] = value
+
+
+def respondent_key(survey_response):
+    if survey_response.respondent_id:
+        return f'user:{survey_response.respondent_id}'
+    return f'session:{survey_response.session_id or ""}:{survey_response.ip_address or ""}'
+
+
+def hll_add(registers, key):
+    """Add a key to a HyperLogLog register bytearray"""
+    digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+    index = digest >> (64 - HLL_PRECISION)
+    remainder = digest & ((1 << (64 - HLL_PRECISION)) - 1)
+    rank = (64 - HLL_PRECISION) - remainder.bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def hll_merge(register_sets):
+    """Registers of the union of several HyperLogLog sketches"""
+    merged = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    for registers in register_sets:
+        if registers:
+            np.maximum(merged, np.frombuffer(bytes(registers), dtype=np.uint8), out=merged)
+    return merged.tobytes()
+
+
+def merge_reservoirs(reservoirs, size):
+    """One sample from several shards' (reservoir, values seen) pairs
+
+    Each shard contributes in proportion to the values it has seen, so the
+    result is close to a uniform sample of all of them. While every shard
+    still holds all its values, they are all kept.
+    """
+    total = sum(seen for _, seen in reservoirs)
+    # Seeded with the total so repeated reads of unchanged shards agree
+    rng = random.Random(total)
+    merged = []
+    for values, seen in reservoirs:
+        take = min(len(values), round(size * seen / total)) if total > size else len(values)
+        merged.extend(values if take >= len(values) else rng.sample(values, take))
+    return merged
+
+
+def hll_estimate(registers):
+    """Estimated number of distinct keys added to the registers"""
+    if not registers:
+        return 0
+    values = np.frombuffer(bytes(registers), dtype=np.uint8).astype(float)
+    m = values.size
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-values))
+    zeros = int(np.count_nonzero(values == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Small-range correction (linear counting)
+        estimate = m * np.log(m / zeros)
+    return int(round(estimate))
+
+
+def sample_value(question, answer):
+    """Value kept in a question's sample: option index, checkbox mask, number or bool"""
+    if isinstance(answer, dict):
+        field = VALUE_FIELDS.get(question.type)
+        return answer.get(field) if field else None
+    if question.type not in VALUE_FIELDS:
+        return None
+    return answer_value(question, answer)
+
+
+def record_submission(survey_response, answers):
+    """Update the survey's sketch and question samples with a new response
+
+    ``answers`` are the validated answer dicts of the submission.
+    """
+    record_submissions([(survey_response, answers)])
+
+
+def record_submissions(submissions):
+    """Update sketches and samples with several new (response, answers) pairs
+
+    Each survey's sketch and each changed sample is read and written once,
+    however many of the responses it covers, in one random shard.
+    """
+    size = sample_size()
+    by_survey = {}
+    for survey_response, answers in submissions:
+        by_survey.setdefault(survey_response.survey_id, []).append((survey_response, answers))
+
+    with transaction.atomic():
+        sketches = {}
+        for survey_id in sorted(by_survey):
+            sketches[survey_id], _ = AnalyticsSketch.objects.select_for_update().get_or_create(
+                survey_id=survey_id, shard=random_shard()
+            )
+
+        # Only questions whose reservoir changes are read and written
+        changes = {}
+        for survey_id, pairs in by_survey.items():
+            sketch = sketches[survey_id]
+            registers = bytearray(sketch.respondents or bytes(HLL_REGISTERS))
+            for survey_response, answers in pairs:
+                sketch.responses += 1
+                sketch.completed += bool(survey_response.is_complete)
+                hll_add(registers, respondent_key(survey_response))
+                if survey_response.duration_seconds is not None:
+                    sketch.durations_seen += 1
+                    reservoir_offer(sketch.durations, sketch.durations_seen, survey_response.duration_seconds, size)
+                for answer in answers:
+                    question = answer['question']
+                    if pack_answer(answer) is None:
+                        continue
+                    seen = sketch.answered.get(str(question.id), 0) + 1
+                    sketch.answered[str(question.id)] = seen
+                    value = sample_value(question, answer)
+                    if value is not None:
+                        slot = reservoir_slot(seen, size)
+                        if slot is not None:
+                            changes.setdefault((question.id, sketch.shard), []).append((slot, value))
+            sketch.respondents = bytes(registers)
+            sketch.save()
+
+        # Create missing samples; a concurrent submission may have created one already
+        QuestionSample.objects.bulk_create(
+            [QuestionSample(question_id=question_id, shard=shard, values=[]) for question_id, shard in changes],
+            ignore_conflicts=True,
+        )
+        shard_questions = {}
+        for question_id, shard in changes:
+            shard_questions.setdefault(shard, []).append(question_id)
+        selected = Q(pk__in=[])
+        for shard, question_ids in shard_questions.items():
+            selected |= Q(shard=shard, question_id__in=question_ids)
+        samples = {
+            (sample.question_id, sample.shard): sample
+            for sample in QuestionSample.objects.select_for_update().filter(selected)
+        }
+        for key, slots in changes.items():
+            sample = samples[key]
+            for slot, value in slots:
+                if slot < 0:
+                    sample.values.append(value)
+                elif slot < len(sample.values):
+                    sample.values[slot] = value
+        QuestionSample.objects.bulk_update(list(samples.values()), ['values'], batch_size=500)
+
+
+def record_response_update(survey_response, was_complete, had_duration):
+    """Count an edited response's completion in one of its survey's sketch shards
+
+    Call inside the transaction that saves the response. Surveys without a
+    sketch are left to ``rebuild_analytics_samples``.
+    """
+    completed = int(survey_response.is_complete) - int(was_complete)
+    offer_duration = not had_duration and survey_response.duration_seconds is not None
+    if not completed and not offer_duration:
+        return
+    if not AnalyticsSketch.objects.filter(survey_id=survey_response.survey_id).exists():
+        return
+    with transaction.atomic():
+        sketch, _ = AnalyticsSketch.objects.select_for_update().get_or_create(
+            survey_id=survey_response.survey_id, shard=random_shard()
+        )
+        sketch.completed += completed
+        if offer_duration:
+            sketch.durations_seen += 1
+            reservoir_offer(sketch.durations, sketch.durations_seen, survey_response.duration_seconds, sample_size())
+        sketch.save()
+
+
+def rebuild_sketch(survey, chunk_size=2000):
+    """Recompute a survey's sketch and samples from its stored responses, as a single shard"""
+    size = sample_size()
+    sketch = AnalyticsSketch(survey=survey, respondents=bytes(HLL_REGISTERS))
+    registers = bytearray(sketch.respondents)
+
+    responses = SurveyResponse.objects.filter(survey=survey).only(
+        'respondent_id', 'session_id', 'ip_address', 'is_complete', 'duration_seconds'
+    )
+    for survey_response in responses.iterator(chunk_size=chunk_size):
+        sketch.responses += 1
+        sketch.completed += survey_response.is_complete
+        hll_add(registers, respondent_key(survey_response))
+        if survey_response.duration_seconds is not None:
+            sketch.durations_seen += 1
+            reservoir_offer(sketch.durations, sketch.durations_seen, survey_response.duration_seconds, size)
+    sketch.respondents = bytes(registers)
+
+    questions = {question.id: question for question in survey.questions.all()}
+    samples = {question_id: [] for question_id, question in questions.items() if question.type in VALUE_FIELDS}
+    for answer in survey_answers(survey, chunk_size):
+        question = questions.get(answer.question_id)
+        if question is None or pack_answer(answer) is None:
+            continue
+        seen = sketch.answered.get(str(question.id), 0) + 1
+        sketch.answered[str(question.id)] = seen
+        value = sample_value(question, answer) if question.id in samples else None
+        if value is not None:
+            reservoir_offer(samples[question.id], seen, value, size)
+
+    with transaction.atomic():
+        AnalyticsSketch.objects.filter(survey=survey).delete()
+        QuestionSample.objects.filter(question__survey=survey).delete()
+        sketch.save()
+        QuestionSample.objects.bulk_create([
+            QuestionSample(question_id=question_id, values=values)
+            for question_id, values in samples.items() if values
+        ])
+    return sketch
+
+
+def proportion_margin(share, sampled, population):
+    """95% margin of a sample proportion, with finite population correction"""
+    if not sampled or sampled >= population:
+        return 0.0
+    correction = ((population - sampled) / (population - 1)) ** 0.5
+    return Z_95 * (share * (1 - share) / sampled) ** 0.5 * correction
+
+
+def estimated_distribution(question, values, population):
+    """{option: (estimated count, 95% margin in answers)} from a choice sample"""
+    labels = option_values(question)
+    if not values:
+        return {label: (0, 0) for label in labels}
+    sample = np.asarray(values, dtype=np.int64)
+    if question.type in SINGLE_CHOICE_TYPES:
+        counts = np.bincount(sample[sample < len(labels)], minlength=len(labels))
+    else:
+        counts = ((sample[:, None] >> np.arange(len(labels))) & 1).sum(axis=0)
+    shares = counts / sample.size
+    return {
+        label: (
+            int(round(share * population)),
+            int(round(proportion_margin(share, sample.size, population) * population)),
+        )
+        for label, share in zip(labels, shares)
+    }
+
+
+def estimated_statistics(question, values, population):
+    """describe() on a numeric sample, scaled to the number of answers"""
+    sample = np.asarray(values, dtype=float)
+    stats = describe(question, sample)
+    if not sample.size:
+        return stats
+    scale = population / sample.size
+    stats['count'] = population
+    stats['sample_size'] = int(sample.size)
+    stats['histogram'] = {label: int(round(count * scale)) for label, count in stats['histogram'].items()}
+    if sample.size > 1:
+        correction = ((population - sample.size) / (population - 1)) ** 0.5 if population > 1 else 0.0
+        margin = Z_95 * float(sample.std(ddof=1)) / sample.size ** 0.5 * correction
+        stats['confidence_interval_95'] = [round(stats['mean'] - margin, 4), round(stats['mean'] + margin, 4)]
+        stats['mean_margin_95'] = round(margin, 4)
+    return stats
+
+
+def merged_sketch(shards, size):
+    """An unsaved sketch combining a survey's sketch shards"""
+    sketch = AnalyticsSketch(
+        survey_id=shards[0].survey_id,
+        responses=sum(shard.responses for shard in shards),
+        completed=sum(shard.completed for shard in shards),
+        respondents=hll_merge(shard.respondents for shard in shards),
+        durations=merge_reservoirs([(shard.durations, shard.durations_seen) for shard in shards], size),
+        durations_seen=sum(shard.durations_seen for shard in shards),
+        updated_at=max(shard.updated_at for shard in shards),
+    )
+    for shard in shards:
+        for question_id, seen in shard.answered.items():
+            sketch.answered[question_id] = sketch.answered.get(question_id, 0) + seen
+    return sketch
+
+
+def merged_samples(survey, shards, size):
+    """{question id: values} combining the sample shards of a survey's questions"""
+    answered = {shard.shard: shard.answered for shard in shards}
+    reservoirs = {}
+    rows = QuestionSample.objects.filter(question__survey=survey).values_list('question_id', 'shard', 'values')
+    for question_id, shard, values in rows:
+        seen = answered.get(shard, {}).get(str(question_id), 0)
+        reservoirs.setdefault(question_id, []).append((values, seen))
+    return {question_id: merge_reservoirs(pairs, size) for question_id, pairs in reservoirs.items()}
+
+
+def approximate_analytics(survey):
+    """Survey analytics estimated from the sketch and samples, or None without a sketch"""
+    shards = list(AnalyticsSketch.objects.filter(survey=survey))
+    if not shards:
+        return None
+    questions = list(survey.questions.all())
+    size = sample_size()
+    sketch = merged_sketch(shards, size)
+    samples = merged_samples(survey, shards, size)
+
+    total_responses = sketch.responses
+    durations = np.sort(np.asarray(sketch.durations, dtype=float))
+    percentiles = {
+        name: round(float(durations[nearest_rank(durations.size, permille) - 1]) / 60, 2)
+        for name, permille in PERCENTILES.items()
+    } if durations.size else {}
+    distinct = hll_estimate(sketch.respondents)
+
+    question_analytics = []
+    for question in questions:
+        answered = sketch.answered.get(str(question.id), 0)
+        values = samples.get(question.id, [])
+        analytics_data = {
+            'question_id': question.id,
+            'question_text': question.text,
+            'question_type': question.type,
+            'total_responses': answered,
+            'response_rate': (answered / total_responses * 100) if total_responses > 0 else 0,
+            'sample_size': len(values),
+        }
+        if question.type in CHOICE_TYPES:
+            distribution = estimated_distribution(question, values, answered)
+            analytics_data['choice_distribution'] = {label: count for label, (count, _) in distribution.items()}
+            analytics_data['choice_distribution_margin'] = {
+                label: margin for label, (_, margin) in distribution.items()
+            }
+        elif question.type in NUMERIC_TYPES:
+            stats = estimated_statistics(question, values, answered)
+            analytics_data['statistics'] = stats
+            if question.type == 'rating' and stats['count']:
+                analytics_data['average_rating'] = stats['mean']
+                analytics_data['rating_distribution'] = stats['histogram']
+        question_analytics.append(analytics_data)
+
+    return {
+        'mode': 'approx',
+        'sampled_at': sketch.updated_at.isoformat(),
+        'total_responses': total_responses,
+        'completed_responses': sketch.completed,
+        'average_completion_time': round(float(durations.mean()) / 60, 2) if durations.size else 0,
+        'completion_time_percentiles': percentiles,
+        'completion_rate': round(sketch.completed / total_responses * 100, 2) if total_responses else 0,
+        'distinct_respondents': {
+            'estimate': distinct,
+            'margin_95': int(round(distinct * HLL_ERROR * Z_95)),
+        },
+        'question_analytics': question_analytics,
+    }
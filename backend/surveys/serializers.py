@@ -1,22 +1,38 @@
 from rest_framework import serializers
-from .models import Survey, Question, SurveyResponse, QuestionResponse, SurveyInvitation
+from django.urls import reverse
+from django.utils import timezone
+from .models import Survey, Question, SurveyResponse, QuestionResponse, SurveyInvitation, ReportJob
+from users.fieldsets import SparseFieldsMixin, related_count
 from users.serializers import UserProfileSerializer
+from .storage import is_packed, pack_answers
+from .choices import CHOICE_TYPES, MAX_CHECKBOX_OPTIONS, normalize_choice, raw_choice_value
+from .submissions import save_submissions
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = ['id', 'text', 'type', 'order', 'is_required', 'options',
                  'min_value', 'max_value', 'placeholder', 'help_text',
                  'show_if_question', 'show_if_answer', 'created_at']
         
-    def validate_options(self, value):
-        """Validate options for choice-based questions"""
-        question_type = self.initial_data.get('type')
-        if question_type in ['radio', 'checkbox', 'dropdown'] and not value:
-            raise serializers.ValidationError("Options are required for choice-based questions")
-        return value
+    def validate(self, data):
+        """Check the options of choice questions and reject a range whose minimum is above its maximum"""
+        # Partial updates keep the saved type and options
+        question_type = data.get('type', getattr(self.instance, 'type', None))
+        options = data.get('options', getattr(self.instance, 'options', None))
+        if question_type in CHOICE_TYPES and not options:
+            raise serializers.ValidationError({'options': "Options are required for choice-based questions"})
+        if question_type == 'checkbox' and len(options) > MAX_CHECKBOX_OPTIONS:
+            raise serializers.ValidationError(
+                {'options': f"Checkbox questions support at most {MAX_CHECKBOX_OPTIONS} options"}
+            )
+        min_value = data.get('min_value', getattr(self.instance, 'min_value', None))
+        max_value = data.get('max_value', getattr(self.instance, 'max_value', None))
+        if min_value is not None and max_value is not None and min_value > max_value:
+            raise serializers.ValidationError({'max_value': "max_value must not be less than min_value"})
+        return data
 
-class SurveySerializer(serializers.ModelSerializer):
+class SurveySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True)
     created_by = UserProfileSerializer(read_only=True)
     total_questions = serializers.ReadOnlyField()
@@ -27,14 +43,19 @@ class SurveySerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'category', 'status', 'created_by',
                  'created_at', 'updated_at', 'is_anonymous', 'allow_multiple_responses',
                  'start_date', 'end_date', 'estimated_duration', 'target_roles',
-                 'target_departments', 'questions', 'total_questions', 'total_responses']
+                 'target_departments', 'answer_storage', 'questions', 'total_questions',
+                 'total_responses']
         read_only_fields = ['created_by', 'created_at', 'updated_at']
+        field_annotations = {
+            'total_questions': {'question_count': related_count(Question.objects, 'survey')},
+            'total_responses': {'response_count': related_count(SurveyResponse.objects, 'survey')},
+        }
     
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
         return super().create(validated_data)
 
-class SurveyListSerializer(serializers.ModelSerializer):
+class SurveyListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Lightweight serializer for survey lists"""
     created_by = UserProfileSerializer(read_only=True)
     total_questions = serializers.ReadOnlyField()
@@ -45,8 +66,15 @@ class SurveyListSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'category', 'status', 'created_by',
                  'created_at', 'updated_at', 'estimated_duration', 'total_questions',
                  'total_responses']
+        field_annotations = {
+            'total_questions': {'question_count': related_count(Question.objects, 'survey')},
+            'total_responses': {'response_count': related_count(SurveyResponse.objects, 'survey')},
+        }
+        expandable_fields = {
+            'questions': (QuestionSerializer, {'many': True, 'read_only': True}),
+        }
 
-class QuestionResponseSerializer(serializers.ModelSerializer):
+class QuestionResponseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     question_text = serializers.CharField(source='question.text', read_only=True)
     question_type = serializers.CharField(source='question.type', read_only=True)
     
@@ -54,7 +82,8 @@ class QuestionResponseSerializer(serializers.ModelSerializer):
         model = QuestionResponse
         fields = ['id', 'question', 'question_text', 'question_type',
                  'text_answer', 'number_answer', 'date_answer', 'boolean_answer',
-                 'json_answer', 'created_at']
+                 'json_answer', 'choice_index', 'choice_mask', 'created_at']
+        read_only_fields = ['choice_index', 'choice_mask']
     
     def validate(self, data):
         """Ensure the right answer field is used based on question type"""
@@ -73,10 +102,19 @@ class QuestionResponseSerializer(serializers.ModelSerializer):
         if question.is_required and len(provided_answers) == 0:
             raise serializers.ValidationError("This question is required")
         
+        # Store choice answers as option indexes, rejecting unknown values
+        if question_type in CHOICE_TYPES:
+            try:
+                data['choice_index'], data['choice_mask'] = normalize_choice(
+                    question, raw_choice_value(data)
+                )
+            except ValueError as e:
+                raise serializers.ValidationError(str(e))
+        
         return data
 
-class SurveyResponseSerializer(serializers.ModelSerializer):
-    answers = QuestionResponseSerializer(many=True, read_only=True)
+class SurveyResponseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    answers = QuestionResponseSerializer(many=True, read_only=True, source='get_answers')
     respondent = UserProfileSerializer(read_only=True)
     survey_title = serializers.CharField(source='survey.title', read_only=True)
     completion_time = serializers.ReadOnlyField()
@@ -85,8 +123,51 @@ class SurveyResponseSerializer(serializers.ModelSerializer):
         model = SurveyResponse
         fields = ['id', 'survey', 'survey_title', 'respondent', 'session_id',
                  'started_at', 'completed_at', 'is_complete', 'completion_time',
-                 'ip_address', 'user_agent', 'answers']
-        read_only_fields = ['started_at', 'ip_address', 'user_agent']
+                 'duration_seconds', 'ip_address', 'user_agent', 'answers']
+        read_only_fields = ['started_at', 'duration_seconds', 'ip_address', 'user_agent']
+        field_columns = {
+            'completion_time': ['duration_seconds', 'completed_at', 'started_at'],
+            'answers': ['packed_answers', 'started_at'],
+        }
+        field_prefetches = {'answers': ['answers__question']}
+
+class SurveyResponseListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Response list entries without answers"""
+    respondent = UserProfileSerializer(read_only=True)
+    survey_title = serializers.CharField(source='survey.title', read_only=True)
+    completion_time = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = SurveyResponse
+        fields = ['id', 'survey', 'survey_title', 'respondent', 'session_id',
+                 'started_at', 'completed_at', 'is_complete', 'completion_time',
+                 'duration_seconds', 'ip_address', 'user_agent']
+        read_only_fields = fields
+        field_columns = {
+            'completion_time': ['duration_seconds', 'completed_at', 'started_at'],
+        }
+        expandable_fields = {
+            'survey': (SurveyListSerializer, {'read_only': True}),
+        }
+
+class SurveyResponseAnswersListSerializer(SurveyResponseListSerializer):
+    """Response list entries with answers (``?include=answers``)"""
+    answers = serializers.SerializerMethodField()
+    
+    class Meta(SurveyResponseListSerializer.Meta):
+        fields = SurveyResponseListSerializer.Meta.fields + ['answers']
+        read_only_fields = fields
+        field_columns = {
+            **SurveyResponseListSerializer.Meta.field_columns,
+            'answers': ['survey', 'packed_answers', 'started_at'],
+        }
+        # Answers and the questions they belong to, one query each
+        field_prefetches = {'answers': ['answers', 'survey__questions']}
+    
+    def get_answers(self, obj):
+        # The view prefetches answers and survey__questions
+        questions = {question.id: question for question in obj.survey.questions.all()}
+        return QuestionResponseSerializer(obj.get_answers(questions), many=True).data
 
 class SurveyResponseCreateSerializer(serializers.ModelSerializer):
     answers = QuestionResponseSerializer(many=True, write_only=True)
@@ -107,17 +188,18 @@ class SurveyResponseCreateSerializer(serializers.ModelSerializer):
         validated_data['ip_address'] = self.get_client_ip(request)
         validated_data['user_agent'] = request.META.get('HTTP_USER_AGENT', '')
         
-        response = SurveyResponse.objects.create(**validated_data)
-        
-        # Create question responses
-        for answer_data in answers_data:
-            QuestionResponse.objects.create(survey_response=response, **answer_data)
+        # Packed surveys keep all answers on the response row
+        if is_packed(validated_data['survey']):
+            validated_data['packed_answers'] = pack_answers(answers_data)
         
         # Set completion time if complete
         if validated_data.get('is_complete'):
-            from django.utils import timezone
-            response.completed_at = timezone.now()
-            response.save()
+            validated_data['completed_at'] = timezone.now()
+        
+        response = SurveyResponse(**validated_data)
+        # Written with the answers, samples and live events, in a batch with
+        # other requests' submissions (see surveys.submissions)
+        [response] = save_submissions([(response, answers_data)])
         
         return response
     
@@ -130,7 +212,42 @@ class SurveyResponseCreateSerializer(serializers.ModelSerializer):
             ip = request.META.get('REMOTE_ADDR')
         return ip
 
-class SurveyInvitationSerializer(serializers.ModelSerializer):
+class PreloadedQuestionField(serializers.Field):
+    """Question id resolved against ``context['questions']``, without a query per answer"""
+    
+    def to_internal_value(self, data):
+        try:
+            return self.context['questions'][int(data)]
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(f'Invalid question "{data}".')
+    
+    def to_representation(self, value):
+        return value.pk
+
+class KioskAnswerSerializer(QuestionResponseSerializer):
+    question = PreloadedQuestionField()
+
+class KioskSubmissionSerializer(serializers.Serializer):
+    """A submission queued by an offline kiosk (see surveys.kiosk)"""
+    client_id = serializers.CharField(max_length=64)
+    survey = serializers.IntegerField()
+    answers = KioskAnswerSerializer(many=True)
+    is_complete = serializers.BooleanField(default=False)
+    started_at = serializers.DateTimeField(required=False)
+    completed_at = serializers.DateTimeField(required=False, allow_null=True)
+    
+    def validate(self, data):
+        survey = self.context['surveys'].get(data['survey'])
+        if survey is None:
+            raise serializers.ValidationError({'survey': 'Survey is not available to this kiosk.'})
+        if any(answer['question'].survey_id != survey.id for answer in data['answers']):
+            raise serializers.ValidationError({'answers': 'Answers must belong to questions of the survey.'})
+        if len({answer['question'].id for answer in data['answers']}) < len(data['answers']):
+            raise serializers.ValidationError({'answers': 'Each question can only be answered once.'})
+        data['survey'] = survey
+        return data
+
+class SurveyInvitationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     survey = SurveyListSerializer(read_only=True)
     recipient = UserProfileSerializer(read_only=True)
     invited_by = UserProfileSerializer(read_only=True)
@@ -152,6 +269,26 @@ class SurveyAnalyticsSerializer(serializers.Serializer):
     question_analytics = serializers.ListField()
     demographic_breakdown = serializers.DictField()
 
+class ReportJobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'survey', 'format', 'status', 'size', 'render_seconds', 'error',
+                 'created_at', 'finished_at', 'download_url']
+        read_only_fields = fields
+        field_columns = {'download_url': ['status']}
+        expandable_fields = {
+            'survey': (SurveyListSerializer, {'read_only': True}),
+        }
+    
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        url = reverse('report-download', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 class BulkQuestionSerializer(serializers.Serializer):
     """Serializer for bulk question operations"""
     questions = QuestionSerializer(many=True)
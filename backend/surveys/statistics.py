@@ -0,0 +1,220 @@
+"""
+Vectorized statistics for ``rating`` and ``number`` questions, plus the
+chi-square test used by crosstabs.
+
+Numeric answers for all questions of a survey are fetched in a single query
+and split into one NumPy array per question; every statistic below is then
+computed with array operations rather than Python loops.
+"""
+
+import itertools
+import math
+
+import numpy as np
+
+NUMERIC_TYPES = ['rating', 'number']
+
+# Used when a rating question has no configured range
+DEFAULT_RATING_RANGE = (1, 5)
+
+# Maximum number of histogram bins for ``number`` questions
+NUMBER_BINS = 10
+
+PERCENTILES = [10, 25, 50, 75, 90, 95, 99]
+
+# Two-sided 95% normal quantile
+Z_95 = 1.959964
+
+
+def numeric_arrays(questions, rows, packed_answers=None):
+    """Return {question_id: ndarray} of numeric answers for the given questions
+
+    ``rows`` is a QuestionResponse queryset; all questions are read with one
+    query. ``packed_answers`` maps question id to decoded packed answers.
+    """
+    question_ids = [question.id for question in questions]
+    arrays = {question_id: np.empty(0) for question_id in question_ids}
+    if not question_ids:
+        return arrays
+
+    pairs = rows.filter(
+        question_id__in=question_ids, number_answer__isnull=False
+    ).values_list('question_id', 'number_answer').order_by()
+    flat = np.fromiter(itertools.chain.from_iterable(pairs), dtype=float)
+    if flat.size:
+        flat = flat.reshape(-1, 2)
+        order = np.argsort(flat[:, 0], kind='stable')
+        ids, values = flat[order, 0].astype(np.int64), flat[order, 1]
+        unique_ids, starts = np.unique(ids, return_index=True)
+        for question_id, chunk in zip(unique_ids, np.split(values, starts[1:])):
+            arrays[int(question_id)] = chunk
+
+    for question_id, answers in (packed_answers or {}).items():
+        if question_id not in arrays:
+            continue
+        extra = np.fromiter(
+            (a.number_answer for a in answers if a.number_answer is not None), dtype=float
+        )
+        if extra.size:
+            arrays[question_id] = np.concatenate([arrays[question_id], extra])
+
+    return arrays
+
+
+def value_range(question, values):
+    """Return the (low, high) range configured on the question, falling back to the data"""
+    low, high = question.min_value, question.max_value
+    if question.type == 'rating':
+        low = DEFAULT_RATING_RANGE[0] if low is None else low
+        high = DEFAULT_RATING_RANGE[1] if high is None else high
+    elif values.size:
+        low = float(values.min()) if low is None else low
+        high = float(values.max()) if high is None else high
+    return low, high
+
+
+def histogram(question, values):
+    """Return an ordered {bin_label: count} dict using the question's configured range"""
+    low, high = value_range(question, values)
+    # No answers and no configured range, or a range configured upside down
+    if low is None or high is None or high < low:
+        return {}
+
+    if question.type == 'rating':
+        # One bin per scale point; out-of-range answers are not counted
+        low, high = int(low), int(high)
+        in_range = values[(values >= low) & (values <= high)]
+        counts = np.bincount(np.rint(in_range - low).astype(np.int64), minlength=high - low + 1)
+        return {str(low + i): int(count) for i, count in enumerate(counts)}
+
+    if high <= low:
+        return {f'{low:g}': int(values.size)}
+    counts, edges = np.histogram(values, bins=NUMBER_BINS, range=(low, high))
+    return {
+        f'{edges[i]:g}-{edges[i + 1]:g}': int(count)
+        for i, count in enumerate(counts)
+    }
+
+
+def nps_buckets(question, values):
+    """Detractor/passive/promoter buckets with the answers rescaled to 0-10
+
+    On a 0-10 scale this is the standard Net Promoter split (0-6, 7-8, 9-10);
+    other rating scales are mapped linearly onto 0-10 first.
+    """
+    low, high = value_range(question, values)
+    if not values.size or high <= low:
+        return None
+
+    scaled = (values - low) * 10.0 / (high - low)
+    detractors = int(np.count_nonzero(scaled < 7))
+    promoters = int(np.count_nonzero(scaled >= 9))
+    passives = int(values.size) - detractors - promoters
+    return {
+        'detractors': detractors,
+        'passives': passives,
+        'promoters': promoters,
+        'score': round((promoters - detractors) * 100.0 / values.size, 2),
+    }
+
+
+def describe(question, values):
+    """Return summary statistics for one question's numeric answers"""
+    count = int(values.size)
+    if not count:
+        return {'count': 0}
+
+    mean = float(values.mean())
+    std = float(values.std(ddof=1)) if count > 1 else 0.0
+    margin = Z_95 * std / np.sqrt(count) if count > 1 else 0.0
+    percentiles = np.percentile(values, PERCENTILES)
+
+    stats = {
+        'count': count,
+        'mean': round(mean, 4),
+        'median': round(float(np.median(values)), 4),
+        'std': round(std, 4),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': {f'p{p}': round(float(v), 4) for p, v in zip(PERCENTILES, percentiles)},
+        'confidence_interval_95': [round(mean - margin, 4), round(mean + margin, 4)],
+        'histogram': histogram(question, values),
+    }
+    if question.type == 'rating':
+        stats['nps'] = nps_buckets(question, values)
+    return stats
+
+
+def numeric_statistics(questions, rows, packed_answers=None):
+    """Return {question_id: statistics} for the rating and number questions given"""
+    questions = [question for question in questions if question.type in NUMERIC_TYPES]
+    arrays = numeric_arrays(questions, rows, packed_answers)
+    return {question.id: describe(question, arrays[question.id]) for question in questions}
+
+
+def chi2_sf(statistic, dof):
+    """Survival function of the chi-square distribution (the test's p-value)"""
+    if dof <= 0:
+        return None
+    if statistic <= 0:
+        return 1.0
+    return _upper_regularized_gamma(dof / 2.0, statistic / 2.0)
+
+
+def _upper_regularized_gamma(a, x):
+    # Series expansion below a + 1, Lentz continued fraction above
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1.0 / a
+        n = a
+        for _ in range(500):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 500):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+
+def contingency_statistics(observed):
+    """Chi-square test of independence and Cramer's V for a 2-D count matrix"""
+    empty = {'chi_square': None, 'dof': None, 'p_value': None, 'cramers_v': None}
+    observed = np.asarray(observed, dtype=float)
+    if observed.ndim != 2 or not observed.size:
+        return empty
+    # Empty rows/columns carry no information and would give zero expectations
+    observed = observed[observed.sum(axis=1) > 0][:, observed.sum(axis=0) > 0]
+    total = observed.sum()
+    rows, columns = observed.shape
+    if total == 0 or rows < 2 or columns < 2:
+        return empty
+
+    expected = np.outer(observed.sum(axis=1), observed.sum(axis=0)) / total
+    chi_square = float(((observed - expected) ** 2 / expected).sum())
+    dof = (rows - 1) * (columns - 1)
+    cramers_v = math.sqrt(chi_square / (total * (min(rows, columns) - 1)))
+    return {
+        'chi_square': round(chi_square, 4),
+        'dof': dof,
+        'p_value': chi2_sf(chi_square, dof),
+        'cramers_v': round(cramers_v, 4),
+    }
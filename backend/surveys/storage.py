@@ -0,0 +1,137 @@
+"""
+Answer storage layouts.
+
+Surveys store answers either as one ``QuestionResponse`` row per answer
+(``rows``) or packed into ``SurveyResponse.packed_answers`` (``packed``).
+The packed layout is a compact JSON object keyed by question id, where each
+value is a ``[field_code, value]`` pair naming the typed answer field::
+
+    {"12": ["n", 4.0], "13": ["t", "Mild pain"], "14": ["j", ["a", "b"]]}
+
+Everything that reads answers should go through ``response_answers`` or
+``survey_answers`` so both layouts (and surveys mid-migration) work.
+"""
+
+from datetime import date
+
+from .models import QuestionResponse, SurveyResponse
+
+FIELD_CODES = {
+    'text_answer': 't',
+    'number_answer': 'n',
+    'date_answer': 'd',
+    'boolean_answer': 'b',
+    'json_answer': 'j',
+}
+CODE_FIELDS = {code: field for field, code in FIELD_CODES.items()}
+
+
+def _answer_value(answer, field):
+    if isinstance(answer, dict):
+        return answer.get(field)
+    return getattr(answer, field)
+
+
+def pack_answer(answer):
+    """Encode a single answer (validated dict or QuestionResponse) as a packed entry"""
+    # Same precedence as QuestionResponse.get_answer()
+    for field, code in FIELD_CODES.items():
+        value = _answer_value(answer, field)
+        if field == 'text_answer':
+            if value:
+                return [code, value]
+        elif value is not None:
+            if field == 'date_answer':
+                value = value.isoformat()
+            return [code, value]
+    return None
+
+
+def pack_answers(answers):
+    """Encode a list of answers as a packed dict keyed by question id"""
+    packed = {}
+    for answer in answers:
+        if isinstance(answer, dict):
+            question_id = answer['question'].id
+        else:
+            question_id = answer.question_id
+        packed[str(question_id)] = pack_answer(answer)
+    return packed
+
+
+def unpack_answers(survey_response, packed, questions=None):
+    """Decode packed answers into unsaved QuestionResponse instances
+
+    ``questions`` may be a dict of question id to Question; when given, the
+    question is attached to each answer and the answers follow question order.
+    """
+    answers = []
+    for key, entry in packed.items():
+        question_id = int(key)
+        answer = QuestionResponse(
+            survey_response_id=survey_response.id if survey_response else None,
+            question_id=question_id,
+            created_at=survey_response.started_at if survey_response else None,
+        )
+        if entry:
+            code, value = entry
+            field = CODE_FIELDS[code]
+            if field == 'date_answer':
+                value = date.fromisoformat(value)
+            setattr(answer, field, value)
+        if questions is not None:
+            question = questions.get(question_id)
+            if question is None:
+                continue
+            answer.question = question
+        answers.append(answer)
+
+    if questions is not None:
+        answers.sort(key=lambda a: (a.question.order, a.question_id))
+    return answers
+
+
+def response_answers(survey_response, questions=None):
+    """Return the answers of a single response for either layout
+
+    With ``questions`` (a dict of question id to Question), row answers get
+    their question attached and follow question order, like packed answers,
+    so serializing them needs no further queries.
+    """
+    if survey_response.packed_answers is not None:
+        return unpack_answers(survey_response, survey_response.packed_answers, questions)
+    answers = list(survey_response.answers.all())
+    if questions is not None:
+        answers = [answer for answer in answers if answer.question_id in questions]
+        for answer in answers:
+            answer.question = questions[answer.question_id]
+        answers.sort(key=lambda a: (a.question.order, a.question_id))
+    return answers
+
+
+def row_answers(survey):
+    """Return a queryset over the row-layout answers of a survey"""
+    return QuestionResponse.objects.filter(survey_response__survey=survey)
+
+
+def packed_survey_answers(survey, chunk_size=2000):
+    """Iterate over the decoded answers of a survey's packed responses"""
+    packed = SurveyResponse.objects.filter(
+        survey=survey, packed_answers__isnull=False
+    ).only('id', 'started_at', 'packed_answers')
+    for survey_response in packed.iterator(chunk_size=chunk_size):
+        yield from unpack_answers(survey_response, survey_response.packed_answers)
+
+
+def survey_answers(survey, chunk_size=2000):
+    """Iterate over every answer to a survey for either layout
+
+    Row-layout answers are yielded as stored; packed answers are decoded into
+    unsaved QuestionResponse instances with ``survey_response_id`` set.
+    """
+    yield from row_answers(survey).iterator(chunk_size=chunk_size)
+    yield from packed_survey_answers(survey, chunk_size)
+
+
+def is_packed(survey):
+    return survey.answer_storage == 'packed'
@@ -0,0 +1,162 @@
+"""
+Single-writer pipeline for response submissions.
+
+Each submission writes a response, its answers and the analytics sketches.
+As separate autocommit statements, that makes dozens of write transactions.
+On SQLite, concurrent request threads then queue on the database's single
+write lock, and some of them time out with "database is locked".
+
+With ``SUBMISSION_WRITER_ENABLED``, request threads validate their
+submissions and hand them to one writer thread per process. The writer
+takes everything queued while it was busy (up to ``SUBMISSION_BATCH_SIZE``
+responses) and writes it in one transaction with bulk inserts, so the
+number of write transactions grows with the number of batches rather than
+the number of submissions. The request thread waits for its batch to commit
+and answers as before. A submission still queued after
+``SUBMISSION_WRITE_TIMEOUT`` seconds is withdrawn and its request gets a
+503: nothing was saved, so the client can send it again.
+
+When a batch fails, each of its jobs is written again on its own, so one bad
+submission only fails its own request. Callers inside a transaction write
+directly on their own connection: the writer could not see their
+uncommitted rows, and on SQLite it would wait on their write lock.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from healthcare_survey.routers import pin_to_primary
+
+from .events import publish_submission
+from .models import QuestionResponse, SurveyResponse
+from .sampling import record_submissions
+from .text_analytics import TEXT_TYPES, schedule_text_update
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class SubmissionTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The submission was not saved in time; please send it again.'
+
+
+def write_submissions(pairs):
+    """Store (unsaved response, answers) pairs in one transaction; returns the responses"""
+    with transaction.atomic():
+        responses = SurveyResponse.objects.bulk_create(
+            SurveyResponse.prepare_for_bulk(survey_response for survey_response, _ in pairs)
+        )
+        answers = [
+            QuestionResponse(survey_response=survey_response, created_at=survey_response.started_at, **answer)
+            for survey_response, pair_answers in pairs if survey_response.packed_answers is None
+            for answer in pair_answers
+        ]
+        QuestionResponse.objects.bulk_create(answers, batch_size=1000)
+        # Keep the samples behind ?mode=approx analytics current
+        record_submissions(pairs)
+        # Push the new responses to live analytics/dashboard streams
+        for survey_response, pair_answers in pairs:
+            publish_submission(survey_response, pair_answers)
+        # Count new text answers once the responses are committed
+        text_surveys = {
+            survey_response.survey_id for survey_response, pair_answers in pairs
+            if any(answer['question'].type in TEXT_TYPES for answer in pair_answers)
+        }
+        for survey_id in sorted(text_surveys):
+            transaction.on_commit(lambda survey_id=survey_id: schedule_text_update(survey_id))
+    return responses
+
+
+class SubmissionWriter:
+    """Thread writing queued submissions in batches (see module docstring)"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.jobs = queue.SimpleQueue()
+        self.pid = os.getpid()
+        # Totals since the writer started
+        self.batches = 0
+        self.written = 0
+        self.thread = threading.Thread(target=self.run, name='submission-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, pairs):
+        future = Future()
+        self.jobs.put((pairs, future))
+        return future
+
+    def run(self):
+        while True:
+            jobs = [self.jobs.get()]
+            count = len(jobs[0][0])
+            # Whatever queued up during the previous batch joins this one
+            while count < self.batch_size:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                count += len(job[0])
+            self.write(jobs)
+
+    def write(self, jobs):
+        # Jobs whose request gave up waiting are dropped; the others can no
+        # longer be cancelled, so their requests wait for them
+        jobs = [(pairs, future) for pairs, future in jobs if future.set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        # The thread outlives requests, so apply CONN_MAX_AGE and drop broken connections here
+        close_old_connections()
+        try:
+            responses = write_submissions([pair for pairs, _ in jobs for pair in pairs])
+        except Exception:
+            for pairs, future in jobs:
+                for survey_response, _ in pairs:
+                    survey_response.pk = None
+                try:
+                    future.set_result(write_submissions(pairs))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.written += len(responses)
+        start = 0
+        for pairs, future in jobs:
+            future.set_result(responses[start:start + len(pairs)])
+            start += len(pairs)
+
+
+def submission_writer():
+    """This process's writer, created on first use (and again after a fork)"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid() or not _writer.thread.is_alive():
+            _writer = SubmissionWriter(settings.SUBMISSION_BATCH_SIZE)
+        return _writer
+
+
+def save_submissions(pairs):
+    """Store (unsaved response, answers) pairs; returns the saved responses"""
+    if not pairs:
+        return []
+    # The request's later reads must see the new rows (see healthcare_survey.routers)
+    pin_to_primary()
+    if not settings.SUBMISSION_WRITER_ENABLED or connection.in_atomic_block:
+        return write_submissions(pairs)
+    future = submission_writer().submit(pairs)
+    try:
+        return future.result(timeout=settings.SUBMISSION_WRITE_TIMEOUT)
+    except TimeoutError:
+        # Still queued: withdraw it, so a 503 means nothing was saved. Once
+        # the writer has started on it, wait for the outcome instead
+        if future.cancel():
+            raise SubmissionTimeout()
+        return future.result()
@@ -0,0 +1,86 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+
+from . import submissions
+from .management.commands._synthetic import create_survey
+from .models import QuestionResponse, SurveyResponse
+from .submissions import SubmissionTimeout, save_submissions
+
+User = get_user_model()
+
+
+@override_settings(SUBMISSION_WRITER_ENABLED=True)
+class SubmissionWriterTests(TransactionTestCase):
+    """save_submissions through the writer thread, which commits on its own connection"""
+
+    def setUp(self):
+        user = User.objects.create(username='author', role='admin')
+        # A rating and a radio question: no text answers, so no background text analytics writes
+        self.survey = create_survey(user, questions=2)
+        self.rating, self.radio = self.survey.questions.order_by('order')
+
+    def submission(self, session_id):
+        response = SurveyResponse(survey=self.survey, session_id=session_id, is_complete=True)
+        answers = [
+            {'question': self.rating, 'number_answer': 4},
+            {'question': self.radio, 'text_answer': 'Often', 'choice_index': 3},
+        ]
+        return response, answers
+
+    def saved_sessions(self):
+        return set(SurveyResponse.objects.filter(survey=self.survey).values_list('session_id', flat=True))
+
+    def test_concurrent_submissions_are_all_saved(self):
+        errors = []
+
+        def submit(thread):
+            try:
+                for i in range(25):
+                    save_submissions([self.submission(f'{thread}-{i}')])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=submit, args=(thread,)) for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # "database is locked" (or any other write failure) reaches the submitting thread
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.saved_sessions()), 200)
+        self.assertEqual(QuestionResponse.objects.filter(survey_response__survey=self.survey).count(), 400)
+
+    @override_settings(SUBMISSION_WRITE_TIMEOUT=0.5)
+    def test_timeout_withdraws_queued_submission(self):
+        write_submissions = submissions.write_submissions
+        writing, release = threading.Event(), threading.Event()
+
+        def slow_write(pairs):
+            writing.set()
+            release.wait(10)
+            return write_submissions(pairs)
+
+        running = []
+        submissions.submission_writer()
+        with mock.patch('surveys.submissions.write_submissions', slow_write):
+            first = threading.Thread(target=lambda: running.extend(save_submissions([self.submission('running')])))
+            first.start()
+            self.assertTrue(writing.wait(10))
+            # Queued behind a batch that outlasts the timeout: cancelled, not saved
+            with self.assertRaises(SubmissionTimeout):
+                save_submissions([self.submission('queued')])
+            release.set()
+            first.join()
+            # Written after the writer has dropped the cancelled job
+            save_submissions([self.submission('later')])
+
+        # The running batch also outlasted the timeout, and its caller waited for it
+        self.assertEqual([response.session_id for response in running], ['running'])
+        self.assertEqual(self.saved_sessions(), {'running', 'later'})
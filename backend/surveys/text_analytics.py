@@ -0,0 +1,357 @@
+"""
+Term and bigram frequencies of free-text answers.
+
+Answers to ``text`` and ``textarea`` questions are tokenized in chunks of
+responses, optionally on a process pool, and added to ``TextTermCount``
+tables. Each table row counts the answers in one week that mention a term,
+so top terms and their weekly trend are plain aggregates. Bigrams of
+adjacent terms are far more numerous and are only counted over all time.
+Counting is per answer: a term repeated within one answer counts once. Rows
+keep the ids of a few responses as examples; their text is read when the
+top terms are requested.
+
+``TextAnalyticsState.last_response_id`` marks the responses already counted.
+Updates only read the responses after it, and each chunk commits its counts
+together with the new mark, so an interrupted update resumes where it
+stopped. Answers edited after they were counted are only picked up by a
+rebuild.
+
+Submissions with text answers schedule an update on a background thread
+once they commit, so reads never write. A backlog larger than
+``TEXT_ANALYTICS_BACKGROUND_LIMIT`` responses (after an import, say) is
+left to the ``update_text_analytics`` command and its process pool.
+"""
+
+import json
+import logging
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Max, Q, Sum
+
+from .demographics import min_cell_size
+from .models import QuestionResponse, Survey, SurveyResponse, TextAnalyticsState, TextTermCount
+from .storage import FIELD_CODES, row_answers
+
+TEXT_TYPES = ['text', 'textarea']
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9']*[a-z0-9]")
+MAX_TERM_LENGTH = 40
+EXAMPLES = 3
+EXAMPLE_LENGTH = 200
+# Week under which all-time counts (bigrams) are stored
+ALL_TIME = date.min
+
+logger = logging.getLogger(__name__)
+
+_update_executor = None
+# Surveys with a background update queued but not started
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each else even ever every few for from
+further get got had has have having he her here hers herself him himself his how however i if in into
+is it its itself just let me more most much must my myself no nor not now of off on once only or other
+our ours ourselves out over own really same she should so some such than that the their theirs them
+themselves then there these they this those through to too under until up upon us very was we were
+what when where which while who whom why will with would yet you your yours yourself yourselves
+dont didnt doesnt isnt wasnt cant couldnt wont im ive id thats theres
+""".split())
+
+
+def week_start(day):
+    """Monday of the week containing ``day``"""
+    return day - timedelta(days=day.weekday())
+
+
+def tokenize(text):
+    """Return (terms, bigrams) mentioned in a text, each as a set"""
+    terms, bigrams = set(), set()
+    previous = None
+    for token in TOKEN_RE.findall(text.lower()):
+        if token.endswith("'s"):
+            token = token[:-2]
+        token = token.replace("'", '')
+        if token in STOPWORDS or len(token) < 3 or len(token) > MAX_TERM_LENGTH:
+            previous = None
+            continue
+        terms.add(token)
+        # Bigrams only join terms that are adjacent in the text
+        if previous is not None:
+            bigrams.add(f'{previous} {token}')
+        previous = token
+    return terms, bigrams
+
+
+def count_chunk(rows):
+    """Count [(question id, week, response id, text)] into [(question id, kind, term, week, count, examples)]
+
+    Runs in pool workers, so it only uses plain Python values.
+    """
+    all_time = ALL_TIME.isoformat()
+    counts = {}
+    for question_id, week, response_id, text in rows:
+        terms, bigrams = tokenize(text)
+        keys = [(question_id, 'answers', '', week)]
+        keys += [(question_id, 'term', term, week) for term in terms]
+        keys += [(question_id, 'bigram', bigram, all_time) for bigram in bigrams]
+        for key in keys:
+            entry = counts.get(key)
+            if entry is None:
+                counts[key] = entry = [0, []]
+            entry[0] += 1
+            if len(entry[1]) < EXAMPLES and key[1] != 'answers':
+                entry[1].append(response_id)
+    return [(*key, count, examples) for key, (count, examples) in counts.items()]
+
+
+def chunk_rows(survey, question_ids, after_id, through_id):
+    """[(question id, week, response id, text)] of the text answers in a range of response ids"""
+    rows = []
+    answers = row_answers(survey).filter(
+        question_id__in=question_ids,
+        survey_response_id__gt=after_id,
+        survey_response_id__lte=through_id,
+    ).exclude(text_answer='')
+    for question_id, response_id, started_at, text in answers.values_list(
+        'question_id', 'survey_response_id', 'survey_response__started_at', 'text_answer'
+    ):
+        rows.append((question_id, week_start(started_at.date()).isoformat(), response_id, text))
+
+    keys = {str(question_id): question_id for question_id in question_ids}
+    packed = survey.responses.filter(
+        id__gt=after_id, id__lte=through_id, packed_answers__isnull=False
+    ).values_list('id', 'started_at', 'packed_answers')
+    for response_id, started_at, answers in packed:
+        week = week_start(started_at.date()).isoformat()
+        for key, entry in answers.items():
+            if key in keys and entry and entry[0] == FIELD_CODES['text_answer']:
+                rows.append((keys[key], week, response_id, entry[1]))
+    return rows
+
+
+def response_chunks(survey, question_ids, after_id, through_id, chunk_size):
+    """Yield (after id, through id, responses, rows) for consecutive chunks of responses"""
+    responses = survey.responses.filter(id__lte=through_id).order_by('id').values_list('id', flat=True)
+    while after_id < through_id:
+        ids = list(responses.filter(id__gt=after_id)[:chunk_size])
+        if not ids:
+            break
+        yield after_id, ids[-1], len(ids), chunk_rows(survey, question_ids, after_id, ids[-1])
+        after_id = ids[-1]
+
+
+def merge_counts(counts):
+    """Add counted rows to the term tables; examples are kept from the first batch"""
+    if not counts:
+        return
+    quote = connection.ops.quote_name
+    table = quote(TextTermCount._meta.db_table)
+    count = quote('count')
+    # Increments need an upsert; bulk_create(update_conflicts=True) can only overwrite
+    sql = (
+        f"INSERT INTO {table} (question_id, kind, term, week, {count}, examples) "
+        f"VALUES (%s, %s, %s, %s, %s, %s) "
+        f"ON CONFLICT (question_id, kind, term, week) "
+        f"DO UPDATE SET {count} = {table}.{count} + excluded.{count}"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (question_id, kind, term, week, number, json.dumps(examples))
+            for question_id, kind, term, week, number, examples in counts
+        ])
+
+
+def commit_chunk(survey, after_id, through_id, counts):
+    """Store one chunk's counts and advance the survey's mark; False if another update got there first"""
+    answers = sum(row[4] for row in counts if row[1] == 'answers')
+    with transaction.atomic():
+        # The conditional update is the claim: concurrent updaters of the
+        # same range find the mark moved and drop their counts
+        claimed = TextAnalyticsState.objects.filter(survey=survey, last_response_id=after_id).update(
+            last_response_id=through_id, answers=F('answers') + answers
+        )
+        if not claimed:
+            return False
+        merge_counts(counts)
+    return True
+
+
+def update_text_analytics(survey, executor=None, workers=1, chunk_size=2000):
+    """Count the text answers of responses submitted since the last update
+
+    Chunks are counted on ``executor`` (a pool of ``workers``) when given,
+    with at most two chunks per worker in flight so memory stays bounded.
+    Returns the number of responses processed.
+    """
+    question_ids = list(survey.questions.filter(type__in=TEXT_TYPES).values_list('id', flat=True))
+    state, _ = TextAnalyticsState.objects.get_or_create(survey=survey)
+    after_id = state.last_response_id
+    # Responses submitted while updating are left for the next update
+    through_id = survey.responses.aggregate(last=Max('id'))['last'] or 0
+    if through_id <= after_id:
+        return 0
+    if not question_ids:
+        TextAnalyticsState.objects.filter(survey=survey, last_response_id=after_id).update(
+            last_response_id=through_id
+        )
+        return 0
+
+    processed = 0
+    chunks = response_chunks(survey, question_ids, after_id, through_id, chunk_size)
+    if executor is None:
+        results = ((low, high, size, count_chunk(rows)) for low, high, size, rows in chunks)
+    else:
+        results = pooled_counts(executor, chunks, 2 * workers)
+    for low, high, size, counts in results:
+        if not commit_chunk(survey, low, high, counts):
+            break
+        processed += size
+    return processed
+
+
+def update_executor():
+    """Single thread for background updates, created on first use"""
+    global _update_executor
+    if _update_executor is None:
+        _update_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='text-analytics')
+    return _update_executor
+
+
+def schedule_text_update(survey_id):
+    """Queue a background update of a survey, unless one is already queued"""
+    with _scheduled_lock:
+        if survey_id in _scheduled:
+            return
+        _scheduled.add(survey_id)
+    update_executor().submit(run_text_update, survey_id)
+
+
+def run_text_update(survey_id):
+    with _scheduled_lock:
+        _scheduled.discard(survey_id)
+    # The thread outlives requests, so apply CONN_MAX_AGE and drop broken connections here
+    close_old_connections()
+    try:
+        survey = Survey.objects.get(id=survey_id)
+        if pending_responses(survey) <= settings.TEXT_ANALYTICS_BACKGROUND_LIMIT:
+            update_text_analytics(survey)
+    except Exception:
+        logger.exception('Background text analytics update of survey %s failed', survey_id)
+
+
+def pooled_counts(executor, chunks, max_pending):
+    """count_chunk on a pool, yielding results in chunk order"""
+    pending = deque()
+    for low, high, size, rows in chunks:
+        pending.append((low, high, size, executor.submit(count_chunk, rows)))
+        if len(pending) >= max_pending:
+            low, high, size, future = pending.popleft()
+            yield low, high, size, future.result()
+    while pending:
+        low, high, size, future = pending.popleft()
+        yield low, high, size, future.result()
+
+
+def reset_text_analytics(survey):
+    """Drop a survey's term tables so the next update recounts every answer"""
+    with transaction.atomic():
+        TextTermCount.objects.filter(question__survey=survey).delete()
+        TextAnalyticsState.objects.filter(survey=survey).update(last_response_id=0, answers=0)
+
+
+def pending_responses(survey):
+    """Responses after the survey's mark with a text answer still to count
+
+    Responses without text answers are skipped by the next update anyway,
+    so they are not reported as a backlog.
+    """
+    state = TextAnalyticsState.objects.filter(survey=survey).first()
+    question_ids = list(survey.questions.filter(type__in=TEXT_TYPES).values_list('id', flat=True))
+    if not question_ids:
+        return 0
+    after_id = state.last_response_id if state else 0
+    with_rows = row_answers(survey).filter(
+        question_id__in=question_ids, survey_response_id__gt=after_id
+    ).exclude(text_answer='').values('survey_response_id')
+    return survey.responses.filter(id__gt=after_id).filter(
+        Q(id__in=with_rows) | Q(packed_answers__has_any_keys=[str(question_id) for question_id in question_ids])
+    ).count()
+
+
+def example_texts(question, response_ids):
+    """{response id: text answer} of a question, for either layout"""
+    texts = dict(QuestionResponse.objects.filter(
+        question=question, survey_response_id__in=response_ids
+    ).values_list('survey_response_id', 'text_answer'))
+    key = str(question.id)
+    for response_id, answers in SurveyResponse.objects.filter(
+        id__in=response_ids, packed_answers__isnull=False
+    ).values_list('id', 'packed_answers'):
+        entry = answers.get(key)
+        if entry and entry[0] == FIELD_CODES['text_answer']:
+            texts[response_id] = entry[1]
+    return {response_id: text[:EXAMPLE_LENGTH] for response_id, text in texts.items() if text}
+
+
+def top_terms(question, kind, limit, k):
+    """[{term, count, example response ids}] of the most mentioned terms, hiding those below ``k`` answers"""
+    rows = TextTermCount.objects.filter(question=question, kind=kind)
+    if kind == 'bigram':
+        # One all-time row per bigram, read in count order from the index
+        top = list(rows.filter(count__gte=k).order_by('-count', 'term').values('term', total=F('count'))[:limit])
+    else:
+        top = list(
+            rows.values('term').annotate(total=Sum('count')).filter(total__gte=k).order_by('-total', 'term')[:limit]
+        )
+    examples = {}
+    for term, week_examples in rows.filter(term__in=[row['term'] for row in top]).order_by('-week').values_list(
+        'term', 'examples'
+    ):
+        chosen = examples.setdefault(term, [])
+        chosen.extend(example for example in week_examples if example not in chosen)
+    return [
+        {'term': row['term'], 'count': row['total'], 'examples': examples.get(row['term'], [])[:EXAMPLES]}
+        for row in top
+    ]
+
+
+def text_analytics(survey, questions, limit=20, weeks=12, k=None):
+    """Top terms, bigrams and weekly trend of the given text questions"""
+    k = min_cell_size(k)
+    results = []
+    for question in questions:
+        answers = TextTermCount.objects.filter(question=question, kind='answers')
+        total = answers.aggregate(total=Sum('count'))['total'] or 0
+        terms = top_terms(question, 'term', limit, k)
+        bigrams = top_terms(question, 'bigram', limit, k)
+        texts = example_texts(question, {i for term in terms + bigrams for i in term['examples']})
+        for term in terms + bigrams:
+            term['share'] = round(term['count'] / total * 100, 2) if total else 0
+            # Identical answers are shown once
+            term['examples'] = list(dict.fromkeys(texts[i] for i in term['examples'] if i in texts))
+
+        weekly = dict(answers.order_by('-week').values_list('week', 'count')[:weeks])
+        trend = {week: {'week': week, 'answers': count, 'terms': {}} for week, count in sorted(weekly.items())}
+        for term, week, count in TextTermCount.objects.filter(
+            question=question, kind='term', week__in=list(weekly), term__in=[term['term'] for term in terms]
+        ).values_list('term', 'week', 'count'):
+            trend[week]['terms'][term] = count
+
+        results.append({
+            'question_id': question.id,
+            'question_text': question.text,
+            'question_type': question.type,
+            'answers': total,
+            'terms': terms,
+            'bigrams': bigrams,
+            'weekly': list(trend.values()),
+        })
+    return {'min_cell_size': k, 'questions': results}
@@ -0,0 +1,163 @@
+"""
+Time-series analytics for survey responses.
+
+Starts and completions are bucketed in the database with ``Trunc*`` functions
+in the requested time zone, both in a single ``UNION ALL`` query, and the
+empty buckets are filled in here.
+"""
+
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db.models import Count, IntegerField, Q, Value
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+TRUNC_FUNCTIONS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Range used when ``from`` is omitted
+DEFAULT_SPANS = {
+    'hour': timedelta(hours=48),
+    'day': timedelta(days=30),
+    'week': timedelta(weeks=26),
+    'month': timedelta(days=365),
+}
+
+MAX_BUCKETS = 5000
+
+
+class TimeSeriesError(ValueError):
+    pass
+
+
+def parse_timezone(name):
+    if not name:
+        return ZoneInfo('UTC')
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise TimeSeriesError(f"Unknown time zone '{name}'")
+
+
+def parse_bound(value, tz, end=False):
+    """Parse an ISO date or datetime; bare dates cover the whole local day"""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        parsed = None if day else parse_datetime(value)
+    except ValueError:
+        day = parsed = None
+    if day is not None:
+        if end:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+    elif parsed is None:
+        raise TimeSeriesError(f"Invalid date '{value}'")
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed
+
+
+def bucket_start(moment, granularity, tz):
+    """Truncate an aware datetime to the start of its bucket, as naive local time"""
+    local = moment if timezone.is_naive(moment) else moment.astimezone(tz).replace(tzinfo=None)
+    if granularity == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    local = datetime.combine(local.date(), time.min)
+    if granularity == 'week':
+        return local - timedelta(days=local.weekday())
+    if granularity == 'month':
+        return local.replace(day=1)
+    return local
+
+
+def next_bucket(bucket, granularity):
+    if granularity == 'hour':
+        return bucket + timedelta(hours=1)
+    if granularity == 'day':
+        return bucket + timedelta(days=1)
+    if granularity == 'week':
+        return bucket + timedelta(weeks=1)
+    if bucket.month == 12:
+        return bucket.replace(year=bucket.year + 1, month=1)
+    return bucket.replace(month=bucket.month + 1)
+
+
+def bucket_keys(start, end, granularity, tz):
+    """Return the naive local bucket starts covering [start, end)"""
+    keys = []
+    bucket = bucket_start(start, granularity, tz)
+    last = bucket_start(end - timedelta(microseconds=1), granularity, tz)
+    while bucket <= last:
+        keys.append(bucket)
+        if len(keys) > MAX_BUCKETS:
+            raise TimeSeriesError(
+                f"Range too large: more than {MAX_BUCKETS} {granularity} buckets"
+            )
+        bucket = next_bucket(bucket, granularity)
+    return keys
+
+
+def response_timeseries(responses, start, end, granularity='day', tz=None):
+    """Bucket started and completed responses between ``start`` and ``end``
+
+    Returns a list of dicts with the bucket start (local time), the number of
+    responses started and completed in it, and the completion rate of the
+    responses started in that bucket.
+    """
+    if granularity not in TRUNC_FUNCTIONS:
+        raise TimeSeriesError(
+            f"granularity must be one of: {', '.join(TRUNC_FUNCTIONS)}"
+        )
+    if end <= start:
+        raise TimeSeriesError("'to' must be after 'from'")
+    tz = tz or ZoneInfo('UTC')
+    keys = bucket_keys(start, end, granularity, tz)
+    trunc = TRUNC_FUNCTIONS[granularity]
+    zero = Value(0, output_field=IntegerField())
+
+    started = (
+        responses.filter(started_at__gte=start, started_at__lt=end)
+        .annotate(bucket=trunc('started_at', tzinfo=tz))
+        .values('bucket')
+        .annotate(
+            started=Count('id'),
+            started_completed=Count('id', filter=Q(is_complete=True)),
+            completed=zero,
+        )
+        .order_by()
+    )
+    completed = (
+        responses.filter(completed_at__gte=start, completed_at__lt=end)
+        .annotate(bucket=trunc('completed_at', tzinfo=tz))
+        .values('bucket')
+        .annotate(started=zero, started_completed=zero, completed=Count('id'))
+        .order_by()
+    )
+
+    series = {key: {'started': 0, 'started_completed': 0, 'completed': 0} for key in keys}
+    for row in started.union(completed, all=True):
+        key = bucket_start(row['bucket'], granularity, tz)
+        counts = series.setdefault(key, {'started': 0, 'started_completed': 0, 'completed': 0})
+        counts['started'] += row['started']
+        counts['started_completed'] += row['started_completed']
+        counts['completed'] += row['completed']
+
+    return [
+        {
+            'bucket': key.isoformat(),
+            'started': counts['started'],
+            'completed': counts['completed'],
+            'completion_rate': round(
+                counts['started_completed'] / counts['started'] * 100, 2
+            ) if counts['started'] else 0,
+        }
+        for key, counts in sorted(series.items())
+    ]
@@ -7,6 +7,14 @@ urlpatterns = [
     path('<int:pk>/', views.SurveyDetailView.as_view(), name='survey-detail'),
     path('<int:survey_id>/duplicate/', views.duplicate_survey, name='duplicate-survey'),
     path('<int:survey_id>/analytics/', views.survey_analytics, name='survey-analytics'),
+    path('<int:survey_id>/analytics/timeseries/', views.survey_timeseries, name='survey-timeseries'),
+    path('<int:survey_id>/analytics/crosstab/', views.survey_crosstab, name='survey-crosstab'),
+    path('<int:survey_id>/analytics/funnel/', views.survey_funnel_analytics, name='survey-funnel'),
+    path('<int:survey_id>/analytics/demographics/', views.survey_demographics, name='survey-demographics'),
+    path('<int:survey_id>/analytics/text/', views.survey_text_analytics, name='survey-text-analytics'),
+    path('<int:survey_id>/reports/', views.survey_report, name='survey-report'),
+    path('reports/<int:job_id>/', views.report_job_status, name='report-job-status'),
+    path('reports/<int:job_id>/download/', views.report_download, name='report-download'),
     
     # Question management
     path('<int:survey_id>/questions/', views.QuestionListCreateView.as_view(), name='question-list-create'),
@@ -20,4 +28,10 @@ urlpatterns = [
     
     # Dashboard
     path('dashboard/stats/', views.dashboard_stats, name='dashboard-stats'),
+    path('analytics/durations/', views.duration_analytics, name='duration-analytics'),
+    path('analytics/compare/', views.survey_comparison, name='survey-comparison'),
+    
+    # Offline kiosks
+    path('kiosk/bundle/', views.kiosk_bundle, name='kiosk-bundle'),
+    path('kiosk/sync/', views.kiosk_sync, name='kiosk-sync'),
 ]
\ No newline at end of file
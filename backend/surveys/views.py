@@ -1,23 +1,132 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import Q, Count, Avg
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
+from django.http import FileResponse
+from django.views.decorators.gzip import gzip_page
+from django.conf import settings
 from datetime import datetime, timedelta
 import uuid
 
+from healthcare_survey.routers import replica_reads
+from users.fieldsets import SparseQuerysetMixin
 from .models import Survey, Question, SurveyResponse, QuestionResponse, SurveyInvitation
 from .serializers import (
     SurveySerializer, SurveyListSerializer, QuestionSerializer,
     SurveyResponseSerializer, SurveyResponseCreateSerializer,
     QuestionResponseSerializer, SurveyInvitationSerializer,
-    SurveyAnalyticsSerializer, BulkQuestionSerializer
+    SurveyAnalyticsSerializer, BulkQuestionSerializer, ReportJobSerializer,
+    SurveyResponseListSerializer, SurveyResponseAnswersListSerializer
+)
+from .analytics import ANALYTICS_MODES, analytics_for_mode
+from .comparison import ComparisonError, compare_surveys, parse_mapping, parse_survey_ids
+from .crosstab import CrosstabError, crosstab, resolve_axis
+from .demographics import demographic_breakdowns, min_cell_size, parse_groupings
+from .durations import PERCENTILES, band_percentiles, duration_percentiles
+from .events import publish_completion
+from .funnel import survey_funnel
+from .kiosk import build_bundle, kiosk_surveys, sync_submissions
+from .models import ReportJob
+from .reports import REPORT_FORMATS, artifact_path, report_filename, request_report
+from .sampling import record_response_update
+from .text_analytics import TEXT_TYPES, pending_responses, text_analytics
+from .timeseries import (
+    DEFAULT_SPANS, TimeSeriesError, parse_bound, parse_timezone, response_timeseries
 )
 
-class SurveyListCreateView(generics.ListCreateAPIView):
+def visible_surveys(user, params):
+    """Surveys a user may list, narrowed by the status/category/search query params"""
+    queryset = Survey.objects.all()
+    
+    # Filter based on user role
+    if user.role == 'patient':
+        # Filter surveys available to patients
+        queryset = queryset.filter(
+            Q(status='active') & 
+            (Q(invitations__recipient=user) | Q(target_roles__contains=['patient']))
+        ).distinct()
+    elif user.role in ['healthcare_provider', 'researcher']:
+        # Filter surveys for healthcare providers and researchers
+        queryset = queryset.filter(
+            Q(created_by=user) | 
+            Q(target_roles__contains=[user.role]) |
+            Q(status='active')
+        ).distinct()
+    # Admins can see all surveys
+    
+    # Apply filters (rest remains the same)
+    status_filter = params.get('status')
+    category_filter = params.get('category')
+    search = params.get('search')
+    
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    if category_filter:
+        queryset = queryset.filter(category=category_filter)
+    if search:
+        queryset = queryset.filter(
+            Q(title__icontains=search) | Q(description__icontains=search)
+        )
+    
+    return queryset
+
+def can_view_survey(user, survey):
+    if user.role in ['admin'] or survey.created_by_id == user.id:
+        return True
+    # Check if user has access to view this survey
+    return survey.status == 'active' and (
+        user.role in survey.target_roles or
+        survey.invitations.filter(recipient=user).exists()
+    )
+
+def dashboard_querysets(user):
+    """{stat name: queryset to count} for the dashboard of a user's role"""
+    if user.role == 'admin':
+        return {
+            'total_surveys': Survey.objects.all(),
+            'active_surveys': Survey.objects.filter(status='active'),
+            'total_responses': SurveyResponse.objects.all(),
+            'completed_responses': SurveyResponse.objects.filter(is_complete=True),
+        }
+    elif user.role in ['healthcare_provider', 'researcher']:
+        return {
+            'my_surveys': Survey.objects.filter(created_by=user),
+            'active_surveys': Survey.objects.filter(created_by=user, status='active'),
+            'total_responses': SurveyResponse.objects.filter(survey__created_by=user),
+            'my_responses': SurveyResponse.objects.filter(respondent=user),
+        }
+    else:  # patient
+        return {
+            'available_surveys': Survey.objects.filter(
+                status='active',
+                target_roles__contains=['patient']
+            ),
+            'my_responses': SurveyResponse.objects.filter(respondent=user),
+            'completed_surveys': SurveyResponse.objects.filter(
+                respondent=user, 
+                is_complete=True
+            ),
+        }
+
+# Returned when the dashboard counts fail
+EMPTY_DASHBOARD_STATS = {
+    'total_surveys': 0,
+    'active_surveys': 0,
+    'total_responses': 0,
+    'completed_responses': 0,
+    'my_surveys': 0,
+    'my_responses': 0,
+    'available_surveys': 0,
+    'completed_surveys': 0
+}
+
+class SurveyListCreateView(SparseQuerysetMixin, generics.ListCreateAPIView):
     """List all surveys or create a new survey"""
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -26,38 +135,7 @@ class SurveyListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         try:
-            queryset = Survey.objects.all()
-            user = self.request.user
-            
-            # Filter based on user role
-            if user.role == 'patient':
-                # Filter surveys available to patients
-                queryset = queryset.filter(
-                    Q(status='active') & 
-                    (Q(invitations__recipient=user) | Q(target_roles__contains=['patient']))
-                ).distinct()
-            elif user.role in ['healthcare_provider', 'researcher']:
-                # Filter surveys for healthcare providers and researchers
-                queryset = queryset.filter(
-                    Q(created_by=user) | 
-                    Q(target_roles__contains=[user.role]) |
-                    Q(status='active')
-                ).distinct()
-            # Admins can see all surveys
-            
-            # Apply filters (rest remains the same)
-            status_filter = self.request.query_params.get('status')
-            category_filter = self.request.query_params.get('category')
-            search = self.request.query_params.get('search')
-            
-            if status_filter:
-                queryset = queryset.filter(status=status_filter)
-            if category_filter:
-                queryset = queryset.filter(category=category_filter)
-            if search:
-                queryset = queryset.filter(
-                    Q(title__icontains=search) | Q(description__icontains=search)
-                )
+            queryset = visible_surveys(self.request.user, self.request.query_params)
             
             return queryset.order_by('-created_at')
         
@@ -65,27 +143,24 @@ class SurveyListCreateView(generics.ListCreateAPIView):
             print(f"Survey list error: {str(e)}")
             return Survey.objects.none()
 
-class SurveyDetailView(generics.RetrieveUpdateDestroyAPIView):
+class SurveyDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a survey"""
     queryset = Survey.objects.all()
     serializer_class = SurveySerializer
     permission_classes = [permissions.IsAuthenticated]
+    sparse_columns = ['created_by', 'status', 'target_roles']
     
     def get_object(self):
         obj = super().get_object()
         user = self.request.user
         
         # Check permissions
-        if user.role not in ['admin'] and obj.created_by != user:
-            # Check if user has access to view this survey
-            if not (obj.status == 'active' and 
-                   (user.role in obj.target_roles or 
-                    obj.invitations.filter(recipient=user).exists())):
-                self.permission_denied(self.request)
+        if not can_view_survey(user, obj):
+            self.permission_denied(self.request)
         
         return obj
 
-class QuestionListCreateView(generics.ListCreateAPIView):
+class QuestionListCreateView(SparseQuerysetMixin, generics.ListCreateAPIView):
     """List questions for a survey or create new questions"""
     serializer_class = QuestionSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -104,11 +179,12 @@ class QuestionListCreateView(generics.ListCreateAPIView):
         
         serializer.save(survey=survey)
 
-class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
+class QuestionDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a question"""
-    queryset = Question.objects.all()
+    queryset = Question.objects.select_related('survey')
     serializer_class = QuestionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    sparse_columns = ['survey']
     
     def get_object(self):
         obj = super().get_object()
@@ -118,19 +194,29 @@ class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
             self.permission_denied(self.request)
         return obj
 
-class SurveyResponseListCreateView(generics.ListCreateAPIView):
+class SurveyResponseListCreateView(SparseQuerysetMixin, generics.ListCreateAPIView):
     """List survey responses or create a new response"""
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
+    
+    def include_answers(self):
+        params = self.request.query_params
+        return 'answers' in params.get('include', '').split(',') + params.get('expand', '').split(',')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return SurveyResponseCreateSerializer
-        return SurveyResponseSerializer
+        # Answers are left out unless asked for with ?include=answers
+        if self.include_answers():
+            return SurveyResponseAnswersListSerializer
+        return SurveyResponseListSerializer
     
     def get_queryset(self):
         survey_id = self.kwargs.get('survey_id')
         user = self.request.user
         
+        # The serializer's fields decide the joins and prefetches, so a page
+        # costs the same number of queries whatever its size
         queryset = SurveyResponse.objects.all()
         
         if survey_id:
@@ -149,11 +235,12 @@ class SurveyResponseListCreateView(generics.ListCreateAPIView):
         
         return queryset.order_by('-started_at')
 
-class SurveyResponseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class SurveyResponseDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a survey response"""
-    queryset = SurveyResponse.objects.all()
+    queryset = SurveyResponse.objects.select_related('survey')
     serializer_class = SurveyResponseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    sparse_columns = ['respondent', 'survey', 'survey__created_by']
     
     def get_object(self):
         obj = super().get_object()
@@ -166,6 +253,20 @@ class SurveyResponseDetailView(generics.RetrieveUpdateDestroyAPIView):
             self.permission_denied(self.request)
         
         return obj
+    
+    def perform_update(self, serializer):
+        was_complete = serializer.instance.is_complete
+        had_duration = serializer.instance.duration_seconds is not None
+        with transaction.atomic():
+            survey_response = serializer.save()
+            # Keep ?mode=approx completion counts and durations current
+            record_response_update(survey_response, was_complete, had_duration)
+        if survey_response.is_complete and not was_complete:
+            publish_completion(survey_response)
+
+def can_view_analytics(user, survey):
+    """Survey owners, admins and researchers can see a survey's analytics"""
+    return survey.created_by == user or user.role in ['admin', 'researcher']
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -195,6 +296,7 @@ def bulk_create_questions(request, survey_id):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@replica_reads
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def survey_analytics(request, survey_id):
@@ -202,105 +304,247 @@ def survey_analytics(request, survey_id):
     survey = get_object_or_404(Survey, id=survey_id)
     
     # Check permissions
-    if (survey.created_by != request.user and 
-        request.user.role not in ['admin', 'researcher']):
+    if not can_view_analytics(request.user, survey):
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
     
-    # Get basic statistics
-    total_responses = survey.responses.count()
-    completed_responses = survey.responses.filter(is_complete=True).count()
-    
-    completion_rate = (completed_responses / total_responses * 100) if total_responses > 0 else 0
-    
-    # Average completion time
-    avg_time = survey.responses.filter(
-        is_complete=True,
-        completed_at__isnull=False
-    ).aggregate(
-        avg_time=Avg('completion_time')
-    )['avg_time'] or 0
-    
-    # Responses by date (last 30 days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    responses_by_date = []
-    
-    for i in range(30):
-        date = thirty_days_ago + timedelta(days=i)
-        count = survey.responses.filter(
-            started_at__date=date.date()
-        ).count()
-        responses_by_date.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'count': count
-        })
+    mode = request.query_params.get('mode', 'exact')
+    if mode not in ANALYTICS_MODES:
+        return Response(
+            {'error': f"mode must be one of: {', '.join(ANALYTICS_MODES)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    # Question analytics
-    question_analytics = []
-    for question in survey.questions.all():
-        question_responses = QuestionResponse.objects.filter(question=question)
-        
-        analytics_data = {
-            'question_id': question.id,
-            'question_text': question.text,
-            'question_type': question.type,
-            'total_responses': question_responses.count(),
-            'response_rate': (question_responses.count() / total_responses * 100) if total_responses > 0 else 0
-        }
-        
-        # Add type-specific analytics
-        if question.type in ['radio', 'dropdown']:
-            # Choice distribution
-            choices = {}
-            for response in question_responses:
-                answer = response.get_answer()
-                choices[answer] = choices.get(answer, 0) + 1
-            analytics_data['choice_distribution'] = choices
-        
-        elif question.type == 'rating':
-            # Rating statistics
-            ratings = [r.number_answer for r in question_responses if r.number_answer is not None]
-            if ratings:
-                analytics_data['average_rating'] = sum(ratings) / len(ratings)
-                analytics_data['rating_distribution'] = {
-                    str(i): ratings.count(i) for i in range(1, 6)
-                }
-        
-        question_analytics.append(analytics_data)
-    
-    # Demographic breakdown
-    demographic_breakdown = {}
-    if not survey.is_anonymous:
-        demographic_breakdown = {
-            'by_role': {},
-            'by_department': {}
-        }
-        
-        # Group by role
-        role_counts = survey.responses.values('respondent__role').annotate(
-            count=Count('id')
+    return Response(analytics_for_mode(survey, mode))
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def survey_timeseries(request, survey_id):
+    """Started/completed response counts bucketed by hour, day, week or month"""
+    survey = get_object_or_404(Survey, id=survey_id)
+    
+    if not can_view_analytics(request.user, survey):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    granularity = request.query_params.get('granularity', 'day')
+    try:
+        tz = parse_timezone(request.query_params.get('tz'))
+        end = parse_bound(request.query_params.get('to'), tz, end=True) or timezone.now()
+        start = (parse_bound(request.query_params.get('from'), tz)
+                 or end - DEFAULT_SPANS.get(granularity, DEFAULT_SPANS['day']))
+        series = response_timeseries(survey.responses.all(), start, end, granularity, tz)
+    except TimeSeriesError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'survey_id': survey.id,
+        'granularity': granularity,
+        'tz': str(tz),
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'series': series,
+    })
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def survey_crosstab(request, survey_id):
+    """Cross-tabulate a question against another question or a respondent dimension"""
+    survey = get_object_or_404(Survey, id=survey_id)
+    
+    if not can_view_analytics(request.user, survey):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        row = resolve_axis(survey, request.query_params.get('row'), allow_dimension=False)
+        column = resolve_axis(survey, request.query_params.get('column'))
+    except CrosstabError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(crosstab(survey, row, column))
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def survey_funnel_analytics(request, survey_id):
+    """Per-question reach and abandonment for a survey"""
+    survey = get_object_or_404(Survey, id=survey_id)
+    
+    if not can_view_analytics(request.user, survey):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response(survey_funnel(survey))
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def survey_demographics(request, survey_id):
+    """Response counts by respondent dimensions, with small cells suppressed"""
+    survey = get_object_or_404(Survey, id=survey_id)
+    
+    if not can_view_analytics(request.user, survey):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        groupings = parse_groupings(request.query_params.get('dimensions'))
+        k = min_cell_size(int(request.query_params.get('k', 0)))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'survey_id': survey.id,
+        'is_anonymous': survey.is_anonymous,
+        'min_cell_size': k,
+        'breakdowns': demographic_breakdowns(survey, groupings, k),
+    })
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def survey_text_analytics(request, survey_id):
+    """Top terms, bigrams and weekly trend of a survey's free-text answers"""
+    survey = get_object_or_404(Survey, id=survey_id)
+    
+    if not can_view_analytics(request.user, survey):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    questions = survey.questions.filter(type__in=TEXT_TYPES)
+    try:
+        if request.query_params.get('question'):
+            questions = questions.filter(id=int(request.query_params['question']))
+            if not questions.exists():
+                raise ValueError('question must be a text question of this survey')
+        limit = min(int(request.query_params.get('top', 20)), 100)
+        weeks = min(int(request.query_params.get('weeks', 12)), 104)
+        k = int(request.query_params.get('k', 0))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # New responses are counted in the background after they are submitted
+    return Response({
+        'survey_id': survey.id,
+        'pending_responses': pending_responses(survey),
+        **text_analytics(survey, questions, limit, weeks, k),
+    })
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def survey_comparison(request):
+    """Side-by-side distributions and trend deltas for questions shared by several surveys"""
+    try:
+        survey_ids = parse_survey_ids(request.query_params.get('surveys'))
+        mapping = parse_mapping(request.query_params.get('mapping'))
+    except ComparisonError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    surveys = list(Survey.objects.filter(id__in=survey_ids).select_related('created_by'))
+    missing = set(survey_ids) - {survey.id for survey in surveys}
+    if missing:
+        return Response(
+            {'error': f"Surveys not found: {', '.join(map(str, sorted(missing)))}"},
+            status=status.HTTP_404_NOT_FOUND
         )
-        for item in role_counts:
-            demographic_breakdown['by_role'][item['respondent__role']] = item['count']
-        
-        # Group by department
-        dept_counts = survey.responses.values('respondent__department').annotate(
-            count=Count('id')
+    if not all(can_view_analytics(request.user, survey) for survey in surveys):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        return Response(compare_surveys(surveys, survey_ids, mapping))
+    except ComparisonError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def survey_report(request, survey_id):
+    """Queue a PDF or XLSX report of a survey's analytics"""
+    survey = get_object_or_404(Survey, id=survey_id)
+    
+    if not can_view_analytics(request.user, survey):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    report_format = request.data.get('format', 'pdf')
+    if report_format not in REPORT_FORMATS:
+        return Response(
+            {'error': f"format must be one of: {', '.join(REPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        for item in dept_counts:
-            if item['respondent__department']:
-                demographic_breakdown['by_department'][item['respondent__department']] = item['count']
-    
-    analytics_data = {
-        'total_responses': total_responses,
-        'completed_responses': completed_responses,
-        'average_completion_time': round(avg_time, 2),
-        'completion_rate': round(completion_rate, 2),
-        'responses_by_date': responses_by_date,
-        'question_analytics': question_analytics,
-        'demographic_breakdown': demographic_breakdown
-    }
-    
-    return Response(analytics_data)
+    
+    job, _ = request_report(survey, request.user, report_format)
+    # A finished report of the same data is returned straight away
+    return Response(
+        ReportJobSerializer(job, context={'request': request}).data,
+        status=status.HTTP_200_OK if job.status == 'done' else status.HTTP_202_ACCEPTED
+    )
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def report_job_status(request, job_id):
+    """Poll a report job"""
+    job = get_object_or_404(ReportJob.objects.select_related('survey'), id=job_id)
+    
+    if not can_view_analytics(request.user, job.survey):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response(ReportJobSerializer(job, context={'request': request}).data)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def report_download(request, job_id):
+    """Download a finished report"""
+    job = get_object_or_404(ReportJob.objects.select_related('survey'), id=job_id)
+    
+    if not can_view_analytics(request.user, job.survey):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    if job.status != 'done':
+        return Response({'error': 'Report is not ready', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+    
+    path = artifact_path(job.content_hash, job.format)
+    if not path.exists():
+        return Response({'error': 'Report file has been removed; request it again'}, status=status.HTTP_410_GONE)
+    return FileResponse(
+        open(path, 'rb'), as_attachment=True, filename=report_filename(job),
+        content_type=REPORT_FORMATS[job.format]
+    )
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def duration_analytics(request):
+    """Completion time percentiles per survey and per question-count band"""
+    user = request.user
+    surveys = Survey.objects.all()
+    if user.role not in ['admin', 'researcher']:
+        surveys = surveys.filter(created_by=user)
+    
+    responses = SurveyResponse.objects.filter(survey__in=surveys)
+    by_survey = duration_percentiles(responses)
+    by_band = band_percentiles(responses)
+    
+    survey_rows = []
+    for survey in surveys.filter(id__in=by_survey.keys()).annotate(question_count=Count('questions')):
+        stats = by_survey[survey.id]
+        estimated_seconds = survey.estimated_duration * 60
+        survey_rows.append({
+            'survey_id': survey.id,
+            'title': survey.title,
+            'question_count': survey.question_count,
+            'estimated_duration_seconds': estimated_seconds,
+            'completed_responses': stats['count'],
+            **{name: stats.get(name) for name in PERCENTILES},
+            'p50_to_estimate_ratio': round(stats['p50'] / estimated_seconds, 2) if estimated_seconds else None,
+        })
+    
+    # Surveys whose typical duration most exceeds the estimate first
+    survey_rows.sort(key=lambda row: row['p50_to_estimate_ratio'] or 0, reverse=True)
+    
+    return Response({
+        'surveys': survey_rows,
+        'by_question_count': [
+            {'band': band, 'completed_responses': stats['count'],
+             **{name: stats.get(name) for name in PERCENTILES}}
+            for band, stats in sorted(by_band.items())
+        ],
+    })
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -324,7 +568,8 @@ def duplicate_survey(request, survey_id):
         allow_multiple_responses=original_survey.allow_multiple_responses,
         estimated_duration=original_survey.estimated_duration,
         target_roles=original_survey.target_roles,
-        target_departments=original_survey.target_departments
+        target_departments=original_survey.target_departments,
+        answer_storage=original_survey.answer_storage
     )
     
     # Copy questions
@@ -347,51 +592,57 @@ def duplicate_survey(request, survey_id):
         status=status.HTTP_201_CREATED
     )
 
+@replica_reads
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_stats(request):
     """Get dashboard statistics"""
-    user = request.user
-    
     try:
-        if user.role == 'admin':
-            stats = {
-                'total_surveys': Survey.objects.count(),
-                'active_surveys': Survey.objects.filter(status='active').count(),
-                'total_responses': SurveyResponse.objects.count(),
-                'completed_responses': SurveyResponse.objects.filter(is_complete=True).count(),
-            }
-        elif user.role in ['healthcare_provider', 'researcher']:
-            stats = {
-                'my_surveys': Survey.objects.filter(created_by=user).count(),
-                'active_surveys': Survey.objects.filter(created_by=user, status='active').count(),
-                'total_responses': SurveyResponse.objects.filter(survey__created_by=user).count(),
-                'my_responses': SurveyResponse.objects.filter(respondent=user).count(),
-            }
-        else:  # patient
-            stats = {
-                'available_surveys': Survey.objects.filter(
-                    status='active',
-                    target_roles__contains=['patient']
-                ).count(),
-                'my_responses': SurveyResponse.objects.filter(respondent=user).count(),
-                'completed_surveys': SurveyResponse.objects.filter(
-                    respondent=user, 
-                    is_complete=True
-                ).count(),
-            }
-        
+        stats = {name: queryset.count() for name, queryset in dashboard_querysets(request.user).items()}
         return Response(stats)
     
     except Exception as e:
         # Return empty stats on error instead of crashing
-        return Response({
-            'total_surveys': 0,
-            'active_surveys': 0,
-            'total_responses': 0,
-            'completed_responses': 0,
-            'my_surveys': 0,
-            'my_responses': 0,
-            'available_surveys': 0,
-            'completed_surveys': 0
-        })
\ No newline at end of file
+        return Response(EMPTY_DASHBOARD_STATS)
+
+@gzip_page
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def kiosk_bundle(request):
+    """Active surveys with their questions and branching logic, for offline kiosks"""
+    surveys = kiosk_surveys(visible_surveys(request.user, request.query_params))
+    if request.query_params.get('surveys'):
+        try:
+            ids = [int(part) for part in request.query_params['surveys'].split(',') if part.strip()]
+        except ValueError:
+            return Response(
+                {'error': "'surveys' must be a comma-separated list of survey ids"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        surveys = surveys.filter(id__in=ids)
+    
+    bundle, version = build_bundle(surveys)
+    etag = f'"{version}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    # gzip_page turns the ETag weak when it compresses the bundle
+    known = [tag.strip().removeprefix('W/') for tag in request.headers.get('If-None-Match', '').split(',')]
+    if etag in known:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response({'version': version, 'generated_at': timezone.now(), **bundle}, headers=headers)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def kiosk_sync(request):
+    """Store submissions queued by an offline kiosk, skipping ones already synced"""
+    submissions = request.data.get('submissions') if isinstance(request.data, dict) else None
+    if not isinstance(submissions, list):
+        return Response({'error': 'submissions must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(submissions) > settings.KIOSK_SYNC_MAX_SUBMISSIONS:
+        return Response(
+            {'error': f'At most {settings.KIOSK_SYNC_MAX_SUBMISSIONS} submissions can be synced at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    results = sync_submissions(submissions, visible_surveys(request.user, {}), request.META)
+    counts = {state: sum(result['status'] == state for result in results) for state in ['created', 'duplicate', 'invalid']}
+    return Response({**counts, 'results': results})
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""
+Process pools for analytics and report work.
+
+Server processes run threads (request threads, the submission writer), and
+a child forked from them can inherit a lock one of those threads held, so
+pools started by the server spawn fresh interpreters instead. This module
+imports no models: a spawned worker loads its initializer from here before
+Django is set up.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.db import connections
+
+
+def init_worker():
+    """Pool initializer for processes that compute analytics"""
+    # Spawned workers start without Django; forked ones must not reuse the
+    # parent's database connections
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def worker_pool(workers):
+    """Process pool for analytics and report work started from a server process"""
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker
+    )
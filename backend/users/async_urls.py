@@ -0,0 +1,6 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('profile/', async_views.profile_view, name='async-profile'),
+]
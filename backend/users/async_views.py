@@ -0,0 +1,11 @@
+from django.http import JsonResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from .authentication import async_api_view
+from .serializers import UserProfileSerializer
+
+
+@async_api_view(['GET'])
+async def profile_view(request):
+    """Get current user profile"""
+    return JsonResponse(UserProfileSerializer(request.user).data, encoder=JSONEncoder)
@@ -0,0 +1,84 @@
+"""
+Token authentication for async (ASGI) views.
+
+DRF views are synchronous, so the async endpoints authenticate the
+``Authorization: Token <key>`` header themselves with the async ORM and
+return the same 401 bodies as ``rest_framework.authentication``.
+
+Browsers cannot set headers on an ``EventSource``, so streaming views may
+also accept a stream ticket as a ``?ticket=`` query parameter. Query strings
+end up in access logs and browser history, so the ticket is not the token:
+it is signed for streams only, expires after ``STREAM_TICKET_SECONDS`` and
+stops working when the token it was issued for is deleted (logout).
+"""
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core import signing
+from django.http import JsonResponse
+from rest_framework.authtoken.models import Token
+
+STREAM_TICKET_SALT = 'users.authentication.stream-ticket'
+
+
+def token_fingerprint(key):
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def issue_stream_ticket(token):
+    """Signed, short-lived ticket authenticating event streams as the token's user"""
+    signer = signing.TimestampSigner(salt=STREAM_TICKET_SALT)
+    return signer.sign(f'{token.user_id}:{token_fingerprint(token.key)}')
+
+
+async def ticket_user(ticket):
+    """Return the active user a stream ticket was issued to
+
+    Raises Token.DoesNotExist for a bad, expired or revoked ticket.
+    """
+    signer = signing.TimestampSigner(salt=STREAM_TICKET_SALT)
+    try:
+        user_id, _, fingerprint = signer.unsign(ticket, max_age=settings.STREAM_TICKET_SECONDS).partition(':')
+    except signing.BadSignature:
+        raise Token.DoesNotExist
+    token = await Token.objects.select_related('user').aget(user_id=user_id)
+    if token_fingerprint(token.key) != fingerprint or not token.user.is_active:
+        raise Token.DoesNotExist
+    return token.user
+
+
+async def token_user(request, query_ticket=False):
+    """Return the active user for the request's token, None without a token
+
+    Raises Token.DoesNotExist for an unknown or inactive token.
+    """
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword != 'Token' and query_ticket and request.GET.get('ticket'):
+        return await ticket_user(request.GET['ticket'])
+    if keyword != 'Token' or not key.strip():
+        return None
+    token = await Token.objects.select_related('user').aget(key=key.strip())
+    if not token.user.is_active:
+        raise Token.DoesNotExist
+    return token.user
+
+
+def async_api_view(methods, query_ticket=False):
+    """Async counterpart of ``@api_view`` + ``IsAuthenticated`` for token-authenticated JSON views"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                user = await token_user(request, query_ticket)
+            except Token.DoesNotExist:
+                return JsonResponse({'detail': 'Invalid token.'}, status=401)
+            if user is None:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+            request.user = user
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
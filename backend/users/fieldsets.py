@@ -0,0 +1,221 @@
+"""
+Sparse fieldsets (``?fields=``) and expansion (``?expand=``) for serializers.
+
+``?fields=id,title,created_by.username`` limits a GET response to the listed
+fields; dotted paths select fields of nested serializers, and naming a nested
+field without a path keeps all of it. Unknown names are a 400 error. ``?expand=questions`` adds or replaces
+the fields a serializer lists in ``Meta.expandable_fields``, so nested data
+that is not sent by default can be asked for. Both apply to nested
+serializers too (``?expand=survey.questions``).
+
+``prune_queryset`` loads only what the selected fields read: deferred
+columns, and no joins, prefetches or count annotations for fields that were
+left out. Plain model fields and relations are found from the serializer
+fields. Fields computed from other attributes declare what they read in
+their serializer's Meta:
+
+- ``field_columns``: {field: [model fields it reads]}
+- ``field_prefetches``: {field: [prefetch lookups]}
+- ``field_annotations``: {field: {annotation name: expression}}
+
+A field that reads something else and declares nothing makes the whole model
+load, so an undeclared field is slower, never wrong.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_paths(value):
+    """'a,b.c,b.d' (or an iterable of paths) -> {'a': {}, 'b': {'c': {}, 'd': {}}}; None when empty"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    tree = {}
+    for path in value:
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree or None
+
+
+def related_count(queryset, field):
+    """Correlated COUNT of a related table, computed only for the rows returned"""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class SparseFieldsMixin:
+    """Serializer mixin applying ``?fields=`` and ``?expand=``
+
+    The query parameters are read by the outermost serializer of a GET
+    request and handed down to nested serializers. ``fields`` and ``expand``
+    arguments (comma-separated paths) set them explicitly instead.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._selection = None
+        # Dotted path of this serializer in the selection, for error messages
+        self._selection_prefix = ''
+        if fields is not None or expand is not None:
+            self._selection = (parse_paths(fields), parse_paths(expand) or {})
+
+    def field_selection(self):
+        """(selected field tree or None for all, expanded field tree)"""
+        if self._selection is None:
+            self._selection = (None, {})
+            request = self.context.get('request')
+            parent = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+            if parent is None and getattr(request, 'method', None) in SAFE_METHODS:
+                self._selection = (
+                    parse_paths(request.GET.get(FIELDS_PARAM)), parse_paths(request.GET.get(EXPAND_PARAM)) or {}
+                )
+        return self._selection
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected, expanded = self.field_selection()
+        for name, (serializer_class, options) in getattr(self.Meta, 'expandable_fields', {}).items():
+            if name in expanded:
+                fields[name] = serializer_class(**options)
+        if selected is not None:
+            unknown = [name for name in selected if name not in fields]
+            if unknown:
+                raise serializers.ValidationError({
+                    FIELDS_PARAM: [f"Unknown field '{self._selection_prefix}{name}'" for name in unknown]
+                })
+            fields = {name: field for name, field in fields.items() if name in selected or name in expanded}
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, SparseFieldsMixin):
+                nested._selection = ((selected or {}).get(name) or None, expanded.get(name, {}))
+                nested._selection_prefix = f'{self._selection_prefix}{name}.'
+        return fields
+
+
+def with_prefix(prefix, lookup):
+    if isinstance(lookup, Prefetch):
+        return Prefetch(f'{prefix}__{lookup.prefetch_through}', queryset=lookup.queryset, to_attr=lookup.to_attr)
+    return f'{prefix}__{lookup}'
+
+
+def load_plan(serializer):
+    """What a serializer's fields read: {columns (None for all), related, prefetches, annotations}"""
+    meta = serializer.Meta
+    opts = meta.model._meta
+    columns = {opts.pk.name}
+    related, prefetches, annotations = [], [], {}
+    complete = True
+    field_columns = getattr(meta, 'field_columns', {})
+    field_prefetches = getattr(meta, 'field_prefetches', {})
+    field_annotations = getattr(meta, 'field_annotations', {})
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in field_columns or name in field_prefetches or name in field_annotations:
+            columns.update(field_columns.get(name, []))
+            prefetches.extend(field_prefetches.get(name, []))
+            annotations.update(field_annotations.get(name, {}))
+            continue
+        try:
+            model_field = opts.get_field(field.source_attrs[0]) if field.source_attrs else None
+        except FieldDoesNotExist:
+            model_field = None
+        if model_field is None:
+            complete = False
+            continue
+
+        source = model_field.name
+        nested = getattr(field, 'child', field)
+        if not isinstance(nested, serializers.ModelSerializer):
+            nested = None
+        if not model_field.is_relation:
+            columns.add(source)
+        elif model_field.many_to_one or (model_field.one_to_one and model_field.concrete):
+            columns.add(source)
+            if nested is not None:
+                plan = load_plan(nested)
+                if plan['annotations']:
+                    # Annotations cannot ride on a join; load the related rows separately
+                    prefetches.append(Prefetch(source, queryset=apply_plan(plan, nested.Meta.model._default_manager.all())))
+                    continue
+                related.append(source)
+                related.extend(f'{source}__{lookup}' for lookup in plan['related'])
+                prefetches.extend(with_prefix(source, lookup) for lookup in plan['prefetches'])
+                if plan['columns'] is not None:
+                    columns.update(f'{source}__{column}' for column in plan['columns'])
+            elif len(field.source_attrs) > 1:
+                # e.g. source='survey.title'
+                related.append(source)
+                try:
+                    model_field.related_model._meta.get_field(field.source_attrs[1])
+                    columns.add(f'{source}__{field.source_attrs[1]}')
+                except FieldDoesNotExist:
+                    pass
+        elif nested is not None and model_field.one_to_many:
+            # Reverse foreign key: prefetch, keeping the column that links back
+            plan = load_plan(nested)
+            if plan['columns'] is not None:
+                plan['columns'].add(model_field.field.name)
+            prefetches.append(Prefetch(source, queryset=apply_plan(plan, nested.Meta.model._default_manager.all())))
+        else:
+            complete = False
+
+    # A relation loaded by a prefetch (for its annotations) must not also be joined
+    prefetched = {lookup.prefetch_through for lookup in prefetches if isinstance(lookup, Prefetch)}
+    related = [lookup for lookup in related if lookup.split('__')[0] not in prefetched]
+    columns = {column for column in columns if column.split('__')[0] not in prefetched or '__' not in column}
+    return {
+        'columns': columns if complete else None,
+        'related': related,
+        'prefetches': prefetches,
+        'annotations': annotations,
+    }
+
+
+def apply_plan(plan, queryset):
+    if plan['related']:
+        queryset = queryset.select_related(*plan['related'])
+    if plan['prefetches']:
+        queryset = queryset.prefetch_related(*plan['prefetches'])
+    if plan['annotations']:
+        queryset = queryset.annotate(**plan['annotations'])
+    if plan['columns'] is not None:
+        queryset = queryset.only(*plan['columns'])
+    return queryset
+
+
+def prune_queryset(queryset, serializer, columns=()):
+    """Narrow a queryset to the columns, joins, prefetches and annotations a serializer reads
+
+    ``columns`` are loaded as well, for code other than the serializer.
+    """
+    plan = load_plan(getattr(serializer, 'child', serializer))
+    if plan['columns'] is not None:
+        plan['columns'].update(columns)
+    return apply_plan(plan, queryset)
+
+
+class SparseQuerysetMixin:
+    """Generic view mixin that prunes read querysets to the requested fields
+
+    ``sparse_columns`` lists model fields the view itself reads (e.g. for
+    permission checks), so they are never deferred.
+    """
+    sparse_columns = []
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in SAFE_METHODS:
+            queryset = prune_queryset(queryset, self.get_serializer(), self.sparse_columns)
+        return queryset
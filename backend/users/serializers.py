@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from .fieldsets import SparseFieldsMixin
 from .models import User
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     
     class Meta:
@@ -35,7 +36,7 @@ class UserSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for user profile (excludes sensitive data)"""
     full_name = serializers.SerializerMethodField()
     
@@ -45,6 +46,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
                  'full_name', 'role', 'phone', 'department', 'specialization',
                  'created_at']
         read_only_fields = ['id', 'username', 'created_at']
+        field_columns = {'full_name': ['first_name', 'last_name']}
     
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}".strip()
@@ -10,4 +10,5 @@ urlpatterns = [
     path('profile/update/', views.update_profile, name='update-profile'),
     path('change-password/', views.change_password, name='change-password'),
     path('stats/', views.user_stats, name='user-stats'),
+    path('stream-ticket/', views.stream_ticket, name='stream-ticket'),
 ]
\ No newline at end of file
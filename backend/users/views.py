@@ -3,18 +3,22 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
+from django.conf import settings
 from django.db.models import Q
+from .authentication import issue_stream_ticket
+from .fieldsets import SparseQuerysetMixin
 from .models import User
 from .serializers import (
     UserSerializer, UserProfileSerializer, LoginSerializer, 
     ChangePasswordSerializer
 )
 
-class UserListCreateView(generics.ListCreateAPIView):
+class UserListCreateView(SparseQuerysetMixin, generics.ListCreateAPIView):
     """List all users or create a new user"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
     
     def get_queryset(self):
         queryset = User.objects.all()
@@ -43,7 +47,7 @@ class UserListCreateView(generics.ListCreateAPIView):
             )
         serializer.save()
 
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+class UserDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a user"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -160,4 +164,11 @@ def user_stats(request):
             'researcher': User.objects.filter(role='researcher').count(),
         }
     }
-    return Response(stats)
\ No newline at end of file
+    return Response(stats)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def stream_ticket(request):
+    """Issue a short-lived ticket for opening event streams"""
+    # request.auth is the Token the request authenticated with
+    return Response({'ticket': issue_stream_ticket(request.auth), 'expires_in': settings.STREAM_TICKET_SECONDS})
\ No newline at end of file
@@ -46,7 +46,7 @@ const Analytics = () => {
 
     const fetchSurveys = async () => {
         try {
-            const response = await surveysAPI.list();
+            const response = await surveysAPI.list({ fields: 'id,title' });
             const surveyList = response.data.results || response.data;
             setSurveys(surveyList);
 
@@ -50,10 +50,12 @@ const PatientResponses = () => {
             if (searchParams.get('status')) params.status = searchParams.get('status');
             if (searchParams.get('search')) params.search = searchParams.get('search');
             if (searchParams.get('me') === 'true') params.respondent = user?.id;
+            params.fields = 'id,survey,survey_title,respondent.id,respondent.username,respondent.full_name,' +
+                'started_at,completed_at,is_complete,completion_time';
 
             const [responsesRes, surveysRes] = await Promise.all([
                 responsesAPI.list(null, params),
-                surveysAPI.list()
+                surveysAPI.list({ fields: 'id,title' })
             ]);
 
             setResponses(responsesRes.data.results || responsesRes.data);
@@ -46,6 +46,9 @@ const SurveyManagement = () => {
             if (searchParams.get('status')) params.status = searchParams.get('status');
             if (searchParams.get('category')) params.category = searchParams.get('category');
             if (searchParams.get('search')) params.search = searchParams.get('search');
+            // Only the fields the survey cards show
+            params.fields = 'id,title,description,category,status,created_by.id,created_by.username,' +
+                'created_at,estimated_duration,total_questions,total_responses';
 
             const response = await surveysAPI.list(params);
             setSurveys(response.data.results || response.data);
@@ -54,6 +54,8 @@ const UserManagement = () => {
             const params = {};
             if (roleFilter) params.role = roleFilter;
             if (searchTerm) params.search = searchTerm;
+            params.fields = 'id,username,email,first_name,last_name,role,phone,department,' +
+                'specialization,is_active,created_at';
 
             const response = await usersAPI.list(params);
             setUsers(response.data.results || response.data);
@@ -10,6 +10,8 @@ const api = axios.create({
         'Content-Type': 'application/json',
     },
     timeout: 10000, // 10 seconds timeout
+    // Send the primary_pin cookie back, so reads after a write see it when a read replica lags
+    withCredentials: true,
 });
 
 // Request interceptor to add token
@@ -106,6 +108,7 @@ export const authAPI = {
     profile: () => api.get('/users/profile/'),
     updateProfile: (data) => api.put('/users/profile/update/', data),
     changePassword: (data) => api.post('/users/change-password/', data),
+    streamTicket: () => api.post('/users/stream-ticket/'),
 };
 
 // Users API
@@ -118,6 +121,42 @@ export const usersAPI = {
     stats: () => api.get('/users/stats/'),
 };
 
+// Server-sent events stream. EventSource cannot send headers, so every
+// connection uses a fresh short-lived stream ticket instead of the token.
+// handlers maps event names (snapshot, response, ...) to callbacks taking
+// the parsed event; call .close() on the result to disconnect
+const eventSource = (path, handlers) => {
+    let source = null;
+    let closed = false;
+    const connect = async () => {
+        let ticket;
+        try {
+            ticket = (await authAPI.streamTicket()).data.ticket;
+        } catch (error) {
+            if (!closed) setTimeout(connect, 5000);
+            return;
+        }
+        if (closed) return;
+        source = new EventSource(`${API_BASE_URL}${path}?ticket=${encodeURIComponent(ticket)}`);
+        Object.entries(handlers).forEach(([name, handler]) => {
+            source.addEventListener(name, (event) => handler(JSON.parse(event.data)));
+        });
+        // The ticket has expired by the time EventSource would reconnect
+        // (the server closes streams after EVENTS_STREAM_SECONDS)
+        source.onerror = () => {
+            source.close();
+            if (!closed) setTimeout(connect, 1000);
+        };
+    };
+    connect();
+    return {
+        close: () => {
+            closed = true;
+            if (source) source.close();
+        },
+    };
+};
+
 // Surveys API
 export const surveysAPI = {
     list: (params) => api.get('/surveys/', { params }),
@@ -126,8 +165,21 @@ export const surveysAPI = {
     update: (id, data) => api.put(`/surveys/${id}/`, data),
     delete: (id) => api.delete(`/surveys/${id}/`),
     duplicate: (id) => api.post(`/surveys/${id}/duplicate/`),
-    analytics: (id) => api.get(`/surveys/${id}/analytics/`),
+    analytics: (id, params) => api.get(`/surveys/${id}/analytics/`, { params }),
+    timeseries: (id, params) => api.get(`/surveys/${id}/analytics/timeseries/`, { params }),
+    crosstab: (id, params) => api.get(`/surveys/${id}/analytics/crosstab/`, { params }),
+    funnel: (id) => api.get(`/surveys/${id}/analytics/funnel/`),
+    demographics: (id, params) => api.get(`/surveys/${id}/analytics/demographics/`, { params }),
+    textAnalytics: (id, params) => api.get(`/surveys/${id}/analytics/text/`, { params }),
     dashboardStats: () => api.get('/surveys/dashboard/stats/'),
+    durations: () => api.get('/surveys/analytics/durations/'),
+    compare: (params) => api.get('/surveys/analytics/compare/', { params }),
+    requestReport: (id, format) => api.post(`/surveys/${id}/reports/`, { format }),
+    reportStatus: (jobId) => api.get(`/surveys/reports/${jobId}/`),
+    downloadReport: (jobId) => api.get(`/surveys/reports/${jobId}/download/`, { responseType: 'blob' }),
+    // Live updates (served by the ASGI app)
+    events: (id, handlers) => eventSource(`/async/surveys/${id}/events/`, handlers),
+    dashboardEvents: (handlers) => eventSource('/async/surveys/events/', handlers),
 };
 
 // Questions API
@@ -152,6 +204,29 @@ export const responsesAPI = {
     delete: (id) => api.delete(`/surveys/responses/${id}/`),
 };
 
+// Several API calls in one round trip; requests are [{ id, method, path, body }]
+// with paths like '/users/profile/', results come back in order
+export const batchAPI = {
+    run: (requests) => api.post('/batch/', { requests }),
+};
+
+// Offline kiosks: pass the stored bundle version to skip unchanged downloads (304),
+// then sync queued submissions, each with a client-generated client_id
+export const kioskAPI = {
+    bundle: (version, params) => api.get('/surveys/kiosk/bundle/', {
+        params,
+        headers: version ? { 'If-None-Match': `"${version}"` } : {},
+        validateStatus: (status) => status === 200 || status === 304,
+    }),
+    sync: (submissions) => api.post('/surveys/kiosk/sync/', { submissions }),
+};
+
+// Stored request profiles (admins); profile any request by adding ?profile=1
+export const profilesAPI = {
+    list: (params) => api.get('/profiles/', { params }),
+    get: (id) => api.get(`/profiles/${id}/`),
+};
+
 // Utility functions
 export const setAuthToken = (token) => {
     if (token) {